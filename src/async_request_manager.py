@@ -0,0 +1,124 @@
+# === IMPORTS ===
+from request_manager import RequestManager
+from retry_policy import RetryScheduler
+from time import monotonic
+from logger import Logger
+import requests
+import asyncio
+
+# === CONSTANTS ===
+# WARNING: The server answers a second request on a token that still has one in progress with `VAL16`. It is also
+# assumed to lock the account out with `VAL21` above `retry_policy.SERVER_RATE_LIMIT` requests in a `RATE_WINDOW`, the
+# limit isn't published. These values stay below the sync mode, which sends one request every 3 seconds plus the round trip.
+MAX_IN_FLIGHT = 1 # Maximum number of selection requests waiting for a response at the same time, per token.
+REQUESTS_PER_SECOND = 1 / 3.5 # Long term request rate allowed by the token bucket.
+BURST_SIZE = 1 # Number of requests that can be sent back to back before the rate kicks in.
+
+# === CLASS DEFINITON ===
+class TokenBucket:
+    """Token bucket rate limiter, every request consumes one token and tokens refill at `rate` per second."""
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = monotonic()
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    async def acquire(self) -> None:
+        """Waits until a token is available and consumes it."""
+        self._refill()
+        while self.tokens < 1:
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+            self._refill()
+        self.tokens -= 1
+
+class AsyncRequestManager:
+    """
+    Asyncio alternative to the sync selection loop. Keeps up to `max_in_flight` selection requests
+    in flight and merges each response into the CRN/SCRN lists as soon as it arrives. A single account gains
+    nothing from more than one, the batch runner uses it to drive every account from one event loop.
+    The HTTP exchange itself still goes through the pooled session of the wrapped `RequestManager`.
+
+    With a `retry_scheduler`, a request waits for the longer of the token bucket and the delay the scheduler picks for
+    the latest result codes, and the run ends once the scheduler's request budget is spent, like the sync loop.
+    """
+    def __init__(self, request_manager: RequestManager, max_in_flight: int = MAX_IN_FLIGHT, requests_per_second: float = REQUESTS_PER_SECOND, burst_size: int = BURST_SIZE,
+                 retry_scheduler: RetryScheduler | None = None) -> None:
+        self.request_manager = request_manager
+        self.max_in_flight = max_in_flight
+        self.bucket = TokenBucket(requests_per_second, burst_size)
+        self.retry_scheduler = retry_scheduler
+        self.time_out_detected = False
+        self.is_budget_spent = False
+        self._started_at = monotonic()
+        self._next_send_at = 0.0 # Monotonic time before which the retry scheduler doesn't allow the next request.
+
+    def _is_done(self, crn_list: list[str], scrn_list: list[str]) -> bool:
+        return self.time_out_detected or self.is_budget_spent or (len(crn_list) == 0 and len(scrn_list) == 0)
+
+    def _schedule_next(self) -> None:
+        if self.retry_scheduler is None:
+            return
+        delay = self.retry_scheduler.next_delay(self.request_manager.last_result_codes, monotonic() - self._started_at)
+        if delay is None:
+            self.is_budget_spent = True
+        else:
+            self._next_send_at = monotonic() + delay
+
+    async def _attempt(self, crn_list: list[str], scrn_list: list[str], in_flight: asyncio.Semaphore) -> None:
+        try:
+            # Send a snapshot, the lists may change while the request is in flight.
+            prepared = self.request_manager.prepare_selection_request(crn_list, scrn_list)
+            try:
+                response = await asyncio.to_thread(self.request_manager.send_selection_request, prepared)
+            except requests.RequestException as e:
+                Logger.log(f"Ders seçim request'i gönderilemedi: {e}", silent=True)
+                self.request_manager.last_result_codes = ["error"]
+                self._schedule_next()
+                return
+
+            Logger.log(f"Ders Seçim request response mesajı: {response.content.decode('utf-8', 'replace')}", silent=True)
+            # Runs on the event loop thread, so merging results from different responses never interleaves.
+            _, _, timed_out = self.request_manager.handle_selection_response(response.content, crn_list, scrn_list)
+            self.time_out_detected = self.time_out_detected or timed_out
+            if not self._is_done(crn_list, scrn_list):
+                self._schedule_next()
+        finally:
+            in_flight.release()
+
+    async def run(self, crn_list: list[str], scrn_list: list[str], duration: float, max_attempts: int | None = None) -> tuple[list[str], list[str], bool]:
+        """Sends selection requests for `duration` seconds or until every CRN is handled, returns the same values as `RequestManager.request_course_selection`."""
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        tasks = set()
+        self._started_at = monotonic()
+        deadline = self._started_at + duration
+        attempts = 0
+
+        while not self._is_done(crn_list, scrn_list) and monotonic() < deadline:
+            if max_attempts is not None and attempts >= max_attempts:
+                break
+
+            await in_flight.acquire()
+            # The bucket refills while the retry delay passes, the longer of the two waits decides.
+            if self._next_send_at > monotonic():
+                await asyncio.sleep(self._next_send_at - monotonic())
+            await self.bucket.acquire()
+
+            # A response may have finished the job while waiting for a slot, or the wait may have passed the deadline.
+            if self._is_done(crn_list, scrn_list) or monotonic() >= deadline:
+                in_flight.release()
+                break
+
+            attempts += 1
+            task = asyncio.create_task(self._attempt(crn_list, scrn_list, in_flight))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        # Wait for the requests that are already sent, their results still count.
+        if tasks:
+            await asyncio.gather(*tasks)
+        return crn_list, scrn_list, self.time_out_detected
@@ -0,0 +1,212 @@
+# === IMPORTS ===
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from time import time
+from token_fetcher import ContinuousTokenFetcher, StaticTokenFetcher
+from driver_manager import BrowserPool
+from request_manager import RequestManager
+from async_request_manager import AsyncRequestManager, REQUESTS_PER_SECOND, BURST_SIZE
+from retry_policy import RetryScheduler
+from clock_sync import ClockSync
+from speculative_opener import OpenProbe
+from event_stream import EventStream
+from logger import Logger
+from wake_scheduler import WakeScheduler
+from validator import MAX_CREDITS
+from run import read_inputs, validate_crn_list, OBS_BASE_URL, TARGET_URL, COURSE_SELECTION_URL, COURSE_TIME_CHECK_URL, SPAM_DUR, CLOCK_SYNC_DEADLINE, DELAY_BETWEEN_TIME_CHECKS, MAX_EXTRA_WAIT_TIME, DELAY_BETWEEN_TRIES
+import argparse
+import asyncio
+
+# === CONSTANTS ===
+BROWSER_POOL_SIZE = 2 # Maximum number of browsers open at the same time, only used by the accounts whose HTTP login fails.
+LOGIN_CONCURRENCY = 4 # Number of accounts logging in at the same time.
+FIRST_TOKEN_TIMEOUT = 180 # Seconds to wait for the first token of every account.
+TOKEN_LEAD = 60 * 5 # Seconds before the first registration the tokens are fetched.
+WARM_UP_LEAD = 15 # Seconds before the first registration the connections are opened and the clock is synchronized.
+
+# === CLASS DEFINITON ===
+class Account:
+    """The inputs of one config file and the objects that work for it."""
+    def __init__(self, config_file_path: str, test_mode: bool, max_credits: float = MAX_CREDITS) -> None:
+        self.config_file_path = config_file_path
+        self.login, self.password, crn_slots, self.scrn_list, self.start_time, self.retry_config = read_inputs(test_mode, config_file_path)
+        self.crn_slots = validate_crn_list(crn_slots, max_credits)
+        self.crn_list = [slot[0] for slot in self.crn_slots]
+        self.token_fetcher = None
+        self.request_manager = None
+
+class BatchRunner:
+    """
+    Runs the course selection of several accounts in a single process.
+
+    Tokens are fetched over HTTP, the browser fallback borrows from a small shared pool. A single clock synchronization
+    serves every account, and the selection requests of all accounts are driven by one event loop, each account with
+    its own token bucket so that one account's rate budget doesn't depend on the others. If the server's clock can't be
+    read, a single `OpenProbe` sends the time checks and signals every account once the selection opens.
+    """
+    def __init__(self, accounts: list[Account], browser_pool: BrowserPool, requests_per_second: float = REQUESTS_PER_SECOND, burst_size: int = BURST_SIZE) -> None:
+        self.accounts = accounts
+        self.browser_pool = browser_pool
+        self.requests_per_second = requests_per_second
+        self.burst_size = burst_size
+        self.clock_sync = None
+        self.open_probe = None
+
+    def start_token_fetchers(self, static_token: str | None = None, use_http_login: bool = True, use_lean_browser: bool = False) -> None:
+        for account in self.accounts:
+            if static_token:
+                account.token_fetcher = StaticTokenFetcher(static_token)
+            else:
+                account.token_fetcher = ContinuousTokenFetcher(TARGET_URL, account.login, account.password, use_headless_browser=self.browser_pool.headless,
+                                                               use_http_login=use_http_login, use_proxy=self.browser_pool.use_proxy,
+                                                               use_lean_browser=use_lean_browser, browser_pool=self.browser_pool)
+
+        # The logins wait on the network, a few of them run at the same time.
+        with ThreadPoolExecutor(max_workers=LOGIN_CONCURRENCY, thread_name_prefix="Login") as executor:
+            list(executor.map(lambda account: account.token_fetcher.login_to_kepler(), self.accounts))
+        for account in self.accounts:
+            account.token_fetcher.start()
+
+    def drop_accounts_without_token(self) -> None:
+        ready = []
+        for account in self.accounts:
+            if account.token_fetcher.wait_for_first_token(timeout=FIRST_TOKEN_TIMEOUT):
+                ready.append(account)
+            else:
+                Logger.log(f"{account.login} hesabı için token alınamadı, bu hesap için ders seçimi yapılmayacak.")
+                account.token_fetcher.stop()
+        self.accounts = ready
+
+    def create_request_managers(self) -> None:
+        for account in self.accounts:
+            account.request_manager = RequestManager(account.token_fetcher.get_token, COURSE_SELECTION_URL, COURSE_TIME_CHECK_URL, account.crn_slots,
+                                                     on_unauthorized=account.token_fetcher.request_refresh)
+            account.crn_list = list(account.request_manager.chains.heads)
+
+    def synchronize_clock(self, deadline: float) -> None:
+        """Opens the connections of every account and synchronizes the clock once, the offset is the same for every account."""
+        for account in self.accounts:
+            account.request_manager.warm_up()
+        self.clock_sync = ClockSync(self.accounts[0].request_manager.probe_server_time)
+        if not self.clock_sync.synchronize(deadline=deadline):
+            Logger.log("Sunucu saati okunamadı, ders seçiminin açılması bütün hesaplar için tek bir zaman kontrolü ile beklenecek.")
+            self.create_open_probe()
+
+    def create_open_probe(self) -> None:
+        """The time checks are sent with the account that registers first, the others are signalled by the same probe."""
+        first_account = min(self.accounts, key=lambda account: account.start_time)
+        self.open_probe = OpenProbe(first_account.request_manager, DELAY_BETWEEN_TIME_CHECKS)
+
+    def get_send_time(self, account: Account) -> float:
+        if self.clock_sync is not None and self.clock_sync.is_synced:
+            return self.clock_sync.send_time_for(account.start_time.timestamp())
+        return account.start_time.timestamp()
+
+    async def wait_for_open(self, account: Account, opened: asyncio.Event | None) -> None:
+        send_time = self.get_send_time(account)
+        first_start = min(other.start_time for other in self.accounts)
+        # The probe only checks the first registration, the accounts that register later also wait for their own time.
+        if opened is None or account.start_time > first_start:
+            await WakeScheduler.sleep_until_async(send_time, f"açılış ({account.login})")
+        if opened is None:
+            return
+
+        try:
+            await asyncio.wait_for(opened.wait(), timeout=max(0, send_time + MAX_EXTRA_WAIT_TIME - time()))
+        except asyncio.TimeoutError:
+            Logger.log(f"{account.login} hesabı için ders seçimi zaman kontrolü maksimum bekleme süresine ({MAX_EXTRA_WAIT_TIME} saniye) ulaşıldı. "
+                       "Ders seçimi başlamamış gözükmesine rağmen seçmeye çalışılacak.")
+
+    async def run_account(self, account: Account, duration: float, max_attempts: int | None, opened: asyncio.Event | None = None) -> None:
+        await self.wait_for_open(account, opened)
+
+        Logger.log(f"{account.login} hesabı için dersler seçiliyor...")
+        # Every account keeps the retry rules and the request budget of its own config.
+        retry_scheduler = RetryScheduler.from_config(account.retry_config, DELAY_BETWEEN_TRIES, duration)
+        manager = AsyncRequestManager(account.request_manager, requests_per_second=self.requests_per_second, burst_size=self.burst_size,
+                                      retry_scheduler=retry_scheduler)
+        crn_list, scrn_list, timed_out = await manager.run(account.crn_list, account.scrn_list, duration, max_attempts=max_attempts)
+
+        if timed_out:
+            Logger.log(f"{account.login} hesabının ders seçim isteği zaman aşımına uğradı, bu hesap için tekrar denenmeyecek.")
+        elif len(crn_list) == 0 and len(scrn_list) == 0:
+            Logger.log(f"{account.login} hesabı için bütün dersler başarıyla alındı/bırakıldı.")
+        else:
+            Logger.log(f"{account.login} hesabı için alınamayan CRN'ler: {crn_list}, bırakılamayan SCRN'ler: {scrn_list}.")
+
+    async def run(self, duration: float, max_attempts: int | None = None) -> None:
+        opened = None
+        if self.open_probe is not None:
+            loop = asyncio.get_running_loop()
+            opened = asyncio.Event()
+            def on_time_check(t_send: float, is_open: bool) -> None:
+                if is_open:
+                    loop.call_soon_threadsafe(opened.set)
+            self.open_probe.add_listener(on_time_check)
+            Logger.log("Ders seçiminin başlaması bekleniyor...")
+            self.open_probe.start()
+        await asyncio.gather(*(self.run_account(account, duration, max_attempts, opened) for account in self.accounts))
+
+    def stop(self) -> None:
+        if self.open_probe is not None:
+            self.open_probe.stop()
+        for account in self.accounts:
+            account.token_fetcher.stop()
+
+parser = argparse.ArgumentParser(prog="itu-ders-secici-batch", description="Birden fazla hesap için ders seçimini tek bir süreçte yapar.")
+parser.add_argument("configs", nargs="+", help="Hesapların config dosyaları.")
+parser.add_argument("-test", "--test", "-t", help="Test modunu açar, ders kayıt vaktinin gelip gelmediğine bakmaksızın seçim yapar.", action="store_true", default=False)
+parser.add_argument("--show-browser", help="Tarayıcı pencerelerini gösterir.", action="store_true", default=False)
+parser.add_argument("--browser-login", help="Token'ı HTTP üzerinden almayı denemeden doğrudan tarayıcı ile giriş yapar.", action="store_true", default=False)
+parser.add_argument("--no-proxy", help="Tarayıcı ile giriş yapılırsa selenium-wire proxy'si yerine Chrome DevTools ağ olayları ile token okunur.", action="store_true", default=False)
+parser.add_argument("--lean-browser", help="Tarayıcılar resim, yazı tipi ve medya yüklemeden açılır.", action="store_true", default=False)
+parser.add_argument("--pool-size", help="Aynı anda açık olabilecek en fazla tarayıcı sayısı.", type=int, default=BROWSER_POOL_SIZE)
+parser.add_argument("--requests-per-second", help="Her hesap için saniyede gönderilebilecek ders seçim isteği sayısı.", type=float, default=REQUESTS_PER_SECOND)
+parser.add_argument("--base-url", help=f"OBS sunucusunun adresi, yerel test sunucusu (mock_server.py) ile denemek için kullanılabilir.", default=OBS_BASE_URL)
+parser.add_argument("--token", help="Tarayıcı açmadan bütün hesaplar için verilen API Token'ı kullanır, yerel test sunucusu ile denemek için kullanılabilir.", default=None)
+parser.add_argument("--duration", help="Ders seçim isteklerinin kaç saniye boyunca gönderileceği.", type=float, default=None)
+parser.add_argument("--max-credits", help="Her hesap için kredi sınırı, aşılırsa uyarı verilir (dersler yine de denenir).", type=float, default=MAX_CREDITS)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    EventStream.enable()
+    test_mode = args.test
+    duration = args.duration if args.duration is not None else (10 if test_mode else SPAM_DUR)
+
+    base_url = args.base_url.rstrip("/")
+    TARGET_URL = TARGET_URL.replace(OBS_BASE_URL, base_url)
+    COURSE_SELECTION_URL = COURSE_SELECTION_URL.replace(OBS_BASE_URL, base_url)
+    COURSE_TIME_CHECK_URL = COURSE_TIME_CHECK_URL.replace(OBS_BASE_URL, base_url)
+
+    accounts = [Account(config_file_path, test_mode, args.max_credits) for config_file_path in args.configs]
+    accounts = [account for account in accounts if account.crn_list or account.scrn_list]
+    if not accounts:
+        Logger.log("Hiçbir hesabın CRN ve SCRN listesi dolu değil, ders seçimi yapılmayacak.")
+        exit()
+    first_start = min(account.start_time.timestamp() for account in accounts)
+    Logger.log(f"{len(accounts)} hesap için ders seçimi yapılacak, ilk ders seçimi {datetime.fromtimestamp(first_start)}.")
+
+    WakeScheduler.sleep_until(first_start - TOKEN_LEAD, "T-5dk")
+    browser_pool = BrowserPool(args.pool_size, headless=not args.show_browser, use_proxy=not args.no_proxy, lean=args.lean_browser)
+    runner = BatchRunner(accounts, browser_pool, requests_per_second=args.requests_per_second)
+    runner.start_token_fetchers(args.token, use_http_login=not args.browser_login, use_lean_browser=args.lean_browser)
+    runner.drop_accounts_without_token()
+    if not runner.accounts:
+        Logger.log("Hiçbir hesap için token alınamadı, program sonlandırılıyor.")
+        exit(1)
+
+    runner.create_request_managers()
+    for account in runner.accounts:
+        EventStream.emit("open", open_time=account.start_time.timestamp())
+
+    if not test_mode:
+        WakeScheduler.sleep_until(first_start - WARM_UP_LEAD, "T-15sn")
+        runner.synchronize_clock(deadline=first_start - CLOCK_SYNC_DEADLINE)
+    else:
+        for account in runner.accounts:
+            account.request_manager.warm_up()
+
+    try:
+        asyncio.run(runner.run(duration, max_attempts=1 if test_mode else None))
+    finally:
+        runner.stop()
@@ -0,0 +1,473 @@
+# === IMPORTS ===
+from time import perf_counter, sleep, time
+from datetime import datetime
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from functools import partial
+from mock_server import MockObsServer
+from logger import Logger
+from request_manager import RequestManager
+from catalog import Catalog, SOURCES
+from crn_chain import CrnChains
+from requests.adapters import HTTPAdapter
+import contextlib
+import threading
+import requests
+import subprocess
+import tempfile
+import argparse
+import math
+import json
+import sys
+import os
+
+# === CONSTANTS ===
+LOGGER_MESSAGE_COUNT = 100000
+LOGGER_BUCKET_COUNT = 10
+E2E_OPEN_DELAY = 25 # Seconds between the start of the benchmark and the open, enough for run.py to reach the clock sync phase.
+E2E_CRNS = ["21340", "21345:21346", "21332"]
+E2E_QUOTAS = {"21345": 0} # The first choice of the second course is full, so the backup has to be used.
+REQUEST_ITERATIONS = 20000
+REQUEST_CRNS = ["21340", "21345", "21332", "21333", "21350", "21351"]
+REQUEST_RESPONSE = json.dumps({"ecrnResultList": [{"crn": crn, "resultCode": "VAL02", "resultData": None} for crn in REQUEST_CRNS], "scrnResultList": []}).encode()
+LOGIN_TARGET_PATH = "/ogrenci/DersKayitIslemleri/DersKayit"
+LOGIN_TIMEOUT = 120
+FAILOVER_POLL_INTERVAL = .01 # Seconds between two selection attempts while the session is logged out.
+RUN_PY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "run.py")
+STARTUP_RUNS = 5
+STARTUP_BUDGET = 1. # Seconds from starting run.py to its first log line.
+BROWSER_MODULES = ("selenium", "seleniumwire", "webdriver_manager") # Must not be imported unless a browser is started.
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json") # Committed, only replaced with `--update-baseline`.
+REGRESSION_TOLERANCE = .25 # A hot path fails the suite once its p50 is this much slower than the baseline.
+SUITE_ROUNDS = 3 # The suite is run this many times and the fastest p50 of every hot path is kept, the slower rounds are noise.
+SELECTION_ITERATIONS = 5000
+SELECTION_SLOTS = [["21340", "21341"], ["21345", "21346", "21347"], ["21332"], ["21333", "21334"], ["21350"], ["21351", "21352"]]
+SELECTION_SCRNS = ["22010", "22011"]
+# Result codes of the ECRN and SCRN lists of every synthetic response, in the order of `SELECTION_SLOTS` and `SELECTION_SCRNS`.
+SELECTION_MIXES = {
+    "all_success": (["successResult"] * 6, ["Silme İşlemi Başarılı"] * 2),
+    "not_open": (["VAL02"] * 6, ["VAL02"] * 2),
+    "quota_full_backup": (["VAL06", "Kontenjan Dolu", "VAL06", "VAL06", "VAL06", "VAL06"], ["VAL02"] * 2),
+    "mixed": (["successResult", "VAL06", "VAL02", "VAL09", "VAL14", "VAL99"], ["Silme İşlemi Başarılı", "VAL10"]),
+    "lockout": (["VAL02", "VAL21", "VAL02", "VAL02", "VAL02", "VAL02"], []),
+}
+READ_INPUTS_ITERATIONS = 2000
+# The baseline is recorded on one machine, its p50s are scaled by how fast this machine runs the calibration workload.
+CALIBRATION_NAME = "calibration_us"
+CALIBRATION_BATCHES = 200
+CALIBRATION_BATCH_SIZE = 100
+CATALOG_RUNS = 5
+CATALOG_LESSON_ROWS = 15000 # About the size of a semester of lessons.psv.
+CATALOG_COURSE_ROWS = 6000
+TOKEN_BATCHES = 2000
+TOKEN_BATCH_SIZE = 1000 # `get_token` calls timed together, a single call is shorter than the timer's resolution.
+
+# === BENCHMARKS ===
+def percentile(values: list[float], ratio: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+def benchmark_logger(message_count: int = LOGGER_MESSAGE_COUNT, bucket_count: int = LOGGER_BUCKET_COUNT) -> list[tuple[float, float]]:
+    """Measures the latency of `Logger.log` over `message_count` messages, returns the (p50, p99) of every bucket in microseconds."""
+    bucket_size = message_count // bucket_count
+    results = []
+    for bucket in range(bucket_count):
+        durations = []
+        for i in range(bucket_size):
+            start = perf_counter()
+            Logger.log(f"Benchmark mesajı {bucket * bucket_size + i}: {'x' * 64}", silent=True)
+            durations.append((perf_counter() - start) * 1e6)
+        results.append((percentile(durations, .5), percentile(durations, .99)))
+    Logger.flush()
+    return results
+
+class CannedAdapter(HTTPAdapter):
+    """Answers every request with the same response without touching the network, so that only the client side is measured."""
+    def __init__(self, content: bytes = REQUEST_RESPONSE) -> None:
+        super().__init__()
+        self.content = content
+
+    def send(self, request, **kwargs) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response._content = self.content
+        # No charset, like the API, so `response.text` has to guess the encoding.
+        response.headers["Content-Type"] = "application/json"
+        response.request = request
+        response.url = request.url
+        return response
+
+def benchmark_request_overhead(iterations: int = REQUEST_ITERATIONS) -> dict[str, tuple[float, float]]:
+    """Measures the client side cost of one selection attempt, building the request and parsing the response, returns the (p50, p99) of both ways in microseconds."""
+    request_manager = RequestManager(lambda: "Bearer benchmark", "http://obs.invalid/api/ders-kayit/v21/", "http://obs.invalid/api/ogrenci/Takvim/KayitZamaniKontrolu")
+    request_manager.session.mount("http://", CannedAdapter())
+
+    def rebuilt() -> None:
+        response = request_manager._send("POST", request_manager.course_selection_url, json={"ECRN": REQUEST_CRNS, "SCRN": []})
+        json.loads(response.text)
+
+    def prepared() -> None:
+        response = request_manager._send("POST", request_manager.course_selection_url, prepared=request_manager.prepare_selection_request(REQUEST_CRNS, []))
+        json.loads(response.content)
+
+    results = {}
+    for name, attempt in [("Her seferinde oluşturulan istek", rebuilt), ("Hazırlanmış istek", prepared)]:
+        durations = []
+        for _ in range(iterations):
+            start = perf_counter()
+            attempt()
+            durations.append((perf_counter() - start) * 1e6)
+        results[name] = (percentile(durations, .5), percentile(durations, .99))
+    return results
+
+def write_config(work_dir: str, open_time: float, crns: list[str]) -> str:
+    """Writes a config file for `run.py` to `work_dir` and returns its path."""
+    open_datetime = datetime.fromtimestamp(open_time)
+    config = {
+        "account": {"username": "benchmark", "password": "benchmark"},
+        "time": {"year": open_datetime.year, "month": open_datetime.month, "day": open_datetime.day, "hour": open_datetime.hour, "minute": open_datetime.minute, "seconds": open_datetime.second},
+        "courses": {"crn": crns, "scrn": []},
+    }
+    config_path = os.path.join(work_dir, "config.json")
+    with open(config_path, "w") as f:
+        json.dump(config, f)
+    return config_path
+
+def benchmark_e2e(mode: str = "sync", skew: float = .4, latency: str = "lognormal:-1.5,0.5", overload_rate: float = 0, seat_drain: float = 0, duration: float = 30, seed: int | None = 0, speculative: bool = False) -> dict:
+    """Runs `run.py` against a local mock server and returns the server side report of the run."""
+    open_time = math.ceil(time() + E2E_OPEN_DELAY)
+    server = MockObsServer(skew=skew, open_time=open_time, quotas=E2E_QUOTAS, seat_drain=seat_drain, latency=latency, overload_rate=overload_rate, seed=seed)
+    server.start()
+
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            config_path = write_config(work_dir, open_time, E2E_CRNS)
+            start = perf_counter()
+            subprocess.run(
+                [sys.executable, RUN_PY_PATH, "--config", config_path, "--base-url", server.base_url, "--token", "benchmark", "--mode", mode, "--duration", str(duration)] + (["--speculative"] if speculative else []),
+                cwd=work_dir, input="h\n", text=True, stdout=subprocess.DEVNULL, check=False,
+            )
+            report = server.report()
+            report["run_duration"] = perf_counter() - start
+    finally:
+        server.stop()
+    return report
+
+def benchmark_login(use_http_login: bool = False, use_proxy: bool = True, show_browser: bool = False, identity_count: int = 2, latency: str = "0.05", lean: bool = False) -> float | None:
+    """Measures the seconds from the start of the token fetcher to the first token against a local mock server, `None` if no token arrives."""
+    from token_fetcher import ContinuousTokenFetcher
+
+    server = MockObsServer(latency=latency, username="benchmark", password="benchmark", identity_count=identity_count)
+    server.start()
+    token_fetcher = ContinuousTokenFetcher(server.base_url + LOGIN_TARGET_PATH, "benchmark", "benchmark",
+                                           use_headless_browser=not show_browser, use_http_login=use_http_login, use_proxy=use_proxy, use_lean_browser=lean)
+    try:
+        start = perf_counter()
+        token_fetcher.start()
+        has_token = token_fetcher.wait_for_first_token(LOGIN_TIMEOUT)
+        return perf_counter() - start if has_token else None
+    finally:
+        token_fetcher.stop()
+        server.stop()
+
+def benchmark_failover(use_standby: bool, latency: str = "0.05") -> float | None:
+    """
+    Logs out the session of the token in use over HTTP login and measures the seconds until `get_token` hands out a
+    valid token again, `None` if it doesn't within `LOGIN_TIMEOUT`. A rejected token is reported with `request_refresh`
+    the way `RequestManager` reports a 401.
+    """
+    from token_fetcher import ContinuousTokenFetcher, StandbyTokenProvider
+
+    server = MockObsServer(latency=latency, username="benchmark", password="benchmark")
+    server.start()
+    create_fetcher = lambda: ContinuousTokenFetcher(server.base_url + LOGIN_TARGET_PATH, "benchmark", "benchmark", use_http_login=True)
+    token_fetcher = StandbyTokenProvider(create_fetcher(), create_fetcher()) if use_standby else create_fetcher()
+    try:
+        token_fetcher.login_to_kepler()
+        token_fetcher.start()
+        if not token_fetcher.wait_for_first_token(LOGIN_TIMEOUT):
+            return None
+        # The standby logs in on its own thread, the logout is only meaningful once it is ready.
+        while use_standby and not all(fetcher.is_session_alive for fetcher in token_fetcher.fetchers):
+            sleep(FAILOVER_POLL_INTERVAL)
+
+        server.expire_session_of(token_fetcher.get_token())
+        start = perf_counter()
+        while perf_counter() - start < LOGIN_TIMEOUT:
+            if server.is_token_valid(token_fetcher.get_token()):
+                return perf_counter() - start
+            token_fetcher.request_refresh()
+            sleep(FAILOVER_POLL_INTERVAL)
+        return None
+    finally:
+        token_fetcher.stop()
+        server.stop()
+
+def benchmark_startup(run_count: int = STARTUP_RUNS) -> tuple[list[float], list[str]]:
+    """
+    Measures the seconds from starting `run.py` to its first log line, over `run_count` cold starts.
+
+    Returns:
+        The durations and the browser packages imported by `run.py` before any browser is needed.
+    """
+    durations = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        # The open is a day away, run.py is stopped once it logs its first line.
+        config_path = write_config(work_dir, time() + 60 * 60 * 24, E2E_CRNS)
+        for _ in range(run_count):
+            start = perf_counter()
+            process = subprocess.Popen([sys.executable, RUN_PY_PATH, "--config", config_path, "--token", "benchmark"], cwd=work_dir,
+                                       stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, env={**os.environ, "PYTHONUNBUFFERED": "1"})
+            process.stdin.write("h\n")
+            process.stdin.flush()
+            process.stdout.readline() # The prompt and the first log line, the prompt has no line break.
+            durations.append(perf_counter() - start)
+            process.kill()
+            process.wait()
+
+        check = f"import sys; sys.path.insert(0, {os.path.dirname(RUN_PY_PATH)!r}); import run; print(' '.join(sorted(sys.modules)))"
+        modules = subprocess.run([sys.executable, "-c", check], cwd=work_dir, capture_output=True, text=True, check=True).stdout.split()
+    return durations, sorted({module.split(".")[0] for module in modules} & set(BROWSER_MODULES))
+
+def create_selection_response(ecrn_codes: list[str], scrn_codes: list[str]) -> bytes:
+    result = lambda crn, code: {"crn": crn, "resultCode": code, "resultData": None}
+    return json.dumps({"ecrnResultList": [result(slot[0], code) for slot, code in zip(SELECTION_SLOTS, ecrn_codes)],
+                       "scrnResultList": [result(crn, code) for crn, code in zip(SELECTION_SCRNS, scrn_codes)]}).encode()
+
+def benchmark_selection_mixes(iterations: int = SELECTION_ITERATIONS) -> dict[str, tuple[float, float]]:
+    """Measures `request_course_selection` on a canned response of every result code mix, returns the (p50, p99) of each in microseconds."""
+    results = {}
+    for name, (ecrn_codes, scrn_codes) in SELECTION_MIXES.items():
+        request_manager = RequestManager(lambda: "Bearer benchmark", "http://obs.invalid/api/ders-kayit/v21/", "http://obs.invalid/api/ogrenci/Takvim/KayitZamaniKontrolu", SELECTION_SLOTS)
+        request_manager.session.mount("http://", CannedAdapter(create_selection_response(ecrn_codes, scrn_codes)))
+        durations = []
+        for _ in range(iterations):
+            # Every attempt starts from the first CRNs, the backup swaps of the previous one are undone.
+            request_manager.chains = CrnChains(SELECTION_SLOTS, RequestManager.result_actions)
+            crn_list, scrn_list = [slot[0] for slot in SELECTION_SLOTS], list(SELECTION_SCRNS)
+            start = perf_counter()
+            request_manager.request_course_selection(crn_list, scrn_list)
+            durations.append((perf_counter() - start) * 1e6)
+        results[name] = (percentile(durations, .5), percentile(durations, .99))
+    return results
+
+def benchmark_read_inputs(iterations: int = READ_INPUTS_ITERATIONS) -> tuple[float, float]:
+    """Measures `read_inputs` on a config with backup CRNs, SCRNs and retry rules, returns the (p50, p99) in microseconds."""
+    from run import read_inputs
+
+    durations = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        config_path = write_config(work_dir, time() + 60 * 60, [":".join(slot) for slot in SELECTION_SLOTS])
+        with open(config_path) as f:
+            config = json.load(f)
+        config["courses"]["scrn"] = SELECTION_SCRNS
+        config["retry"] = {"rules": [{"codes": ["VAL06"], "type": "fixed", "delay": 5}]}
+        with open(config_path, "w") as f:
+            json.dump(config, f)
+
+        for _ in range(iterations):
+            start = perf_counter()
+            read_inputs(False, config_path)
+            durations.append((perf_counter() - start) * 1e6)
+    return percentile(durations, .5), percentile(durations, .99)
+
+def write_catalog_files(work_dir: str) -> None:
+    """Writes ITU Helper shaped lessons.psv and courses.psv files of full size to `work_dir`."""
+    days = ["Pazartesi", "Salı", "Çarşamba", "Perşembe", "Cuma"]
+    with open(os.path.join(work_dir, "lessons.psv"), "w", encoding="utf-8") as f:
+        for i in range(CATALOG_LESSON_ROWS):
+            course = f"BLG {100 + i % CATALOG_COURSE_ROWS}"
+            f.write(f"{20000 + i}|{course}|Yüz Yüze|Öğr. Gör. Ad Soyad {i % 900}|EEB|{days[i % 5]} {days[(i + 2) % 5]}|0830/1129 1330/1529|5202|60|{i % 61}|-|BLG, BLGE, YZV\n")
+    with open(os.path.join(work_dir, "courses.psv"), "w", encoding="utf-8") as f:
+        for i in range(CATALOG_COURSE_ROWS):
+            f.write(f"BLG {100 + i}|Ders Adı {i}|Bilgisayar ve Bilişim Fakültesi|{3 + i % 3}|{i % 8}|Türkçe|(BLG 101 MIN DD veya BLG 102E MIN DD)|Dersin içeriği {'x' * 200}\n")
+
+class QuietFileHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args) -> None:
+        pass
+
+def benchmark_catalog(run_count: int = CATALOG_RUNS) -> tuple[float, float]:
+    """Measures `Catalog.refresh` downloading and parsing full-size PSV files from a local server, returns the (p50, p99) in microseconds."""
+    durations = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        write_catalog_files(work_dir)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietFileHandler, directory=work_dir))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        sources = [(table, f"http://127.0.0.1:{server.server_port}/{url.rsplit('/', 1)[-1]}", row_type, columns)
+                   for table, url, row_type, columns in SOURCES]
+        try:
+            for i in range(run_count):
+                # A new snapshot has no validators of an earlier download, so every run parses both files.
+                catalog = Catalog(os.path.join(work_dir, f"catalog_{i}.sqlite3"), sources)
+                start = perf_counter()
+                catalog.refresh()
+                durations.append((perf_counter() - start) * 1e6)
+        finally:
+            server.shutdown()
+            server.server_close()
+    return percentile(durations, .5), percentile(durations, .99)
+
+def benchmark_calibration(batch_count: int = CALIBRATION_BATCHES, batch_size: int = CALIBRATION_BATCH_SIZE) -> tuple[float, float]:
+    """Measures a fixed workload that doesn't depend on the client code, returns the (p50, p99) of a batch in microseconds."""
+    durations = []
+    for _ in range(batch_count):
+        start = perf_counter()
+        for _ in range(batch_size):
+            response = json.loads(REQUEST_RESPONSE)
+            codes = {result["crn"]: result["resultCode"] for result in response["ecrnResultList"]}
+            "|".join(sorted(codes)).split("|")
+        durations.append((perf_counter() - start) * 1e6)
+    return percentile(durations, .5), percentile(durations, .99)
+
+def benchmark_token_contention(batch_count: int = TOKEN_BATCHES, batch_size: int = TOKEN_BATCH_SIZE) -> dict[str, tuple[float, float]]:
+    """Measures `ContinuousTokenFetcher.get_token` alone and while another thread keeps storing new tokens, returns the (p50, p99) of a call in nanoseconds."""
+    from token_fetcher import ContinuousTokenFetcher
+
+    token_fetcher = ContinuousTokenFetcher("http://obs.invalid/", "benchmark", "benchmark", use_http_login=False)
+    token_fetcher._update_token("Bearer benchmark-0")
+    stop_event = threading.Event()
+
+    def write_tokens() -> None:
+        i = 1
+        while not stop_event.is_set():
+            token_fetcher._update_token(f"Bearer benchmark-{i}")
+            i += 1
+
+    results = {}
+    for name in ("uncontended", "contended"):
+        writer = threading.Thread(target=write_tokens, daemon=True) if name == "contended" else None
+        if writer is not None:
+            writer.start()
+        durations = []
+        for _ in range(batch_count):
+            start = perf_counter()
+            for _ in range(batch_size):
+                token_fetcher.get_token()
+            durations.append((perf_counter() - start) / batch_size * 1e9)
+        if writer is not None:
+            stop_event.set()
+            writer.join()
+        results[name] = (percentile(durations, .5), percentile(durations, .99))
+    return results
+
+def run_suite_once() -> dict[str, dict[str, float]]:
+    """Runs every hot path benchmark, returns the p50 and p99 of each under a stable name."""
+    results = {CALIBRATION_NAME: dict(zip(("p50", "p99"), benchmark_calibration()))}
+    # The hot paths print their logs, the console isn't part of what is measured.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for name, (p50, p99) in benchmark_selection_mixes().items():
+            results[f"selection.{name}_us"] = {"p50": p50, "p99": p99}
+        # The first bucket also pays for starting the writer thread, the median of the buckets is stable between runs.
+        logger_buckets = benchmark_logger()
+        results["logger_us"] = {"p50": percentile([p50 for p50, _ in logger_buckets], .5), "p99": max(p99 for _, p99 in logger_buckets)}
+        results["read_inputs_us"] = dict(zip(("p50", "p99"), benchmark_read_inputs()))
+        results["catalog.refresh_us"] = dict(zip(("p50", "p99"), benchmark_catalog()))
+        for name, (p50, p99) in benchmark_token_contention().items():
+            results[f"get_token.{name}_ns"] = {"p50": p50, "p99": p99}
+    return results
+
+def run_suite(round_count: int = SUITE_ROUNDS) -> dict[str, dict[str, float]]:
+    """Runs the suite `round_count` times and keeps the round with the fastest p50 of every hot path."""
+    results = {}
+    for _ in range(round_count):
+        for name, result in run_suite_once().items():
+            if name not in results or result["p50"] < results[name]["p50"]:
+                results[name] = result
+    return results
+
+def get_baseline_scale(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]]) -> float:
+    """Returns how much slower this machine runs the calibration workload than the machine the baseline was recorded on."""
+    if CALIBRATION_NAME not in results or CALIBRATION_NAME not in baseline:
+        return 1.
+    return results[CALIBRATION_NAME]["p50"] / baseline[CALIBRATION_NAME]["p50"]
+
+def compare_with_baseline(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], tolerance: float) -> list[str]:
+    """Returns the names of the hot paths whose p50 is more than `tolerance` slower than the baseline, scaled to the speed of this machine."""
+    scale = get_baseline_scale(results, baseline)
+    return [name for name, result in results.items()
+            if name != CALIBRATION_NAME and name in baseline and result["p50"] > baseline[name]["p50"] * scale * (1 + tolerance)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="İstemcinin kritik yollarını ölçer.")
+    parser.add_argument("target", choices=["logger", "e2e", "login", "failover", "request", "startup", "suite"])
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync", help="e2e için ders seçim modu.")
+    parser.add_argument("--skew", type=float, default=.4, help="e2e için sunucu saatinin yerel saatten farkı.")
+    parser.add_argument("--latency", default="lognormal:-1.5,0.5", help="e2e için sunucu yanıt gecikmesi.")
+    parser.add_argument("--overload-rate", type=float, default=0, help="e2e için VAL14 olasılığı.")
+    parser.add_argument("--seat-drain", type=float, default=0, help="e2e için saniyede dolan kontenjan.")
+    parser.add_argument("--speculative", action="store_true", help="e2e için ilk isteği tahmin edilen açılış anında gönderir.")
+    parser.add_argument("--http", action="store_true", help="login için tarayıcı yerine HTTP ile giriş yapar.")
+    parser.add_argument("--no-proxy", action="store_true", help="login için token'ı selenium-wire yerine Chrome performans kayıtlarından okur.")
+    parser.add_argument("--show-browser", action="store_true", help="login için tarayıcıyı görünür açar.")
+    parser.add_argument("--lean", action="store_true", help="login için tarayıcıyı sade modda ve kalıcı profil ile açar, ikinci çalıştırma oturumu yeniden kullanır.")
+    parser.add_argument("--identities", type=int, default=2, help="login için hesap sayısı, 1'den fazlası hesap seçim sayfasını da ölçer.")
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET, help="startup için ilk log satırına kadar izin verilen en uzun süre (saniye), aşılırsa çıkış kodu 1 olur.")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="suite için karşılaştırılacak sonuçların dosyası, yoksa suite başarısız olur.")
+    parser.add_argument("--update-baseline", action="store_true", help="suite sonuçlarını karşılaştırmadan referans dosyasına yazar, dosya yoksa oluşturur.")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE, help="suite için p50'nin referanstan en fazla ne oranda yavaş olabileceği, aşılırsa çıkış kodu 1 olur.")
+    args = parser.parse_args()
+
+    if args.target == "logger":
+        results = benchmark_logger()
+        bucket_size = LOGGER_MESSAGE_COUNT // LOGGER_BUCKET_COUNT
+        for i, (p50, p99) in enumerate(results):
+            print(f"Mesaj {i * bucket_size:>6}-{(i + 1) * bucket_size:>6}: p50 {p50:6.2f} µs, p99 {p99:6.2f} µs")
+        print(f"Son/ilk p50 oranı: {results[-1][0] / results[0][0]:.2f}")
+    elif args.target == "e2e":
+        report = benchmark_e2e(args.mode, args.skew, args.latency, args.overload_rate, args.seat_drain, speculative=args.speculative)
+        for crn, duration in report["time_to_first_success"].items():
+            print(f"CRN {crn}: açılıştan {duration * 1000:.1f} ms sonra alındı.")
+        print(f"Ders seçim isteği: {report['selection_requests']}, boşa giden: {report['wasted_requests']}, kilitlenme (VAL21): {report['lockouts']}.")
+        print(f"Zaman kontrolü isteği: {report['time_checks']}, sonuç kodları: {report['codes']}.")
+    elif args.target == "login":
+        duration = benchmark_login(args.http, not args.no_proxy, args.show_browser, args.identities, lean=args.lean)
+        print(f"İlk token {duration:.2f} saniyede alındı." if duration is not None else f"{LOGIN_TIMEOUT} saniye içinde token alınamadı.")
+    elif args.target == "failover":
+        for use_standby in (False, True):
+            duration = benchmark_failover(use_standby)
+            name = "Yedek oturum ile" if use_standby else "Yedek oturum olmadan"
+            print(f"{name}: çıkıştan sonra {duration * 1000:.1f} ms içinde geçerli token verildi." if duration is not None else f"{name}: {LOGIN_TIMEOUT} saniye içinde geçerli token verilmedi.")
+    elif args.target == "request":
+        for name, (p50, p99) in benchmark_request_overhead().items():
+            print(f"{name}: p50 {p50:7.2f} µs, p99 {p99:7.2f} µs")
+    elif args.target == "startup":
+        durations, browser_modules = benchmark_startup()
+        median = percentile(durations, .5)
+        print(f"İlk log satırına kadar: p50 {median * 1000:.0f} ms, maks {max(durations) * 1000:.0f} ms (sınır {args.budget * 1000:.0f} ms).")
+        if browser_modules:
+            print(f"Tarayıcı kullanılmadan yüklenen modüller: {', '.join(browser_modules)}.")
+        if median > args.budget or browser_modules:
+            print("Başlangıç süresi sınırı aşıldı.")
+            exit(1)
+    elif args.target == "suite":
+        results = run_suite()
+        baseline = None
+        if not args.update_baseline and os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+
+        scale = get_baseline_scale(results, baseline) if baseline is not None else 1.
+        if baseline is not None:
+            print(f"Bu makine kalibrasyon iş yükünü referansın {scale:.2f} katı sürede çalıştırdı, referans süreler buna göre ölçeklendi.")
+        for name, result in results.items():
+            line = f"{name:<32} p50 {result['p50']:10.2f}, p99 {result['p99']:10.2f}"
+            if baseline is not None and name in baseline:
+                reference = baseline[name]["p50"] * (scale if name != CALIBRATION_NAME else 1.)
+                line += f" (referans p50 {reference:10.2f}, {result['p50'] / reference - 1:+.0%})"
+            print(line)
+
+        if args.update_baseline:
+            os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+            with open(args.baseline, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=4)
+                f.write("\n")
+            print(f"Sonuçlar referans olarak kaydedildi: {args.baseline}")
+        elif baseline is None:
+            # A missing baseline must not pass silently, nor be replaced by the results of whichever run comes first.
+            print(f"Referans dosyası bulunamadı: {args.baseline}. Karşılaştırma yapılamadı, --update-baseline ile oluşturulabilir.")
+            exit(1)
+        else:
+            regressions = compare_with_baseline(results, baseline, args.tolerance)
+            if regressions:
+                print(f"p50'si referansın %{args.tolerance * 100:.0f} sınırından fazla yavaşlayan yollar: {', '.join(regressions)}.")
+                exit(1)
+            print(f"Bütün yollar referansın %{args.tolerance * 100:.0f} sınırı içinde.")
@@ -0,0 +1,162 @@
+# === IMPORTS ===
+from datetime import datetime
+from os import makedirs, path
+from typing import NamedTuple
+import threading
+import argparse
+import sqlite3
+import requests
+
+# === CONSTANTS ===
+ITU_HELPER_LESSONS_URL = "https://raw.githubusercontent.com/itu-helper/data/main/lessons.psv"
+ITU_HELPER_COURSES_URL = "https://raw.githubusercontent.com/itu-helper/data/main/courses.psv"
+CATALOG_DB_PATH = "data/catalog.sqlite3"
+REQUEST_TIMEOUT = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lessons (crn TEXT PRIMARY KEY, course_code TEXT, instructor TEXT, day TEXT, time TEXT);
+CREATE TABLE IF NOT EXISTS courses (code TEXT PRIMARY KEY, name TEXT, credits TEXT);
+CREATE TABLE IF NOT EXISTS sources (name TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, fetched_at TEXT);
+"""
+
+# === DATA TYPES ===
+class Lesson(NamedTuple):
+    crn: str
+    course_code: str
+    instructor: str
+    day: str
+    time: str
+
+class Course(NamedTuple):
+    code: str
+    name: str
+    credits: str
+
+# Table, URL, row type and the PSV columns of its fields.
+SOURCES = [
+    ("lessons", ITU_HELPER_LESSONS_URL, Lesson, (0, 1, 3, 5, 6)),
+    ("courses", ITU_HELPER_COURSES_URL, Course, (0, 1, 3)),
+]
+
+# === CLASS DEFINITON ===
+class Catalog:
+    """
+    Local snapshot of the ITU Helper lessons and courses, kept in `data/catalog.sqlite3`.
+
+    The snapshot is loaded into dictionaries, so lookups never touch the network or the disk. `refresh` only downloads
+    a file if it changed since the last download (ETag / Last-Modified) and parses it line by line while it streams.
+    """
+    def __init__(self, db_path: str = CATALOG_DB_PATH, sources: list[tuple[str, str, type, tuple[int, ...]]] = SOURCES) -> None:
+        self.db_path = db_path
+        self.sources = sources
+        self.lessons: dict[str, Lesson] = {}
+        self.courses: dict[str, Course] = {}
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread = None
+
+        directory = path.dirname(db_path)
+        if directory:
+            makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+        self.load()
+
+    def _connect(self) -> sqlite3.Connection:
+        # A connection per call, so that the snapshot can be refreshed from a background thread.
+        return sqlite3.connect(self.db_path)
+
+    def load(self) -> None:
+        """Reads the snapshot into memory."""
+        with self._connect() as connection:
+            lessons = {row[0]: Lesson(*row) for row in connection.execute("SELECT crn, course_code, instructor, day, time FROM lessons")}
+            courses = {row[0]: Course(*row) for row in connection.execute("SELECT code, name, credits FROM courses")}
+        # Swapped as a whole, readers never see a half-filled dictionary.
+        self.lessons, self.courses = lessons, courses
+
+    def is_empty(self) -> bool:
+        return not self.lessons
+
+    def get_lesson(self, crn: str) -> Lesson | None:
+        return self.lessons.get(crn)
+
+    def get_course(self, course_code: str) -> Course | None:
+        return self.courses.get(course_code)
+
+    def get_course_of_crn(self, crn: str) -> Course | None:
+        lesson = self.lessons.get(crn)
+        return self.courses.get(lesson.course_code) if lesson is not None else None
+
+    def get_credits(self, crn: str) -> float | None:
+        course = self.get_course_of_crn(crn)
+        try:
+            return float(course.credits)
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def parse_row(fields: list[str], row_type: type, columns: tuple[int, ...]) -> tuple:
+        return row_type(*(fields[index].strip() if index < len(fields) else "" for index in columns))
+
+    def _download(self, connection: sqlite3.Connection, table: str, url: str, row_type: type, columns: tuple[int, ...]) -> bool:
+        """Replaces `table` with the contents of `url` if it changed, returns whether it did."""
+        row = connection.execute("SELECT etag, last_modified FROM sources WHERE name = ?", (table,)).fetchone()
+        headers = {}
+        if row is not None:
+            if row[0]:
+                headers["If-None-Match"] = row[0]
+            if row[1]:
+                headers["If-Modified-Since"] = row[1]
+
+        with requests.get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+            if response.status_code == 304:
+                return False
+            response.raise_for_status()
+            response.encoding = "utf-8"
+
+            # Every line is split once, as it arrives.
+            split_lines = (line.split("|") for line in response.iter_lines(decode_unicode=True))
+            rows = (Catalog.parse_row(fields, row_type, columns) for fields in split_lines if len(fields) > 1)
+            connection.execute(f"DELETE FROM {table}")
+            connection.executemany(f"INSERT OR REPLACE INTO {table} VALUES ({', '.join('?' * len(columns))})", rows)
+            connection.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)",
+                               (table, response.headers.get("ETag"), response.headers.get("Last-Modified"), datetime.now().isoformat(timespec="seconds")))
+        return True
+
+    def refresh(self) -> bool:
+        """Downloads the files that changed since the last refresh, returns whether the snapshot changed."""
+        with self._refresh_lock:
+            # Both files are replaced in one transaction, a failed download keeps the old snapshot.
+            with self._connect() as connection:
+                changed = False
+                for table, url, row_type, columns in self.sources:
+                    changed = self._download(connection, table, url, row_type, columns) or changed
+            if changed:
+                self.load()
+            return changed
+
+    def _refresh_silently(self) -> None:
+        try:
+            self.refresh()
+        except (requests.RequestException, sqlite3.Error):
+            pass
+
+    def refresh_in_background(self) -> threading.Thread:
+        """Refreshes the snapshot on a background thread, the current one stays usable in the meantime."""
+        if self._refresh_thread is None or not self._refresh_thread.is_alive():
+            self._refresh_thread = threading.Thread(target=self._refresh_silently, name="CatalogRefresh", daemon=True)
+            self._refresh_thread.start()
+        return self._refresh_thread
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ITU Helper ders kataloğunun yerel kopyasını günceller ve CRN arar.")
+    parser.add_argument("crns", nargs="*", help="Aranacak CRN'ler.")
+    parser.add_argument("--offline", action="store_true", help="Güncellemeden sadece yerel kopyayı kullanır.")
+    args = parser.parse_args()
+
+    catalog = Catalog()
+    if not args.offline:
+        print("Katalog güncellendi." if catalog.refresh() else "Katalog zaten güncel.")
+    print(f"{len(catalog.lessons)} ders şubesi, {len(catalog.courses)} ders.")
+    for crn in args.crns:
+        lesson, course = catalog.get_lesson(crn), catalog.get_course_of_crn(crn)
+        print(f"{crn}: {lesson.course_code} ({course.name if course else '???'}) {lesson.day} {lesson.time}" if lesson else f"{crn}: bulunamadı.")
@@ -0,0 +1,139 @@
+# === IMPORTS ===
+from email.utils import parsedate_to_datetime
+from time import sleep, time
+from logger import Logger
+from event_stream import EventStream
+import argparse
+
+# === CONSTANTS ===
+MAX_SAMPLES = 10 # Maximum number of probes sent while estimating the offset.
+TARGET_ERROR = .02 # Sampling stops early once the offset is known within this many seconds.
+MIN_SAMPLE_GAP = .2 # Minimum time between two probes, in seconds.
+
+# === CLASS DEFINITON ===
+class ClockSync:
+    """
+    Estimates the offset between the local clock and the server clock from the `Date` headers of the responses.
+
+    The `Date` header only has a resolution of one second, so every sample only tells that the offset lies in
+    `[date - t_recv, date + 1 - t_send]`. The samples are intersected and the next probe is timed so that the
+    server's second boundary is predicted to fall in the middle of its flight, which halves the interval each time.
+    """
+    def __init__(self, probe) -> None:
+        """
+        Args:
+            probe: Callable that sends a request and returns `(t_send, t_recv, date_header)`, times being local epoch seconds.
+        """
+        self.probe = probe
+        self.lower = None
+        self.upper = None
+        self.rtt = None
+        self.sample_count = 0
+
+    @property
+    def is_synced(self) -> bool:
+        return self.lower is not None
+
+    @property
+    def offset(self) -> float:
+        """Estimated `server time - local time`, in seconds."""
+        return (self.lower + self.upper) / 2
+
+    @property
+    def error(self) -> float:
+        """Half width of the interval the offset is known to be in, in seconds."""
+        return (self.upper - self.lower) / 2
+
+    @staticmethod
+    def parse_date_header(date_header: str | None) -> float | None:
+        if not date_header:
+            return None
+        try:
+            return parsedate_to_datetime(date_header).timestamp()
+        except (TypeError, ValueError):
+            return None
+
+    def add_sample(self, t_send: float, t_recv: float, server_time: float) -> None:
+        lower, upper = server_time - t_recv, server_time + 1 - t_send
+        rtt = t_recv - t_send
+        self.rtt = rtt if self.rtt is None else min(self.rtt, rtt)
+        self.sample_count += 1
+
+        # The new sample does not overlap with the previous ones, the local clock must have been stepped, so start over.
+        if self.lower is None or lower > self.upper or upper < self.lower:
+            self.lower, self.upper = lower, upper
+        else:
+            self.lower, self.upper = max(self.lower, lower), min(self.upper, upper)
+
+    def sample_once(self) -> bool:
+        try:
+            t_send, t_recv, date_header = self.probe()
+        except Exception as e:
+            Logger.log(f"Saat senkronizasyonu isteği başarısız oldu: {e}", silent=True)
+            return False
+
+        server_time = ClockSync.parse_date_header(date_header)
+        if server_time is None:
+            Logger.log("Sunucu yanıtında geçerli bir Date başlığı bulunamadı.", silent=True)
+            return False
+
+        self.add_sample(t_send, t_recv, server_time)
+        Logger.log(f"Saat örneği: RTT {(t_recv - t_send) * 1000:.1f} ms, fark {self.offset * 1000:+.1f} ± {self.error * 1000:.1f} ms.", silent=True)
+        return True
+
+    def _next_send_time(self) -> float:
+        """Local time at which a probe's midpoint should cross the next server second boundary."""
+        earliest = time() + MIN_SAMPLE_GAP
+        server_boundary = int(earliest + self.offset + self.rtt / 2) + 1
+        return server_boundary - self.offset - self.rtt / 2
+
+    def synchronize(self, deadline: float, max_samples: int = MAX_SAMPLES, target_error: float = TARGET_ERROR) -> bool:
+        """Samples the server until the offset is accurate enough, `deadline` (local epoch) passes or the samples run out."""
+        Logger.log("Sunucu saati ile senkronize olunuyor...")
+        for _ in range(max_samples):
+            if time() >= deadline:
+                break
+
+            if self.is_synced:
+                if self.error <= target_error:
+                    break
+                send_time = self._next_send_time()
+                if send_time >= deadline:
+                    break
+                sleep(max(0, send_time - time()))
+
+            self.sample_once()
+
+        if not self.is_synced:
+            Logger.log("Sunucu saati ile senkronize olunamadı.")
+            return False
+
+        EventStream.emit("clock_sync", offset_ms=self.offset * 1000, error_ms=self.error * 1000, rtt_ms=self.rtt * 1000, samples=self.sample_count)
+        Logger.log(f"Sunucu saati ile yerel saat arasındaki fark: {self.offset * 1000:+.1f} ± {self.error * 1000:.1f} ms (RTT {self.rtt * 1000:.1f} ms, {self.sample_count} örnek).")
+        return True
+
+    def local_time_for(self, server_time: float) -> float:
+        """Converts a server epoch time to the local epoch time at which it happens."""
+        return server_time - self.offset
+
+    def send_time_for(self, server_time: float) -> float:
+        """Local epoch time to send a request at, so that it reaches the server right after `server_time`."""
+        return self.local_time_for(server_time) - self.rtt / 2 + self.error
+
+if __name__ == "__main__":
+    # Measures the offset against any server, e.g. `mock_server.py --skew 0.35`.
+    import requests
+
+    parser = argparse.ArgumentParser(description="Verilen adres ile yerel saat arasındaki farkı ölçer.")
+    parser.add_argument("url")
+    parser.add_argument("--samples", type=int, default=MAX_SAMPLES)
+    args = parser.parse_args()
+
+    session = requests.Session()
+    def probe():
+        t_send = time()
+        response = session.get(args.url)
+        return t_send, time(), response.headers.get("Date")
+
+    clock_sync = ClockSync(probe)
+    clock_sync.synchronize(time() + args.samples * 2, max_samples=args.samples, target_error=0)
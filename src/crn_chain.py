@@ -0,0 +1,115 @@
+# === CONSTANTS ===
+# What a slot does with a result code of its current CRN.
+DONE = "done" # The CRN is taken, the slot is finished.
+RETRY = "retry" # Send the same CRN again.
+ADVANCE = "advance" # The section is full for now, send the next alternative and come back to this one later.
+DROP = "drop" # The section can't be taken, never send it again.
+STOP = "stop" # Requests are blocked, stop everything.
+
+# === CLASS DEFINITON ===
+class ChainNode:
+    """A CRN in the circular list of its slot."""
+    __slots__ = ("crn", "slot", "next", "prev", "is_tried")
+
+    def __init__(self, crn: str, slot: int) -> None:
+        self.crn = crn
+        self.slot = slot
+        self.next = self
+        self.prev = self
+        self.is_tried = False
+
+class CrnChains:
+    """
+    Ordered alternatives of every course slot, e.g. "21345:21346:21347", as one circular linked list per slot.
+
+    The action of every result code is looked up from a table built once at start-up, and moving to the next alternative
+    or dropping a dead section only relinks neighbouring nodes, so every result is handled in O(1).
+    """
+    def __init__(self, slots: list[list[str]], actions: dict[str, str], default_action: str = DROP) -> None:
+        """
+        Args:
+            slots: CRNs of every slot, in the order they should be tried.
+            actions: Maps the result codes to one of `DONE`, `RETRY`, `ADVANCE`, `DROP` and `STOP`.
+            default_action: Action of the codes missing from `actions`.
+        """
+        self.actions = actions
+        self.default_action = default_action
+        self.nodes: dict[str, ChainNode] = {}
+        self.heads: list[str] = []
+
+        for i, slot in enumerate(slots):
+            previous = None
+            for crn in slot:
+                # A CRN belongs to a single slot, a repeated one would make the lists cross.
+                if crn in self.nodes:
+                    continue
+                node = ChainNode(crn, i)
+                if previous is not None:
+                    node.prev, node.next = previous, previous.next
+                    previous.next.prev = node
+                    previous.next = node
+                self.nodes[crn] = node
+                previous = node
+            if previous is not None:
+                self.heads.append(previous.next.crn)
+
+    @staticmethod
+    def parse(entries: list[str]) -> list[list[str]]:
+        """Splits the config entries ("CRN" or "CRN:ALTERNATIVE:...") into slots."""
+        slots = ([crn.strip() for crn in str(entry).split(":") if crn.strip()] for entry in entries)
+        # Empty parts are skipped ("a::b" is "a:b"), an entry without any CRN (e.g. ":") isn't a slot.
+        return [slot for slot in slots if slot]
+
+    def get_alternatives(self, crn: str) -> list[str]:
+        """Returns the CRNs still in the slot of `crn`, starting with `crn`."""
+        node = self.nodes.get(crn)
+        if node is None:
+            return [crn]
+        alternatives = [node.crn]
+        current = node.next
+        while current is not node:
+            alternatives.append(current.crn)
+            current = current.next
+        return alternatives
+
+    def get_action(self, result_code: str) -> str:
+        return self.actions.get(result_code, self.default_action)
+
+    def _unlink(self, node: ChainNode) -> ChainNode | None:
+        """Removes the node from its slot and returns the next one, `None` if it was the last one."""
+        next_node = node.next if node.next is not node else None
+        node.prev.next = node.next
+        node.next.prev = node.prev
+        node.next = node.prev = node
+        del self.nodes[node.crn]
+        return next_node
+
+    def transition(self, crn: str, result_code: str) -> tuple[str, str | None]:
+        """
+        Applies the result of `crn` to its slot.
+
+        Returns:
+            The action taken and the CRN the slot should send next, `None` if the slot has nothing left to send.
+        """
+        action = self.get_action(result_code)
+        node = self.nodes.get(crn)
+        if node is not None:
+            node.is_tried = True
+
+        if action == DONE:
+            # The other alternatives of the slot are not needed anymore.
+            while node is not None:
+                node = self._unlink(node)
+            return action, None
+        if action in (RETRY, STOP):
+            return action, crn
+        if node is None:
+            return action, None if action == DROP else crn
+        if action == ADVANCE:
+            return action, node.next.crn
+        next_node = self._unlink(node)
+        return action, next_node.crn if next_node is not None else None
+
+    def is_tried(self, crn: str) -> bool:
+        node = self.nodes.get(crn)
+        return node is not None and node.is_tried
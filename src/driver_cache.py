@@ -0,0 +1,123 @@
+# === IMPORTS ===
+from datetime import datetime
+from os import makedirs, path
+from logger import Logger
+import threading
+import argparse
+import json
+
+# === CONSTANTS ===
+CACHE_FILE_PATH = "data/driver_cache.json"
+
+# === CLASS DEFINITON ===
+class DriverCache:
+    """
+    Remembers which chromedriver binary matches each Chrome major version in `data/driver_cache.json`.
+
+    `ChromeDriverManager().install()` looks up the matching driver version over the network even if it is already
+    downloaded, so it is only called when the installed Chrome has no known driver. A hit needs no network at all.
+    """
+    _chrome_version = None
+    _install_lock = threading.Lock()
+    _refresh_thread = None
+
+    @staticmethod
+    def get_chrome_version() -> str | None:
+        """Returns the version of the installed Chrome, read once per process since it starts a subprocess."""
+        if DriverCache._chrome_version is None:
+            from webdriver_manager.core.os_manager import OperationSystemManager, ChromeType
+            try:
+                DriverCache._chrome_version = OperationSystemManager().get_browser_version_from_os(ChromeType.GOOGLE) or ""
+            except Exception:
+                DriverCache._chrome_version = ""
+        return DriverCache._chrome_version or None
+
+    @staticmethod
+    def get_chrome_major_version() -> str | None:
+        version = DriverCache.get_chrome_version()
+        return version.split(".")[0] if version else None
+
+    @staticmethod
+    def load() -> dict:
+        try:
+            with open(CACHE_FILE_PATH, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def save(cache: dict) -> None:
+        makedirs(path.dirname(CACHE_FILE_PATH), exist_ok=True)
+        with open(CACHE_FILE_PATH, "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=2)
+
+    @staticmethod
+    def lookup() -> str | None:
+        """Returns the cached driver of the installed Chrome without any network I/O, `None` if there is none."""
+        cache = DriverCache.load()
+        major = DriverCache.get_chrome_major_version()
+        if major is None:
+            # The version couldn't be read, the most recently fetched driver is the best guess.
+            entry = max(cache.values(), key=lambda entry: entry["fetched_at"], default=None)
+        else:
+            entry = cache.get(major)
+
+        if entry is not None and path.isfile(entry["path"]):
+            return entry["path"]
+        return None
+
+    @staticmethod
+    def install(force: bool = False) -> str:
+        """Downloads the driver of the installed Chrome if it is not cached yet and returns its path."""
+        with DriverCache._install_lock:
+            # Another thread may have installed it while this one was waiting for the lock.
+            driver_path = None if force else DriverCache.lookup()
+            if driver_path is not None:
+                return driver_path
+
+            from webdriver_manager.chrome import ChromeDriverManager
+            Logger.log("Chrome sürümüne uygun web sürücüsü indiriliyor...")
+            driver_path = ChromeDriverManager().install()
+
+            cache = DriverCache.load()
+            chrome_version = DriverCache.get_chrome_version()
+            cache[DriverCache.get_chrome_major_version() or "unknown"] = {
+                "path": driver_path,
+                "chrome_version": chrome_version,
+                "fetched_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            DriverCache.save(cache)
+            Logger.log(f"Web sürücüsü önbelleğe alındı: {driver_path} (Chrome {chrome_version or 'bilinmiyor'}).", silent=True)
+            return driver_path
+
+    @staticmethod
+    def _refresh() -> None:
+        try:
+            DriverCache.install()
+        except Exception as e:
+            Logger.log(f"Web sürücüsü arka planda indirilemedi: {e}", silent=True)
+
+    @staticmethod
+    def refresh_in_background() -> None:
+        """Downloads the driver on a background thread if Chrome changed since the last run, does nothing on a hit."""
+        if DriverCache._refresh_thread is not None or DriverCache.lookup() is not None:
+            return
+        DriverCache._refresh_thread = threading.Thread(target=DriverCache._refresh, name="DriverCacheRefresh", daemon=True)
+        DriverCache._refresh_thread.start()
+
+    @staticmethod
+    def resolve() -> str:
+        """Returns the driver path, only waits for the network if the installed Chrome has no cached driver."""
+        driver_path = DriverCache.lookup()
+        if driver_path is not None:
+            return driver_path
+        # Waits for the background refresh through the lock if one is running.
+        return DriverCache.install()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kurulu Chrome sürümüne uygun web sürücüsünü önceden indirir, ders seçiminden önceki gün çalıştırılabilir.")
+    parser.add_argument("--force", action="store_true", help="Önbellekte olsa bile sürücüyü yeniden indirir.")
+    args = parser.parse_args()
+
+    driver_path = DriverCache.install(force=args.force)
+    print(f"Chrome {DriverCache.get_chrome_version() or 'bilinmiyor'}: {driver_path}")
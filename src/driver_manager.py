@@ -1,19 +1,107 @@
 # === IMPORTS ===
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from seleniumwire import webdriver
+from time import perf_counter
+from os import makedirs, path
+from event_stream import EventStream
+from driver_cache import DriverCache
 from logger import Logger
+from contextlib import contextmanager
+import threading
+import queue
+import re
 
 import atexit
 
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# === CONSTANTS ===
+PROFILE_DIR = "data/profiles" # Persistent Chrome profiles of the lean mode, one per account.
+# Resources the login and the token request don't need. Stylesheets and scripts are kept, the SPA doesn't render without them.
+BLOCKED_URL_PATTERNS = ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.webp", "*.ico", "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot", "*.mp4", "*.webm"]
+LEAN_ARGUMENTS = [
+    "--disable-gpu",
+    "--disable-dev-shm-usage",
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-translate",
+    "--mute-audio",
+    "--metrics-recording-only",
+    "--blink-settings=imagesEnabled=false",
+    "--window-size=1280,800",
+]
+LEAN_PREFERENCES = {
+    "profile.managed_default_content_settings.images": 2,
+    "profile.default_content_setting_values.notifications": 2,
+    "credentials_enable_service": False,
+    "profile.password_manager_enabled": False,
+}
+
 # === CLASS DEFINITON ===
 class DriverManager:
+    """
+    Starts the Chrome drivers and quits them at exit.
+
+    Selenium is imported by `create_driver`, so importing this module costs nothing until a browser is needed.
+    """
     active_drivers = []
+    _is_cleanup_registered = False
+
+    @staticmethod
+    def get_profile_dir(profile_name: str) -> str:
+        """Returns the absolute path of the persistent profile of `profile_name`, Chrome needs it to be absolute."""
+        return path.abspath(path.join(PROFILE_DIR, re.sub(r"[^\w.-]", "_", profile_name)))
+
+    @staticmethod
+    def get_processes(driver) -> list:
+        """Returns chromedriver and the browser processes it started as psutil processes, an empty list without psutil."""
+        if psutil is None:
+            return []
+        try:
+            process = psutil.Process(driver.service.process.pid)
+            return [process] + process.children(recursive=True)
+        except (AttributeError, psutil.Error):
+            return []
+
+    @staticmethod
+    def get_all_processes() -> list:
+        return [process for driver in DriverManager.active_drivers for process in DriverManager.get_processes(driver)]
 
     @staticmethod
-    def create_driver(headless: bool=False):
+    def measure_rss(driver) -> float | None:
+        """Returns the total resident memory of chromedriver and the browser processes it started in MB, `None` without psutil."""
+        processes = DriverManager.get_processes(driver)
+        if not processes:
+            return None
+
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / 2**20
+
+    @staticmethod
+    def create_driver(headless: bool=False, use_proxy: bool=True, lean: bool=False, profile_name: str | None=None):
+        """
+        Args:
+            headless: Runs Chrome without a window.
+            use_proxy: Routes the traffic through selenium-wire's proxy, otherwise DevTools network events are logged instead.
+            lean: Blocks images, fonts and media and starts Chrome with a minimal set of features.
+            profile_name: Keeps the profile in `data/profiles/<profile_name>`, so that the session cookies survive between runs.
+        """
+        from selenium.webdriver.chrome.service import Service
+        from selenium.webdriver.chrome.options import Options
+        from selenium import webdriver
+
         Logger.log("Web sürücüsü başlatılıyor...")
+        start = perf_counter()
         chrome_options = Options()
 
         chrome_options.add_argument("--disable-extensions")
@@ -22,16 +110,75 @@ class DriverManager:
         chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
         if headless:
             chrome_options.add_argument("--headless")
+        if lean:
+            for argument in LEAN_ARGUMENTS:
+                chrome_options.add_argument(argument)
+            chrome_options.add_experimental_option("prefs", LEAN_PREFERENCES)
+        if profile_name:
+            profile_dir = DriverManager.get_profile_dir(profile_name)
+            makedirs(profile_dir, exist_ok=True)
+            chrome_options.add_argument(f"--user-data-dir={profile_dir}")
 
-        driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
+        driver_path = DriverCache.resolve()
+        if use_proxy:
+            # Imported here so that the proxy and its dependencies are only loaded when they are used.
+            from seleniumwire import webdriver as wire_webdriver
+            driver = wire_webdriver.Chrome(service=Service(driver_path), options=chrome_options)
+        else:
+            chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+            driver = webdriver.Chrome(service=Service(driver_path), options=chrome_options)
         DriverManager.active_drivers.append(driver)
+        if not DriverManager._is_cleanup_registered:
+            DriverManager._is_cleanup_registered = True
+            atexit.register(DriverManager.clear_drivers)
+
+        if lean:
+            # Blocked before the request is made, unlike the image setting this also covers fonts and media.
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+
+        startup = (perf_counter() - start) * 1000
+        rss = DriverManager.measure_rss(driver)
+        EventStream.emit("driver_start", startup_ms=startup, rss_mb=rss, lean=lean, persistent_profile=bool(profile_name))
+        Logger.log(f"Web sürücüsü {startup:.0f} ms içinde başlatıldı" + (f", bellek kullanımı {rss:.0f} MB." if rss is not None else "."))
         return driver
-    
+
     @staticmethod
     def clear_drivers():
+        if not DriverManager.active_drivers:
+            return
         Logger.log("Aktif web sürücüleri temizleniyor...")
         for driver in DriverManager.active_drivers:
+            rss = DriverManager.measure_rss(driver)
+            if rss is not None:
+                Logger.log(f"Web sürücüsünün kapanmadan önceki bellek kullanımı: {rss:.0f} MB.", silent=True)
             driver.quit()
+        DriverManager.active_drivers.clear()
+
+class BrowserPool:
+    """
+    Lends at most `size` drivers to the token fetchers of several accounts, a driver is only started when none is idle.
+    The cookies of every site are cleared before a driver is lent, so the session of the previous account is gone.
+    """
+    def __init__(self, size: int, headless: bool=True, use_proxy: bool=True, lean: bool=False) -> None:
+        self.size = size
+        self.headless = headless
+        self.use_proxy = use_proxy
+        self.lean = lean
+        self._available = threading.Semaphore(size)
+        self._idle = queue.SimpleQueue()
+
+    @contextmanager
+    def borrow(self):
+        with self._available:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                # Profiles are not persistent here, a shared profile would mix the sessions of the accounts.
+                driver = DriverManager.create_driver(headless=self.headless, use_proxy=self.use_proxy, lean=self.lean)
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
 
-# === DRIVER CLEANUP ===
-atexit.register(DriverManager.clear_drivers)
\ No newline at end of file
+            try:
+                yield driver
+            finally:
+                self._idle.put(driver)
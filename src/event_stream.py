@@ -0,0 +1,181 @@
+# === IMPORTS ===
+from collections import Counter
+from datetime import datetime
+from os import makedirs, path
+from time import monotonic, time
+from logger import Logger, LOG_DIR
+import threading
+import queue
+import json
+
+import atexit
+
+# === CONSTANTS ===
+# Event types and their fields, every event also has `type`, `t` (monotonic seconds) and `wall` (epoch seconds):
+#   http:          method, path, status, rtt_ms, new_connection
+#   result:        crn, code, list ("ECRN" or "SCRN"), success
+#   token_fetch:   duration_ms, changed
+#   token_refresh: ttl (seconds, null if unknown)
+#   token_check:   alive, age, ttl (seconds)
+#   token_failover: reason ("logout", "liveness", "401" or "stale"), latency_ms (since the logout was detected), standby_age (seconds)
+#   session_recovered: profile, duration_ms (from the logout to the next token of the same session)
+#   driver_start:  startup_ms, rss_mb (null without psutil), lean, persistent_profile
+#   browser_wait:  name, duration_ms, met
+#   clock_sync:    offset_ms, error_ms, rtt_ms, samples
+#   wake:          phase, planned (epoch seconds), error_ms, replans
+#   clock_jump:    phase, jump_ms (wall clock minus monotonic clock), suspended
+#   open:          open_time (epoch seconds, local clock)
+#   speculative:   kind ("selection" or "time_check"), sent (epoch seconds), is_open, early_ms and confirmed (selection only)
+SELECTION_PATH_MARKER = "ders-kayit"
+
+# === CLASS DEFINITON ===
+class EventSummary:
+    """Aggregates the events as they are emitted, so that the report doesn't need to read the JSONL file back."""
+    def __init__(self) -> None:
+        self.rtts = {}
+        self.result_counts = Counter()
+        self.first_success = {}
+        self.token_staleness = []
+        self.last_token_refresh = None
+        self.first_selection_wall = None
+        self.open_time = None
+        self.clock_offset = 0
+        self.wake_errors = []
+        self.clock_jumps = []
+
+    def add(self, event: dict) -> None:
+        event_type = event["type"]
+        if event_type == "http":
+            self.rtts.setdefault(f"{event['method']} {event['path']}", []).append(event["rtt_ms"])
+            if SELECTION_PATH_MARKER in event["path"]:
+                if self.first_selection_wall is None:
+                    self.first_selection_wall = event["wall"] - event["rtt_ms"] / 1000
+                if self.last_token_refresh is not None:
+                    self.token_staleness.append(event["t"] - self.last_token_refresh)
+        elif event_type == "result":
+            self.result_counts[event["code"]] += 1
+            if event["success"] and event["crn"] not in self.first_success:
+                self.first_success[event["crn"]] = event["wall"]
+        elif event_type == "token_refresh":
+            self.last_token_refresh = event["t"]
+        elif event_type == "clock_sync":
+            self.clock_offset = event["offset_ms"] / 1000
+        elif event_type == "open":
+            self.open_time = event["open_time"]
+        elif event_type == "wake":
+            self.wake_errors.append((event["phase"], event["error_ms"]))
+        elif event_type == "clock_jump":
+            self.clock_jumps.append((event["phase"], event["jump_ms"], event["suspended"]))
+
+    @staticmethod
+    def percentiles(values: list[float]) -> dict[str, float]:
+        ordered = sorted(values)
+        pick = lambda ratio: round(ordered[min(len(ordered) - 1, int(len(ordered) * ratio))], 1)
+        return {"count": len(ordered), "p50": pick(.5), "p90": pick(.9), "p99": pick(.99), "max": round(ordered[-1], 1)}
+
+    def report(self) -> dict:
+        # Times are measured from the real open if it is known, from the first selection request otherwise.
+        reference = self.open_time if self.open_time is not None else self.first_selection_wall
+        report = {
+            "rtt_ms": {name: EventSummary.percentiles(values) for name, values in self.rtts.items()},
+            "results_per_code": dict(self.result_counts),
+            "time_to_first_success_ms": {crn: round((wall - reference) * 1000, 1) for crn, wall in self.first_success.items()} if reference else {},
+            "token_staleness_s": EventSummary.percentiles(self.token_staleness) if self.token_staleness else None,
+            "wake_error_ms": [{"phase": phase, "error_ms": round(error, 3)} for phase, error in self.wake_errors],
+            "clock_jumps": [{"phase": phase, "jump_ms": round(jump, 1), "suspended": suspended} for phase, jump, suspended in self.clock_jumps],
+        }
+        if self.open_time is not None and self.first_selection_wall is not None:
+            report["first_request_from_open_ms"] = round((self.first_selection_wall + self.clock_offset - self.open_time) * 1000, 1)
+        return report
+
+class EventStream:
+    """
+    Writes typed, timestamped events to `logs/events_<time stamp>.jsonl` from a background thread.
+
+    Nothing is recorded until `enable` is called, so that only the programs that run a selection (run.py, batch_run.py)
+    write events and log the summary, not every process that imports a module that emits them.
+    """
+    is_enabled = False
+    file_name = None
+    summary = EventSummary()
+    _queue = queue.SimpleQueue()
+    _writer = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def enable() -> None:
+        """Starts recording the events, the summary is logged and saved when the program exits."""
+        with EventStream._lock:
+            if EventStream.is_enabled:
+                return
+            EventStream.file_name = f"events_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
+            EventStream._writer = threading.Thread(target=EventStream._write_loop, name="EventWriter", daemon=True)
+            EventStream._writer.start()
+            EventStream.is_enabled = True
+        atexit.register(EventStream.save_summary)
+
+    @staticmethod
+    def emit(event_type: str, **fields) -> None:
+        if not EventStream.is_enabled:
+            return
+        event = {"type": event_type, "t": monotonic(), "wall": time(), **fields}
+        with EventStream._lock:
+            EventStream.summary.add(event)
+        EventStream._queue.put(event)
+
+    @staticmethod
+    def _write_loop() -> None:
+        makedirs(LOG_DIR, exist_ok=True)
+        with open(path.join(LOG_DIR, f"{EventStream.file_name}.jsonl"), "w", encoding="utf-8") as f:
+            while True:
+                items = [EventStream._queue.get()]
+                while True:
+                    try:
+                        items.append(EventStream._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                lines = [json.dumps(item, ensure_ascii=False) for item in items if isinstance(item, dict)]
+                if lines:
+                    f.write("\n".join(lines) + "\n")
+                    f.flush()
+                for item in items:
+                    if isinstance(item, threading.Event):
+                        item.set()
+
+    @staticmethod
+    def flush(timeout: float = 5) -> None:
+        if EventStream._writer is None:
+            return
+        event = threading.Event()
+        EventStream._queue.put(event)
+        event.wait(timeout)
+
+    @staticmethod
+    def save_summary() -> None:
+        """Logs the summary of the run and saves it next to the event file."""
+        if EventStream._writer is None:
+            return
+        EventStream.flush()
+
+        with EventStream._lock:
+            report = EventStream.summary.report()
+        with open(path.join(LOG_DIR, f"{EventStream.file_name}_summary.json"), "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+        Logger.log("=== ÇALIŞMA ÖZETİ ===")
+        for name, stats in report["rtt_ms"].items():
+            Logger.log(f"{name}: {stats['count']} istek, RTT p50 {stats['p50']} ms, p90 {stats['p90']} ms, p99 {stats['p99']} ms, maks {stats['max']} ms.")
+        for crn, duration in report["time_to_first_success_ms"].items():
+            Logger.log(f"CRN {crn} {duration} ms sonra alındı.")
+        if report["results_per_code"]:
+            Logger.log(f"Sonuç kodları: {report['results_per_code']}.")
+        if report["token_staleness_s"]:
+            Logger.log(f"Gönderim anında token yaşı: p50 {report['token_staleness_s']['p50']} s, maks {report['token_staleness_s']['max']} s.")
+        if report["wake_error_ms"]:
+            wake_errors = ", ".join(f"{wake['phase']} {wake['error_ms']:+.3f} ms" for wake in report["wake_error_ms"])
+            Logger.log(f"Uyanma hataları: {wake_errors}.")
+        if report["clock_jumps"]:
+            Logger.log(f"Bekleme sırasında sistem saati {len(report['clock_jumps'])} kez değişti, bekleme her seferinde yeniden planlandı.")
+        if "first_request_from_open_ms" in report:
+            Logger.log(f"İlk ders seçim isteği açılıştan {report['first_request_from_open_ms']:+} ms farkla gönderildi.")
@@ -0,0 +1,155 @@
+# === IMPORTS ===
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+from logger import Logger
+import requests
+
+# === CONSTANTS ===
+# Both are relative to the Kepler URL, so that a local test server can be used instead.
+JWT_PATH = "/ogrenci/auth/jwt"
+TOKEN_PATH = "/api/ogrenci/Takvim/KayitZamaniKontrolu"
+REQUEST_TIMEOUT = 15
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/150.0.0.0 Safari/537.36"
+
+# === HTML PARSERS ===
+class FormParser(HTMLParser):
+    """Collects the forms of a page along with their inputs."""
+    def __init__(self) -> None:
+        super().__init__()
+        self.forms = []
+
+    def handle_starttag(self, tag, attrs) -> None:
+        attrs = dict(attrs)
+        if tag == "form":
+            self.forms.append({"action": attrs.get("action") or "", "method": (attrs.get("method") or "get").lower(), "inputs": []})
+        elif tag == "input" and self.forms:
+            self.forms[-1]["inputs"].append({"name": attrs.get("name"), "type": (attrs.get("type") or "text").lower(), "value": attrs.get("value") or ""})
+
+class IdentityParser(HTMLParser):
+    """Collects the identity cards of the `SelectIdentity` page, the text of their table rows and their first link."""
+    def __init__(self) -> None:
+        super().__init__()
+        self.cards = []
+        self._depth = 0
+        self._card_depth = None
+        self._in_row = False
+
+    def handle_starttag(self, tag, attrs) -> None:
+        attrs = dict(attrs)
+        if tag not in VOID_TAGS:
+            self._depth += 1
+        if self._card_depth is None and "card-body" in (attrs.get("class") or "").split():
+            self._card_depth = self._depth
+            self.cards.append({"rows": [], "link": None})
+        elif self._card_depth is not None:
+            if tag == "tr":
+                self.cards[-1]["rows"].append("")
+                self._in_row = True
+            elif tag == "a" and self.cards[-1]["link"] is None:
+                self.cards[-1]["link"] = attrs.get("href")
+
+    def handle_endtag(self, tag) -> None:
+        if tag in VOID_TAGS:
+            return
+        if tag == "tr":
+            self._in_row = False
+        if self._card_depth == self._depth:
+            self._card_depth = None
+        self._depth -= 1
+
+    def handle_data(self, data) -> None:
+        # Only the text inside the rows, the label of the link after the table isn't part of the last row.
+        if self._card_depth is not None and self._in_row:
+            self.cards[-1]["rows"][-1] += data
+
+# === CLASS DEFINITON ===
+class HttpLogin:
+    """
+    Logs in to Kepler through girisv3 with plain HTTP requests and reads the API token, no browser is needed.
+    The session keeps the cookies, so the token can be fetched again without logging in while the session is valid.
+    """
+    def __init__(self, url: str, login: str, password: str) -> None:
+        self.url = url
+        self.creds = [login, password]
+        self.jwt_url = urljoin(url, JWT_PATH)
+        self.token_url = urljoin(url, TOKEN_PATH)
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+
+    @staticmethod
+    def find_login_form(html: str) -> dict | None:
+        parser = FormParser()
+        parser.feed(html)
+        return next((form for form in parser.forms if any(field["type"] == "password" for field in form["inputs"])), None)
+
+    def _submit_login_form(self, page: requests.Response, form: dict) -> requests.Response:
+        data = {}
+        index = 0
+        has_submit = False
+        for field in form["inputs"]:
+            if not field["name"]:
+                continue
+            # Fill in the credentials to the first two visible inputs, like the browser flow does.
+            if field["type"] in ("text", "email", "password") and index <= 1:
+                data[field["name"]] = self.creds[index]
+                index += 1
+            # Only the clicked button is posted, a browser clicks the first one on Enter. WebForms (girisv3) runs the
+            # login handler only when the button's name is in the form, without it the page is just rendered again.
+            elif field["type"] == "submit":
+                if not has_submit:
+                    data[field["name"]] = field["value"]
+                    has_submit = True
+            elif field["type"] not in ("checkbox", "radio", "button", "image"):
+                data[field["name"]] = field["value"]
+
+        action = urljoin(page.url, form["action"] or page.url)
+        if form["method"] == "post":
+            return self.session.post(action, data=data, timeout=REQUEST_TIMEOUT)
+        return self.session.get(action, params=data, timeout=REQUEST_TIMEOUT)
+
+    def _select_identity(self, page: requests.Response) -> requests.Response:
+        Logger.log("Yatay geçiş hesabı algılandı, aktif İTÜ hesabı seçilecek.")
+        parser = IdentityParser()
+        parser.feed(page.text)
+        for card in parser.cards:
+            content = card["rows"][-1].lower() if card["rows"] else ""
+            if "durum" in content and "aktif" in content and card["link"]:
+                selected = " ".join(row.strip() for row in card["rows"][1:3])
+                Logger.log(f"Seçilen hesap: \"{selected}\".")
+                return self.session.get(urljoin(page.url, card["link"]), timeout=REQUEST_TIMEOUT)
+        raise ValueError("Aktif İTÜ hesabı bulunamadı.")
+
+    def fetch_token(self) -> str:
+        """Reads the API token with the current session cookies, returns an empty string if the session is not logged in."""
+        response = self.session.get(self.jwt_url, timeout=REQUEST_TIMEOUT, allow_redirects=False)
+        token = response.text.strip().strip('"')
+        if response.status_code != 200 or not token or "<" in token:
+            return ""
+        token = token if token.startswith("Bearer ") else f"Bearer {token}"
+
+        # Make sure the token is accepted by the API before handing it out.
+        check = self.session.get(self.token_url, headers={"Authorization": token}, timeout=REQUEST_TIMEOUT)
+        return token if check.status_code == 200 else ""
+
+    def login(self) -> str:
+        """Performs the whole login flow and returns the API token, or an empty string if it fails."""
+        try:
+            page = self.session.get(self.url, timeout=REQUEST_TIMEOUT)
+            form = HttpLogin.find_login_form(page.text)
+            if form is None:
+                Logger.log("Kepler'e giriş yapılmış, giriş yapma aşaması atlanıyor...", silent=True)
+            else:
+                Logger.log("Kepler'e HTTP üzerinden giriş yapılıyor...")
+                page = self._submit_login_form(page, form)
+                if HttpLogin.find_login_form(page.text) is not None:
+                    Logger.log("HTTP üzerinden giriş başarısız oldu, kullanıcı adı veya şifre hatalı olabilir.")
+                    return ""
+
+            if "SelectIdentity" in page.url:
+                page = self._select_identity(page)
+
+            return self.fetch_token()
+        except (requests.RequestException, ValueError) as e:
+            Logger.log(f"HTTP üzerinden giriş yapılamadı: {e}", silent=True)
+            return ""
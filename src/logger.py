@@ -1,10 +1,22 @@
+from collections import deque
 from datetime import datetime
-from os import mkdir, path
+from os import fsync, makedirs, path
+from time import monotonic
+import threading
+import shutil
+import queue
 
 import atexit
 
+LOG_DIR = "logs"
+LOG_BUFFER_SIZE = 10000 # Number of latest messages kept in memory.
+FSYNC_INTERVAL = 1 # Seconds between two fsync calls of the log file.
+
 class Logger:
-    logs = ""
+    logs = deque(maxlen=LOG_BUFFER_SIZE)
+    _queue = queue.SimpleQueue()
+    _writer = None
+    _writer_lock = threading.Lock()
 
     @staticmethod
     def create_message(message) -> str:
@@ -13,25 +25,91 @@ class Logger:
     @staticmethod
     def log(message, silent: bool = False) -> None:
         msg = Logger.create_message(message)
-        Logger.logs += msg + "\n"
+        Logger.logs.append(msg)
         if not silent: print(msg)
 
+        # The file is written by the writer thread, so logging never waits for the disk.
+        Logger._queue.put(msg)
+        if Logger._writer is None:
+            Logger._start_writer()
+
+    @staticmethod
+    def _start_writer() -> None:
+        with Logger._writer_lock:
+            if Logger._writer is None:
+                Logger._writer = threading.Thread(target=Logger._write_loop, name="LoggerWriter", daemon=True)
+                Logger._writer.start()
+
+    @staticmethod
+    def _write_loop() -> None:
+        """Appends the queued messages to the temp log file in batches, fsyncing at most every `FSYNC_INTERVAL` seconds."""
         try:
-            Logger.save_logs()
-        except:
-            pass
+            makedirs(LOG_DIR, exist_ok=True)
+            f = open(path.join(LOG_DIR, "temp_logs.txt"), "w", encoding="utf-8")
+        except OSError:
+            # Logs can't be saved, keep draining the queue so it doesn't grow forever.
+            f = None
+
+        last_fsync = monotonic()
+        is_unsynced = False # Lines were written after the last fsync, synced once `FSYNC_INTERVAL` passes even if nothing else is logged.
+        while True:
+            try:
+                items = [Logger._queue.get(timeout=FSYNC_INTERVAL)]
+            except queue.Empty:
+                items = []
+            while True:
+                try:
+                    items.append(Logger._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Events in the queue are flush requests, everything before them must be on the disk once they are set.
+            lines = [item for item in items if isinstance(item, str)]
+            flush_requests = [item for item in items if isinstance(item, threading.Event)]
+            if f is None:
+                for event in flush_requests:
+                    event.set()
+                continue
+
+            try:
+                if lines:
+                    f.write("\n".join(lines) + "\n")
+                    f.flush()
+                    is_unsynced = True
+                if (is_unsynced and monotonic() - last_fsync >= FSYNC_INTERVAL) or flush_requests:
+                    fsync(f.fileno())
+                    last_fsync = monotonic()
+                    is_unsynced = False
+            except OSError:
+                pass
+            for event in flush_requests:
+                event.set()
+
+    @staticmethod
+    def flush(timeout: float = 5) -> None:
+        """Blocks until every message logged so far is written and synced to the disk."""
+        if Logger._writer is None:
+            return
+        event = threading.Event()
+        Logger._queue.put(event)
+        event.wait(timeout)
 
     @staticmethod
     def save_logs(file_name: str="temp_logs") -> None:
-        if not path.exists("logs"):
-            mkdir("logs")
-        
-        with open(f"logs/{file_name}.txt", "w", encoding="utf-8") as f:
-            f.write(Logger.logs + Logger.create_message("Çıktılar kaydediliyor...\n"))
+        Logger.flush()
+
+        # The temp log file already has everything, other names get a copy of it.
+        if file_name != "temp_logs" and path.exists(path.join(LOG_DIR, "temp_logs.txt")):
+            shutil.copyfile(path.join(LOG_DIR, "temp_logs.txt"), path.join(LOG_DIR, f"{file_name}.txt"))
 
     @staticmethod
     def save_logs_with_time_stamp() -> None:
+        # A run that logged nothing, e.g. `--help`, doesn't leave an empty log file behind.
+        if Logger._writer is None:
+            return
+        Logger.log("Çıktılar kaydediliyor...", silent=True)
         time_stamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
         Logger.save_logs(f"logs_{time_stamp}")
 
+# Registered at import, so that it runs after the exit hooks of the other modules, which may still log.
 atexit.register(Logger.save_logs_with_time_stamp)
@@ -0,0 +1,424 @@
+# === IMPORTS ===
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import Counter, deque
+from urllib.parse import parse_qs, quote, urlsplit
+from email.utils import formatdate
+from time import sleep, time
+import threading
+import argparse
+import secrets
+import random
+import base64
+import json
+
+# === CONSTANTS ===
+TIME_CHECK_PATH = "/api/ogrenci/Takvim/KayitZamaniKontrolu"
+COURSE_SELECTION_PATH = "/api/ders-kayit/v21"
+MAX_CRN_COUNT = 12 # More CRNs than this in a single request is answered with `VAL15`.
+RATE_LIMIT = 20 # Number of selection requests allowed per token in `RATE_WINDOW` seconds, one more results in `VAL21`.
+RATE_WINDOW = 60
+LOCKOUT_DUR = 60 * 60 # A token that hit the rate limit gets `VAL21` for this many seconds.
+LOGIN_PATH = "/girisv3/Login"
+SELECT_IDENTITY_PATH = "/girisv3/SelectIdentity"
+JWT_PATH = "/ogrenci/auth/jwt"
+SESSION_COOKIE = "ASP.NET_SessionId"
+TOKEN_TTL = 60 * 60 # Lifetime of the issued tokens, in seconds.
+
+LOGIN_BUTTON = "ctl00$ContentPlaceHolder1$btnLogin" # Like WebForms, the login only runs if the form is posted with this button.
+LOGIN_PAGE = """<html><body><form method="post" action="{action}">
+<input type="hidden" name="__VIEWSTATE" value="{view_state}">
+<input type="text" name="ctl00$ContentPlaceHolder1$tbUserName">
+<input type="password" name="ctl00$ContentPlaceHolder1$tbPassword">
+<input type="submit" name="ctl00$ContentPlaceHolder1$btnLogin" value="Giriş">
+</form></body></html>"""
+IDENTITY_CARD = """<div class="card"><div class="card-body"><table>
+<tr><th>Hesap {index}</th></tr><tr><td>{program}</td></tr><tr><td>{student_id}</td></tr><tr><td>Durum: {status}</td></tr>
+</table><a href="{link}">Seç</a></div></div>"""
+# Stand-in for the Kepler SPA, it reads the token and calls the time check with it like the real page does.
+KEPLER_PAGE = """<html><body><div id="app">Kepler</div><script>
+fetch("%s").then(r => r.text()).then(t => fetch("%s", {headers: {"Authorization": "Bearer " + t}}));
+</script></body></html>""" % (JWT_PATH, TIME_CHECK_PATH)
+
+# === CLASS DEFINITON ===
+class LatencyModel:
+    """
+    Response latency distribution, parsed from strings such as `"0.05"` (fixed),
+    `"uniform:0.05,0.3"` or `"lognormal:-2,0.5"` (mu and sigma of the underlying normal, in log seconds).
+    """
+    def __init__(self, spec: str = "0", seed: int | None = None) -> None:
+        kind, _, params = spec.partition(":") if ":" in spec else ("fixed", "", spec)
+        self.kind = kind
+        self.params = [float(param) for param in params.split(",") if param]
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.kind == "uniform":
+                return self.rng.uniform(*self.params)
+            if self.kind == "lognormal":
+                return self.rng.lognormvariate(*self.params)
+            return self.params[0] if self.params else 0
+
+class MockObsServer(ThreadingHTTPServer):
+    """
+    Local stand-in for obs.itu.edu.tr, so that the client can be exercised without the live server.
+    Implements the time check and the ECRN/SCRN endpoint with seat quotas, the `VAL*` result codes,
+    a configurable open time, response latency and the per-token rate limit that results in `VAL21`.
+    The server's clock runs `skew` seconds ahead of the local clock.
+    """
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, skew: float = 0, open_time: float | None = None, quotas: dict[str, int] | None = None,
+                 default_quota: int = 30, seat_drain: float = 0, latency: str = "0", overload_rate: float = 0,
+                 rate_limit: int = RATE_LIMIT, rate_window: float = RATE_WINDOW, seed: int | None = None,
+                 username: str | None = None, password: str | None = None, identity_count: int = 1, token_ttl: float = TOKEN_TTL) -> None:
+        """
+        Args:
+            port: Port to listen on, 0 picks a free one.
+            skew: Seconds the server clock is ahead of the local clock.
+            open_time: Server epoch time at which the registration opens, `None` means it is already open.
+            quotas: Remaining seats per CRN, CRNs not in here get `default_quota` seats.
+            default_quota: Seats of the CRNs that are not in `quotas`, negative values make unknown CRNs `CRNNotFound`.
+            seat_drain: Seats per second taken from every CRN by other students after the open.
+            latency: Latency distribution of the responses, see `LatencyModel`.
+            overload_rate: Probability of answering a selection request with `VAL14`.
+            rate_limit: Selection requests allowed per token in `rate_window` seconds.
+            rate_window: Length of the rate limit window, in seconds.
+            seed: Seed of the random generators, to make the runs reproducible.
+            username: Account of the fake girisv3 login, if set only the tokens it issued are accepted.
+            password: Password of the account.
+            identity_count: More than one makes the login go through `SelectIdentity`, the last identity is the active one.
+            token_ttl: Lifetime of the issued tokens, in seconds.
+        """
+        super().__init__(("127.0.0.1", port), MockObsRequestHandler)
+        self.skew = skew
+        self.open_time = open_time
+        self.quotas = dict(quotas or {})
+        self.default_quota = default_quota
+        self.seat_drain = seat_drain
+        self.latency = LatencyModel(latency, seed)
+        self.overload_rate = overload_rate
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.rng = random.Random(seed)
+        self.username = username
+        self.password = password
+        self.identity_count = identity_count
+        self.token_ttl = token_ttl
+
+        self.lock = threading.Lock()
+        self.registered = {} # Token -> set of registered CRNs.
+        self.request_times = {} # Token -> times of the latest selection requests.
+        self.locked_until = {} # Token -> end of the lockout.
+        self.active_tokens = set() # Tokens with a selection request being processed.
+        self.sessions = {} # Session cookie -> whether an identity is selected.
+        self.tokens = {} # Issued token -> expiry time.
+        self.token_sessions = {} # Issued token -> session cookie it was issued to.
+        self.stats = {"logins": 0, "time_checks": 0, "selection_requests": 0, "wasted_requests": 0, "lockouts": 0, "codes": Counter(), "first_success": {}}
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def now(self) -> float:
+        """Current time on the server's clock."""
+        return time() + self.skew
+
+    def is_open(self) -> bool:
+        return self.open_time is None or self.now() >= self.open_time
+
+    def start(self) -> None:
+        """Starts serving on a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def create_token(self, session: str | None = None) -> str:
+        """Issues a JWT shaped token that expires in `token_ttl` seconds."""
+        encode = lambda data: base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+        expires_at = self.now() + self.token_ttl
+        token = f"{encode({'alg': 'HS256', 'typ': 'JWT'})}.{encode({'sub': self.username, 'exp': int(expires_at)})}.{secrets.token_urlsafe(16)}"
+        with self.lock:
+            self.tokens[token] = expires_at
+            self.token_sessions[token] = session
+        return token
+
+    def is_token_valid(self, authorization: str) -> bool:
+        if self.username is None:
+            return bool(authorization)
+        token = authorization.removeprefix("Bearer ")
+        with self.lock:
+            return self.tokens.get(token, 0) > self.now()
+
+    def expire_sessions(self) -> None:
+        """Logs every session out and invalidates the tokens, like a logout on the real server."""
+        with self.lock:
+            self.sessions.clear()
+            self.tokens.clear()
+            self.token_sessions.clear()
+
+    def expire_session_of(self, authorization: str) -> None:
+        """Logs out only the session the token was issued to and invalidates its tokens, the other sessions stay logged in."""
+        token = authorization.removeprefix("Bearer ")
+        with self.lock:
+            session = self.token_sessions.get(token)
+            self.sessions.pop(session, None)
+            for issued in [issued for issued, owner in self.token_sessions.items() if owner == session]:
+                self.tokens.pop(issued, None)
+                del self.token_sessions[issued]
+
+    def _remaining_seats(self, crn: str) -> int:
+        seats = self.quotas.get(crn, self.default_quota)
+        if self.seat_drain and self.open_time is not None and self.is_open():
+            seats -= int((self.now() - self.open_time) * self.seat_drain)
+        return seats
+
+    def _is_rate_limited(self, token: str) -> bool:
+        now = self.now()
+        if self.locked_until.get(token, 0) > now:
+            return True
+
+        times = self.request_times.setdefault(token, deque())
+        times.append(now)
+        while times and times[0] <= now - self.rate_window:
+            times.popleft()
+        if len(times) > self.rate_limit:
+            self.locked_until[token] = now + LOCKOUT_DUR
+            self.stats["lockouts"] += 1
+            return True
+        return False
+
+    def select_courses(self, token: str, ecrn_list: list[str], scrn_list: list[str]) -> dict:
+        """Applies a selection request and returns the response body."""
+        with self.lock:
+            self.stats["selection_requests"] += 1
+
+            if self._is_rate_limited(token):
+                code = lambda crn: "VAL21"
+            elif token in self.active_tokens:
+                code = lambda crn: "VAL16"
+            elif not self.is_open():
+                code = lambda crn: "VAL02"
+            elif self.rng.random() < self.overload_rate:
+                code = lambda crn: "VAL14"
+            elif len(ecrn_list) > MAX_CRN_COUNT:
+                code = lambda crn: "VAL15"
+            else:
+                code = None
+                self.active_tokens.add(token)
+
+        # Only the requests that get past the checks above are slow, like the real server.
+        if code is None:
+            sleep(self.latency.sample())
+            with self.lock:
+                self.active_tokens.discard(token)
+                registered = self.registered.setdefault(token, set())
+                ecrn_results = [{"crn": crn, "resultCode": self._add_course(crn, registered)} for crn in ecrn_list]
+                scrn_results = [{"crn": crn, "resultCode": self._drop_course(crn, registered)} for crn in scrn_list]
+        else:
+            ecrn_results = [{"crn": crn, "resultCode": code(crn)} for crn in ecrn_list]
+            scrn_results = [{"crn": crn, "resultCode": code(crn)} for crn in scrn_list]
+
+        with self.lock:
+            codes = [result["resultCode"] for result in ecrn_results + scrn_results]
+            self.stats["codes"].update(codes)
+            if not any(code in ("successResult", "Silme İşlemi Başarılı") for code in codes):
+                self.stats["wasted_requests"] += 1
+            for result in ecrn_results:
+                if result["resultCode"] == "successResult":
+                    self.stats["first_success"].setdefault(result["crn"], self.now())
+
+        return {"ecrnResultList": ecrn_results, "scrnResultList": scrn_results}
+
+    def _add_course(self, crn: str, registered: set[str]) -> str:
+        if crn in registered:
+            return "VAL03"
+        if crn not in self.quotas and self.default_quota < 0:
+            return "CRNNotFound"
+        if self._remaining_seats(crn) <= 0:
+            return "VAL06"
+        self.quotas[crn] = self.quotas.get(crn, self.default_quota) - 1
+        registered.add(crn)
+        return "successResult"
+
+    def _drop_course(self, crn: str, registered: set[str]) -> str:
+        if crn not in registered:
+            return "VAL10"
+        registered.discard(crn)
+        self.quotas[crn] = self.quotas.get(crn, self.default_quota) + 1
+        return "Silme İşlemi Başarılı"
+
+    def report(self) -> dict:
+        with self.lock:
+            return {
+                "logins": self.stats["logins"],
+                "time_checks": self.stats["time_checks"],
+                "selection_requests": self.stats["selection_requests"],
+                "wasted_requests": self.stats["wasted_requests"],
+                "lockouts": self.stats["lockouts"],
+                "codes": dict(self.stats["codes"]),
+                "time_to_first_success": {crn: at - (self.open_time or at) for crn, at in self.stats["first_success"].items()},
+            }
+
+class MockObsRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def date_time_string(self, timestamp=None) -> str:
+        # The Date header is what the clients use to synchronize, so it follows the skewed clock.
+        return formatdate(self.server.now() if timestamp is None else timestamp, usegmt=True)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def send_json(self, data, status: int = 200) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            return {}
+
+    def send_html(self, html: str, status: int = 200) -> None:
+        body = html.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def redirect(self, location: str, cookie: str | None = None) -> None:
+        self.send_response(302)
+        self.send_header("Location", location)
+        if cookie is not None:
+            self.send_header("Set-Cookie", f"{SESSION_COOKIE}={cookie}; Path=/; HttpOnly")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def get_session(self) -> str | None:
+        """Returns the session cookie of the request if it belongs to a logged in session."""
+        for part in self.headers.get("Cookie", "").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == SESSION_COOKIE and value in self.server.sessions:
+                return value
+        return None
+
+    def do_HEAD(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        return_url = query.get("ReturnUrl", ["/ogrenci/"])[0]
+        session = self.get_session()
+
+        if url.path == TIME_CHECK_PATH:
+            if not self.server.is_token_valid(self.headers.get("Authorization", "")):
+                self.send_json({"message": "Unauthorized"}, status=401)
+                return
+            with self.server.lock:
+                self.server.stats["time_checks"] += 1
+            is_open = self.server.is_open()
+            self.send_json({"kayitZamanKontrolResult": {"ogrenciSinifaKayitOlabilir": is_open, "ogrenciSiniftanAyrilabilir": is_open}})
+        elif url.path == LOGIN_PATH:
+            self.send_html(LOGIN_PAGE.format(action=f"{LOGIN_PATH}?ReturnUrl={quote(return_url)}", view_state=secrets.token_hex(8)))
+        elif url.path == SELECT_IDENTITY_PATH and session is not None:
+            cards = [IDENTITY_CARD.format(index=i, program=f"Program {i}", student_id=f"0{i}0200000", status="Aktif" if i == self.server.identity_count else "Pasif",
+                                          link=f"{SELECT_IDENTITY_PATH}/Select?id={i}&ReturnUrl={quote(return_url)}") for i in range(1, self.server.identity_count + 1)]
+            self.send_html("<html><body>" + "".join(cards) + "</body></html>")
+        elif url.path == SELECT_IDENTITY_PATH + "/Select" and session is not None:
+            with self.server.lock:
+                self.server.sessions[session] = True
+            self.redirect(return_url)
+        elif url.path == JWT_PATH and session is not None and self.server.sessions[session]:
+            body = self.server.create_token(session).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif url.path.startswith("/ogrenci"):
+            if session is None or not self.server.sessions[session]:
+                self.redirect(f"{LOGIN_PATH}?ReturnUrl={quote(url.path)}")
+            else:
+                self.send_html(KEPLER_PAGE)
+        else:
+            self.send_json({"message": "Not Found"}, status=404)
+
+    def do_POST(self) -> None:
+        url = urlsplit(self.path)
+        if url.path == LOGIN_PATH:
+            self.handle_login(parse_qs(url.query).get("ReturnUrl", ["/ogrenci/"])[0])
+            return
+        if not url.path.startswith(COURSE_SELECTION_PATH):
+            self.send_json({"message": "Not Found"}, status=404)
+            return
+
+        body = self.read_json()
+        token = self.headers.get("Authorization", "")
+        if not self.server.is_token_valid(token):
+            self.send_json({"message": "Unauthorized"}, status=401)
+            return
+
+        ecrn_list = [str(crn) for crn in body.get("ECRN", [])]
+        scrn_list = [str(crn) for crn in body.get("SCRN", [])]
+        self.send_json(self.server.select_courses(token, ecrn_list, scrn_list))
+
+    def handle_login(self, return_url: str) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        form = {name: values[0] for name, values in parse_qs(self.rfile.read(length).decode("utf-8")).items()}
+        username = form.get("ctl00$ContentPlaceHolder1$tbUserName")
+        password = form.get("ctl00$ContentPlaceHolder1$tbPassword")
+        if "__VIEWSTATE" not in form or LOGIN_BUTTON not in form or username != self.server.username or password != self.server.password:
+            self.send_html(LOGIN_PAGE.format(action=f"{LOGIN_PATH}?ReturnUrl={quote(return_url)}", view_state=secrets.token_hex(8)))
+            return
+
+        session = secrets.token_hex(16)
+        has_single_identity = self.server.identity_count <= 1
+        with self.server.lock:
+            self.server.sessions[session] = has_single_identity
+            self.server.stats["logins"] += 1
+        self.redirect(return_url if has_single_identity else f"{SELECT_IDENTITY_PATH}?ReturnUrl={quote(return_url)}", cookie=session)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="obs.itu.edu.tr yerine kullanılabilecek yerel test sunucusu.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--skew", type=float, default=0, help="Sunucu saatinin yerel saatten ne kadar ileride olduğu (saniye).")
+    parser.add_argument("--open-in", type=float, default=None, help="Ders seçiminin kaç saniye sonra açılacağı.")
+    parser.add_argument("--quota", action="append", default=[], help="CRN kontenjanı, \"CRN=KONTENJAN\" formatında, birden fazla kez verilebilir.")
+    parser.add_argument("--default-quota", type=int, default=30)
+    parser.add_argument("--seat-drain", type=float, default=0, help="Açılıştan sonra diğer öğrenciler tarafından saniyede alınan kontenjan.")
+    parser.add_argument("--latency", default="0", help="Yanıt gecikmesi, örnek: \"0.05\", \"uniform:0.05,0.3\", \"lognormal:-2,0.5\".")
+    parser.add_argument("--overload-rate", type=float, default=0, help="İsteklerin VAL14 ile yanıtlanma olasılığı.")
+    parser.add_argument("--rate-limit", type=int, default=RATE_LIMIT)
+    parser.add_argument("--username", default=None, help="Sahte girisv3 hesabının kullanıcı adı, verilirse sadece bu hesaba verilen token'lar kabul edilir.")
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--identities", type=int, default=1, help="1'den fazla ise giriş SelectIdentity sayfasından geçer.")
+    parser.add_argument("--token-ttl", type=float, default=TOKEN_TTL)
+    args = parser.parse_args()
+
+    quotas = {crn: int(seats) for crn, seats in (quota.split("=", 1) for quota in args.quota)}
+    server = MockObsServer(args.port, args.skew, quotas=quotas, default_quota=args.default_quota, seat_drain=args.seat_drain,
+                           latency=args.latency, overload_rate=args.overload_rate, rate_limit=args.rate_limit,
+                           username=args.username, password=args.password, identity_count=args.identities, token_ttl=args.token_ttl)
+    if args.open_in is not None:
+        server.open_time = server.now() + args.open_in
+    print(f"Test sunucusu {server.base_url} adresinde çalışıyor...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+        print(json.dumps(server.report(), ensure_ascii=False, indent=2))
@@ -0,0 +1,159 @@
+# === IMPORTS ===
+from collections import Counter
+from datetime import datetime
+from os import makedirs, path, getpid
+from time import monotonic, perf_counter
+from logger import Logger, LOG_DIR
+import threading
+import sys
+import csv
+
+import atexit
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# === CONSTANTS ===
+SAMPLE_INTERVAL = .01 # Seconds between two stack samples, every sample briefly takes the GIL.
+RESOURCE_INTERVAL = .25 # Seconds between two CPU/RSS readings.
+MAX_STACK_DEPTH = 64
+
+# === CLASS DEFINITON ===
+class Profiler:
+    """
+    Samples the stacks of every Python thread and reads the CPU and memory usage of the threads, the process and the
+    browser processes, between `start` and `stop`.
+
+    Writes two files to the log directory:
+        `profile_<time stamp>.folded`: One "thread;outer frame;...;inner frame count" line per stack, it can be opened
+            with flamegraph.pl or speedscope.
+        `profile_<time stamp>_timeline.csv`: CPU percentage and RSS of every thread and process over time, rows with
+            the "stack" kind are written whenever the innermost frame of a thread changes.
+    """
+    def __init__(self, get_child_processes=None, interval: float = SAMPLE_INTERVAL, resource_interval: float = RESOURCE_INTERVAL, max_duration: float | None = None) -> None:
+        """
+        Args:
+            get_child_processes: Returns the psutil processes to be measured along with this one, e.g. Chrome.
+            max_duration: Stops sampling after this many seconds even if `stop` is not called.
+        """
+        self.get_child_processes = get_child_processes
+        self.interval = interval
+        self.resource_interval = resource_interval
+        self.max_duration = max_duration
+        self.file_name = f"profile_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
+        self.stacks = Counter()
+        self.timeline = []
+        self._cpu_times = {}
+        self._top_frames = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._start_time = None
+        self._is_saved = False
+
+    @staticmethod
+    def format_frame(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _sample_stacks(self, elapsed: float) -> None:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own_id = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            frames = []
+            while frame is not None and len(frames) < MAX_STACK_DEPTH:
+                frames.append(Profiler.format_frame(frame))
+                frame = frame.f_back
+            name = names.get(thread_id, str(thread_id))
+            self.stacks[";".join([name] + frames[::-1])] += 1
+
+            # Only the changes go to the timeline, a thread that waits in the same place for minutes is a single row.
+            top_frame = frames[0] if frames else ""
+            if self._top_frames.get(thread_id) != top_frame:
+                self._top_frames[thread_id] = top_frame
+                self.timeline.append((round(elapsed, 4), "stack", name, top_frame, "", ""))
+
+    def _cpu_percent(self, key, cpu_time: float, now: float) -> float | str:
+        last = self._cpu_times.get(key)
+        self._cpu_times[key] = (cpu_time, now)
+        if last is None or now <= last[1]:
+            return ""
+        return round((cpu_time - last[0]) / (now - last[1]) * 100, 1)
+
+    def _sample_resources(self, elapsed: float) -> None:
+        if psutil is None:
+            return
+        now = perf_counter()
+        process = psutil.Process(getpid())
+        with process.oneshot():
+            times = process.cpu_times()
+            self.timeline.append((round(elapsed, 4), "process", "python", "", self._cpu_percent("process", times.user + times.system, now), round(process.memory_info().rss / 2**20, 1)))
+            names = {thread.native_id: thread.name for thread in threading.enumerate()}
+            for thread in process.threads():
+                cpu = self._cpu_percent(("thread", thread.id), thread.user_time + thread.system_time, now)
+                self.timeline.append((round(elapsed, 4), "thread", names.get(thread.id, str(thread.id)), "", cpu, ""))
+
+        children = self.get_child_processes() if self.get_child_processes is not None else []
+        total_cpu, total_rss, has_cpu = 0, 0, False
+        for child in children:
+            try:
+                times = child.cpu_times()
+                cpu = self._cpu_percent(("child", child.pid), times.user + times.system, now)
+                total_rss += child.memory_info().rss
+            except psutil.Error:
+                continue
+            if cpu != "":
+                total_cpu += cpu
+                has_cpu = True
+        if children:
+            self.timeline.append((round(elapsed, 4), "browser", f"{len(children)} süreç", "", round(total_cpu, 1) if has_cpu else "", round(total_rss / 2**20, 1)))
+
+    def _run(self) -> None:
+        next_resource_sample = 0
+        while not self._stop_event.is_set():
+            elapsed = monotonic() - self._start_time
+            if self.max_duration is not None and elapsed > self.max_duration:
+                break
+            self._sample_stacks(elapsed)
+            if elapsed >= next_resource_sample:
+                try:
+                    self._sample_resources(elapsed)
+                except Exception as e:
+                    Logger.log(f"Profil için kaynak kullanımı okunamadı: {e}", silent=True)
+                next_resource_sample = elapsed + self.resource_interval
+            self._stop_event.wait(self.interval)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        Logger.log("Profil kaydı başlatıldı.", silent=True)
+        if psutil is None:
+            Logger.log("psutil kurulu olmadığından profil kaydına CPU ve bellek kullanımı eklenmeyecek.")
+        self._start_time = monotonic()
+        self._thread = threading.Thread(target=self._run, name="Profiler", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """Stops sampling and writes the files, only the first call has an effect."""
+        if self._thread is None or self._is_saved:
+            return
+        self._is_saved = True
+        self._stop_event.set()
+        self._thread.join()
+
+        makedirs(LOG_DIR, exist_ok=True)
+        stacks_path = path.join(LOG_DIR, f"{self.file_name}.folded")
+        with open(stacks_path, "w", encoding="utf-8") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+        timeline_path = path.join(LOG_DIR, f"{self.file_name}_timeline.csv")
+        with open(timeline_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["elapsed_s", "kind", "name", "frame", "cpu_percent", "rss_mb"])
+            writer.writerows(self.timeline)
+
+        Logger.log(f"Profil kaydedildi: {stacks_path}, {timeline_path} ({sum(self.stacks.values())} örnek).")
@@ -1,6 +1,17 @@
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+from time import perf_counter, time
 import requests
+import socket
 import json
 from logger import Logger
+from event_stream import EventStream
+from crn_chain import CrnChains, DONE, RETRY, ADVANCE, STOP
+
+# === CONSTANTS ===
+POOL_SIZE = 4 # Number of keep-alive connections kept open per host.
+REQUEST_TIMEOUT = 30 # Seconds to wait for a response before giving up on a single request.
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/150.0.0.0 Safari/537.36"
 
 class RequestManager:
 
@@ -17,10 +28,13 @@ class RequestManager:
         "Kontenjan Dolu",
     ]
     
-    # Codes that indicate quota is full - should switch to backup CRN
+    # Codes that indicate quota is full - should switch to the next alternative CRN
     quota_full_codes = ["VAL06", "Kontenjan Dolu"]
     success_codes = ["successResult", "Ekleme İşlemi Başarılı", "Silme İşlemi Başarılı"]
     timeout_codes = ["VAL21"]
+
+    # What the slot of a CRN does after each code, the codes not listed here drop the CRN.
+    result_actions = dict.fromkeys(codes_to_try_again, RETRY) | dict.fromkeys(quota_full_codes, ADVANCE) | dict.fromkeys(success_codes, DONE) | dict.fromkeys(timeout_codes, STOP)
     
     # Source: https://github.com/MustafaKrc/ITU-CRN-Picker/blob/ffb2ca20c197092f54ade466439d890cd61acab6/core/crn_picker.py#L31
     return_values = {
@@ -60,20 +74,109 @@ class RequestManager:
         "VAL22": "CRN {} daha önce CC ve üstü harf notu ile verildiği için yükseltmeye alınamaz."
     }
 
-    def __init__(self, token, course_selection_url: str, course_time_check_url: str, backup_map: dict[str, str] = None) -> None:
+    def __init__(self, token, course_selection_url: str, course_time_check_url: str, crn_slots: list[list[str]] | None = None, on_unauthorized=None) -> None:
         """
         Args:
             token: String token or callable token getter function
             course_selection_url: Course selection API URL
             course_time_check_url: Time check API URL
-            backup_map: Dictionary mapping primary CRN to backup CRN
+            crn_slots: CRNs of every course slot in the order they should be tried, e.g. [["21345", "21346"], ["21332"]]
+            on_unauthorized: Callable that is called when the server rejects the token
         """
         self._token = token
         self._token_getter = token if callable(token) else None
         self.course_selection_url = course_selection_url
         self.course_time_check_url = course_time_check_url
-        self.backup_map = backup_map or {}
-        self.original_backup_map = dict(self.backup_map)  # Keep a copy of the original backup map
+        self.chains = CrnChains(crn_slots or [], RequestManager.result_actions)
+        self.on_unauthorized = on_unauthorized
+        self.session = RequestManager.create_session()
+        self.last_result_codes = [] # Result codes of the latest selection response, used to pick the retry delay.
+        self._prepared_selection = None # The selection POST last sent, along with the token and the lists it was built from.
+        self._prepared_key = None
+        self._send_settings = {} # Proxy and certificate settings of every URL, read from the environment once.
+
+    @staticmethod
+    def create_session() -> requests.Session:
+        """Creates a session with a keep-alive connection pool, retries are left to the caller."""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _get_pool(self, url: str):
+        """Returns the urllib3 connection pool that serves the given URL."""
+        return self.session.get_adapter(url).poolmanager.connection_from_url(url)
+
+    def _get_send_settings(self, url: str) -> dict:
+        if url not in self._send_settings:
+            self._send_settings[url] = self.session.merge_environment_settings(url, {}, None, None, None)
+        return self._send_settings[url]
+
+    def prepare_selection_request(self, crn_list: list[str], scrn_list: list[str]) -> requests.PreparedRequest:
+        """Returns the selection POST ready to be sent, the body and the headers are only rebuilt when the lists or the token change."""
+        token = self._get_current_token()
+        key = (token, tuple(crn_list), tuple(scrn_list))
+        if key != self._prepared_key:
+            body = json.dumps({"ECRN": list(crn_list), "SCRN": list(scrn_list)}, separators=(",", ":")).encode()
+            headers = {**self._get_headers(token), "Content-Type": "application/json"}
+            self._prepared_selection = self.session.prepare_request(requests.Request("POST", self.course_selection_url, data=body, headers=headers))
+            self._prepared_key = key
+        return self._prepared_selection
+
+    def send_selection_request(self, prepared: requests.PreparedRequest) -> requests.Response:
+        """Sends a selection POST built by `prepare_selection_request`, raises `requests.RequestException` if it can't be sent."""
+        return self._send("POST", self.course_selection_url, prepared=prepared)
+
+    def _send(self, method: str, url: str, prepared: requests.PreparedRequest | None = None, **kwargs) -> requests.Response:
+        """
+        Sends a request through the pooled session and logs whether a new connection had to be opened.
+        A `prepared` request is sent as it is, without merging the session and environment settings again.
+        """
+        pool = self._get_pool(url)
+        connections_before = pool.num_connections
+
+        start = perf_counter()
+        try:
+            if prepared is not None:
+                response = self.session.send(prepared, timeout=REQUEST_TIMEOUT, **self._get_send_settings(url))
+            else:
+                response = self.session.request(method, url, headers=self._get_headers(), timeout=REQUEST_TIMEOUT, **kwargs)
+        except requests.RequestException:
+            EventStream.emit("http", method=method, path=urlsplit(url).path, status=None, rtt_ms=(perf_counter() - start) * 1000, new_connection=pool.num_connections > connections_before)
+            raise
+        duration = (perf_counter() - start) * 1000
+
+        if response.status_code == 401 and self.on_unauthorized is not None:
+            Logger.log("API Token sunucu tarafından reddedildi.", silent=True)
+            self.on_unauthorized()
+
+        is_new_connection = pool.num_connections > connections_before
+        EventStream.emit("http", method=method, path=urlsplit(url).path, status=response.status_code, rtt_ms=duration, new_connection=is_new_connection)
+        Logger.log(f"{method} {urlsplit(url).path}: {duration:.1f} ms ({'yeni bağlantı' if is_new_connection else 'bağlantı yeniden kullanıldı'}).", silent=True)
+        return response
+
+    def warm_up(self) -> None:
+        """Resolves DNS and opens the TLS connections in advance, so the first selection request goes out on an open socket."""
+        Logger.log("Sunucu bağlantıları önceden açılıyor...")
+        hosts = {urlsplit(url)[:2]: url for url in [self.course_time_check_url, self.course_selection_url]}
+        for (scheme, netloc), url in hosts.items():
+            parts = urlsplit(url)
+            try:
+                start = perf_counter()
+                socket.getaddrinfo(parts.hostname, parts.port or (443 if scheme == "https" else 80))
+                Logger.log(f"{netloc} DNS çözümlemesi: {(perf_counter() - start) * 1000:.1f} ms.", silent=True)
+            except OSError as e:
+                Logger.log(f"{netloc} DNS çözümlemesi başarısız oldu: {e}", silent=True)
+
+        # A cheap GET per host opens the TLS connection that the selection POSTs will reuse.
+        try:
+            self._send("GET", self.course_time_check_url)
+            for url in hosts.values():
+                if urlsplit(url)[:2] != urlsplit(self.course_time_check_url)[:2]:
+                    self._send("HEAD", url)
+        except requests.RequestException as e:
+            Logger.log(f"Sunucu bağlantısı önceden açılamadı: {e}", silent=True)
 
     def _get_current_token(self) -> str:
         """Returns the current token."""
@@ -81,14 +184,25 @@ class RequestManager:
             return self._token_getter()
         return self._token
 
-    def _get_headers(self) -> dict[str, str]:
+    def _get_headers(self, token: str | None = None) -> dict[str, str]:
         return {
-            'Authorization': self._get_current_token(),
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/150.0.0.0 Safari/537.36'
+            'Authorization': token if token is not None else self._get_current_token(),
+            'User-Agent': USER_AGENT
         }
 
+    def probe_server_time(self) -> tuple[float, float, str | None]:
+        """Sends a time check request and returns the local send/receive epoch times along with the server's `Date` header."""
+        t_send = time()
+        start = perf_counter()
+        response = self._send("GET", self.course_time_check_url)
+        return t_send, t_send + perf_counter() - start, response.headers.get("Date")
+
     def check_course_selection_time(self) -> bool:
-        response = requests.get(self.course_time_check_url, headers=self._get_headers())
+        try:
+            response = self._send("GET", self.course_time_check_url)
+        except requests.RequestException as e:
+            Logger.log(f"Zaman kontrol request'i gönderilemedi: {e}", silent=True)
+            return False
         Logger.log(f"Zaman kontrol request response mesajı: {response.text}", silent=True)
 
         try:
@@ -100,84 +214,67 @@ class RequestManager:
 
     def request_course_selection(self, crn_list: list[str], scrn_list: list[str]) -> tuple[list[str], list[str], bool]:
         # Send the request to the server.
-        response = requests.post(self.course_selection_url, headers=self._get_headers(), json={"ECRN": crn_list, "SCRN": scrn_list})
-        Logger.log(f"Ders Seçim request response mesajı: {response.text}", silent=True)
-        
+        try:
+            response = self.send_selection_request(self.prepare_selection_request(crn_list, scrn_list))
+        except requests.RequestException as e:
+            Logger.log(f"Ders seçim request'i gönderilemedi: {e}", silent=True)
+            self.last_result_codes = ["error"]
+            return crn_list, scrn_list, False
+        # `response.text` would guess the encoding first, the API always answers in UTF-8.
+        Logger.log(f"Ders Seçim request response mesajı: {response.content.decode('utf-8', 'replace')}", silent=True)
+        return self.handle_selection_response(response.content, crn_list, scrn_list)
+
+    def handle_selection_response(self, response_text: str | bytes, crn_list: list[str], scrn_list: list[str]) -> tuple[list[str], list[str], bool]:
+        """Applies the results of a course selection response to the CRN and SCRN lists, the response is parsed from its raw bytes if given."""
         time_out_detected = False
+        self.last_result_codes = ["error"]
         try:
-            result_json = json.loads(response.text)
+            result_json = json.loads(response_text)
+            self.last_result_codes = [result["resultCode"] for result in result_json["ecrnResultList"] + result_json["scrnResultList"]]
 
             # Log the results of crn_list and determine if it is to be retried.
             for crn_result in result_json["ecrnResultList"]:
                 crn = crn_result["crn"]
                 result_code = crn_result["resultCode"]
 
+                # The CRN was already handled by the result of another request, this one is outdated.
+                if crn not in crn_list:
+                    continue
+                EventStream.emit("result", crn=crn, code=result_code, list="ECRN", success=result_code in RequestManager.success_codes)
+
                 Logger.log(RequestManager.return_values.get(result_code, f"CRN {{}} için bilinmeyen hata kodu: {result_code}").format(crn))
                 
-                is_retriable = result_code in RequestManager.codes_to_try_again
-                # Use the backup only if the quota is full, other codes in the codes_to_try_again array are usually caused by timing problems etc.
-                should_use_backup = result_code in RequestManager.quota_full_codes
-                is_success = result_code in RequestManager.success_codes
-                timed_out = result_code in RequestManager.timeout_codes
-                has_backup = crn in self.backup_map
-                is_backup_crn = crn in self.original_backup_map.values()
-            
-                if timed_out:
+                action, next_crn = self.chains.transition(crn, result_code)
+                if action == STOP:
                     time_out_detected = True
                     return crn_list, scrn_list, time_out_detected
-                elif is_success:
+                elif action == DONE:
+                    crn_list.remove(crn)
+                elif next_crn == crn:
+                    Logger.log(f"CRN {crn} tekrar denenecek...")
+                elif next_crn is None:
+                    Logger.log(f"CRN {crn} listeden çıkarılıyor...")
                     crn_list.remove(crn)
-                elif is_retriable:
-                    if should_use_backup and has_backup:
-                        backup_crn = self.backup_map[crn]
-                        if not is_backup_crn:
-                            Logger.log(f"CRN {crn} yerine yedeği ({backup_crn}) denenecek...")
-                        else:
-                            Logger.log(f"Yedek CRN {crn} başarısız oldu, orijinal CRN ({backup_crn}) denenmeye devam edilecek...")
-
-                        crn_list.remove(crn)
-                        crn_list.append(backup_crn)
-
-                        self.backup_map.pop(crn)
-                        self.backup_map[backup_crn] = crn
-                    else:
-                        Logger.log(f"CRN {crn} tekrar denenecek...")
                 else:
-                    # Check if this CRN is currently a backup (swap happened before)
-                    if is_backup_crn:
-                        # Find the original CRN
-                        original_crn = next((k for k, v in self.original_backup_map.items() if v == crn), None)
-                        
-                        if original_crn:
-                            Logger.log(f"Yedek CRN {crn} başarısız oldu, orijinal CRN'ye ({original_crn}) dönülüyor...")
-                            
-                            crn_list.remove(crn)
-                            crn_list.append(original_crn)
-
-                            self.backup_map.pop(crn, None)
-                        else:
-                            crn_list.remove(crn)
-                            
-                    # Check if we have a backup to try
-                    elif has_backup:
-                        backup_crn = self.backup_map[crn]
-                        Logger.log(f"CRN {crn} başarısız oldu, yedeği olan ({backup_crn}) denenecek...")
-                        
-                        crn_list.remove(crn)
-                        crn_list.append(backup_crn)
-                        
-                        self.backup_map.pop(crn)
-                        
-                    # No backup available, just remove
+                    if action == ADVANCE:
+                        Logger.log(f"CRN {crn} yerine sıradaki alternatifi ({next_crn}) denenecek...")
                     else:
-                        Logger.log(f"CRN {crn} listeden çıkarılıyor...")
-                        crn_list.remove(crn)
+                        Logger.log(f"CRN {crn} başarısız oldu, sıradaki alternatifi ({next_crn}) denenecek...")
+                    # Keep the position of the slot in the list.
+                    crn_list[crn_list.index(crn)] = next_crn
+                    # The next request tries a section that wasn't tried yet, the delay of this code doesn't apply to it.
+                    if not self.chains.is_tried(next_crn):
+                        self.last_result_codes.remove(result_code)
 
             # Log the results of scrn_list and determine if it is to be retried.
             for scrn_result in result_json["scrnResultList"]:
                 crn = scrn_result["crn"]
                 result_code = scrn_result["resultCode"]
 
+                if crn not in scrn_list:
+                    continue
+                EventStream.emit("result", crn=crn, code=result_code, list="SCRN", success=result_code in RequestManager.success_codes)
+
                 Logger.log(RequestManager.return_values.get(result_code, f"CRN {{}} için bilinmeyen hata kodu: {result_code}").format(crn))
                 if result_code in RequestManager.codes_to_try_again:
                     Logger.log(f"CRN {crn} tekrar denenecek...")
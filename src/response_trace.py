@@ -0,0 +1,297 @@
+# === IMPORTS ===
+from bisect import bisect_right
+from datetime import datetime
+from os import makedirs, path
+from time import perf_counter, sleep, time
+from typing import NamedTuple
+from urllib.parse import urlsplit
+from logger import Logger, LOG_DIR
+from request_manager import RequestManager
+from retry_policy import RetryScheduler
+import contextlib
+import threading
+import argparse
+import requests
+import atexit
+import json
+import io
+
+# === CONSTANTS ===
+TRACE_VERSION = 1
+# Codes about the request rather than the CRN, a response made of one of these tells the state of the whole server.
+SERVER_CODES = {"VAL02", "NULLParam-CheckOgrenciKayitZamaniKontrolu", "VAL14", "ERRLoad", "VAL16", "VAL21"}
+UNKNOWN_CRN_CODE = "VAL06" # Code of the CRNs the trace has no result for, e.g. a backup that was never sent.
+DEFAULT_DELAY = 3 # Same as `DELAY_BETWEEN_TRIES` of run.py.
+REPLAY_DURATION = 60 * 10 # Same as `SPAM_DUR` of run.py.
+
+# === DATA TYPES ===
+class Exchange(NamedTuple):
+    wall: float # Local epoch time the request was sent at.
+    method: str
+    path: str
+    request: dict | None # JSON body of the request.
+    status: int | None # `None` if no response was received.
+    rtt_ms: float
+    body: str
+    date: str | None # `Date` header of the response.
+
+class ReplayResult(NamedTuple):
+    requests: int
+    wasted_requests: int # Selection requests without any successful result.
+    timed_out: bool # Whether the replay ran into `VAL21`.
+    first_success_ms: dict[str, float] # Milliseconds from the open until the request that took each CRN was sent.
+    remaining_crns: list[str]
+    remaining_scrns: list[str]
+
+# === CLASS DEFINITON ===
+class TraceRecorder:
+    """
+    Records every request a `RequestManager` sends, along with its response and timing, to `logs/trace_<time stamp>.jsonl`.
+
+    The first line of the file is a header with the URLs and the open time, every other line is an `Exchange`. The
+    exchanges are kept in memory and written at `save`, nothing is written to the disk while the requests are sent.
+    """
+    def __init__(self, open_time: float | None = None, file_path: str | None = None) -> None:
+        self.open_time = open_time
+        self.file_path = file_path or path.join(LOG_DIR, f"trace_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.jsonl")
+        self.header = {"version": TRACE_VERSION, "open_time": open_time}
+        self.exchanges: list[Exchange] = []
+        self._lock = threading.Lock()
+        self._is_saved = False
+
+    def attach(self, request_manager: RequestManager) -> None:
+        """Wraps `request_manager._send`, so that every request it sends is recorded."""
+        self.header.update(selection_url=request_manager.course_selection_url, time_check_url=request_manager.course_time_check_url)
+        send = request_manager._send
+
+        def recorded_send(method: str, url: str, prepared: requests.PreparedRequest | None = None, **kwargs) -> requests.Response:
+            wall, start = time(), perf_counter()
+            try:
+                request = json.loads(prepared.body) if prepared is not None and prepared.body else kwargs.get("json")
+            except ValueError:
+                request = None
+            try:
+                response = send(method, url, prepared=prepared, **kwargs)
+            except requests.RequestException:
+                self._record(Exchange(wall, method, urlsplit(url).path, request, None, (perf_counter() - start) * 1000, "", None))
+                raise
+            self._record(Exchange(wall, method, urlsplit(url).path, request, response.status_code, (perf_counter() - start) * 1000,
+                                  response.content.decode("utf-8", "replace"), response.headers.get("Date")))
+            return response
+
+        request_manager._send = recorded_send
+        atexit.register(self.save)
+
+    def _record(self, exchange: Exchange) -> None:
+        with self._lock:
+            self.exchanges.append(exchange)
+
+    def save(self) -> None:
+        """Writes the trace, only the first call has an effect."""
+        if self._is_saved:
+            return
+        self._is_saved = True
+
+        directory = path.dirname(self.file_path)
+        if directory:
+            makedirs(directory, exist_ok=True)
+        with self._lock, open(self.file_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(self.header, separators=(",", ":")) + "\n")
+            f.writelines(json.dumps(exchange, ensure_ascii=False, separators=(",", ":")) + "\n" for exchange in self.exchanges)
+        Logger.log(f"İstek kaydı kaydedildi: {self.file_path} ({len(self.exchanges)} istek).")
+
+class TraceReplayer:
+    """
+    Plays a recorded trace back through a `RequestManager`, on a virtual clock.
+
+    The server is modelled from the trace as timelines measured from the open: one of the server wide state, made of
+    the responses with only a server code (e.g. `VAL02`) and the time checks that say closed, and one of the result
+    codes of every CRN. A replayed request gets the latest server code recorded at or before its time, or the first
+    one recorded after it if there is none before. Once the server answered for the CRNs themselves, every CRN gets its
+    own code the same way. Latencies are taken from the nearest recorded request. Given the same trace and seed, a replay always gives the same result,
+    so different CRN lists and retry rules can be compared against the same registration day.
+    """
+    def __init__(self, header: dict, exchanges: list[Exchange], unknown_crn_code: str = UNKNOWN_CRN_CODE) -> None:
+        self.header = header
+        self.exchanges = exchanges
+        self.unknown_crn_code = unknown_crn_code
+        self.selection_path = urlsplit(header["selection_url"]).path
+        selections = [exchange for exchange in exchanges if exchange.path == self.selection_path and exchange.method == "POST"]
+
+        # Times are relative to the open, to the first selection request if the open wasn't known while recording.
+        self.reference = header.get("open_time") or (selections[0].wall if selections else exchanges[0].wall)
+        self.first_selection_at = selections[0].wall - self.reference if selections else 0
+        self.crn_timelines: dict[str, tuple[list[float], list[str]]] = {}
+        self.server_timeline = ([], [])
+        self.latencies = ([], [])
+        self.time_checks = ([], [])
+        self.clock = 0 # Seconds from the open on the virtual clock of the replay.
+        self.speed = None
+
+        for exchange in exchanges:
+            at = exchange.wall - self.reference
+            if exchange.path == self.selection_path and exchange.method == "POST":
+                TraceReplayer._append(self.latencies, at, exchange.rtt_ms / 1000)
+                self._add_selection(at, exchange)
+            elif exchange.method == "GET" and exchange.status is not None:
+                TraceReplayer._append(self.time_checks, at, exchange)
+                # A time check that says closed is recorded as the code a selection request would have got.
+                if TraceReplayer.is_closed(exchange):
+                    TraceReplayer._append(self.server_timeline, at, "VAL02")
+
+    @staticmethod
+    def load(file_path: str, unknown_crn_code: str = UNKNOWN_CRN_CODE) -> "TraceReplayer":
+        with open(file_path, encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            exchanges = [Exchange(*json.loads(line)) for line in f if line.strip()]
+        return TraceReplayer(header, exchanges, unknown_crn_code)
+
+    @staticmethod
+    def _append(timeline: tuple[list, list], at: float, value) -> None:
+        # Requests sent from several threads may finish out of order, the timelines are kept sorted.
+        index = bisect_right(timeline[0], at)
+        timeline[0].insert(index, at)
+        timeline[1].insert(index, value)
+
+    @staticmethod
+    def _value_at(timeline: tuple[list, list], at: float):
+        """Returns the latest value at or before `at`, the first one if there is none, `None` if the timeline is empty."""
+        if not timeline[0]:
+            return None
+        return timeline[1][max(0, bisect_right(timeline[0], at) - 1)]
+
+    @staticmethod
+    def is_closed(exchange: Exchange) -> bool:
+        try:
+            enrollment_data = json.loads(exchange.body)["kayitZamanKontrolResult"]
+            return not (enrollment_data["ogrenciSinifaKayitOlabilir"] or enrollment_data["ogrenciSiniftanAyrilabilir"])
+        except (ValueError, KeyError, TypeError):
+            return False
+
+    def _add_selection(self, at: float, exchange: Exchange) -> None:
+        try:
+            result_json = json.loads(exchange.body)
+            results = result_json["ecrnResultList"] + result_json["scrnResultList"]
+        except (ValueError, KeyError, TypeError):
+            return
+        codes = {result["resultCode"] for result in results}
+        if len(codes) == 1 and codes <= SERVER_CODES:
+            TraceReplayer._append(self.server_timeline, at, codes.pop())
+            return
+        # The server answered for the CRNs themselves, the server codes before this one don't hold anymore.
+        TraceReplayer._append(self.server_timeline, at, None)
+        for result in results:
+            TraceReplayer._append(self.crn_timelines.setdefault(result["crn"], ([], [])), at, result["resultCode"])
+
+    def get_code(self, crn: str, at: float) -> str:
+        """Returns the code the server would have answered for `crn` at `at` seconds from the open."""
+        server_code = TraceReplayer._value_at(self.server_timeline, at)
+        if server_code is not None:
+            return server_code
+        crn_code = TraceReplayer._value_at(self.crn_timelines.get(crn, ([], [])), at)
+        return crn_code if crn_code is not None else self.unknown_crn_code
+
+    def _respond(self, method: str, url: str, prepared: requests.PreparedRequest | None = None, **kwargs) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.encoding = "utf-8"
+        if prepared is not None:
+            request = json.loads(prepared.body)
+            body = {
+                "ecrnResultList": [{"crn": crn, "resultCode": self.get_code(crn, self.clock), "resultData": None} for crn in request["ECRN"]],
+                "scrnResultList": [{"crn": crn, "resultCode": self.get_code(crn, self.clock), "resultData": None} for crn in request["SCRN"]],
+            }
+            response._content = json.dumps(body).encode()
+            latency = self._value_at(self.latencies, self.clock) or 0
+        else:
+            exchange = self._value_at(self.time_checks, self.clock)
+            response._content = exchange.body.encode() if exchange is not None else b""
+            latency = exchange.rtt_ms / 1000 if exchange is not None else 0
+        self._advance(latency)
+        return response
+
+    def _advance(self, seconds: float) -> None:
+        self.clock += seconds
+        if self.speed is not None:
+            sleep(seconds / self.speed)
+
+    def get_recorded_lists(self) -> tuple[list[list[str]], list[str]]:
+        """Returns the CRN and SCRN lists of the first recorded selection request, every CRN as its own slot."""
+        for exchange in self.exchanges:
+            if exchange.path == self.selection_path and exchange.request:
+                return [[crn] for crn in exchange.request["ECRN"]], list(exchange.request["SCRN"])
+        return [], []
+
+    def replay(self, crn_slots: list[list[str]], scrn_list: list[str], retry_config: dict | None = None, duration: float = REPLAY_DURATION,
+               start: float | None = None, speed: float | None = None, seed: int = 0) -> ReplayResult:
+        """
+        Runs the selection loop of run.py against the trace.
+
+        Args:
+            start: Seconds from the open the first request is sent at, the time of the first recorded one by default.
+            speed: Replays in real time divided by this factor, as fast as possible if `None`.
+        """
+        self.speed = speed
+        self.clock = self.first_selection_at if start is None else start
+        started_at = self.clock
+
+        request_manager = RequestManager("replay", self.header["selection_url"], self.header["time_check_url"], crn_slots)
+        request_manager._send = self._respond
+        retry_scheduler = RetryScheduler.from_config(retry_config, DEFAULT_DELAY, duration, seed=seed)
+        crn_list, scrn_list = list(request_manager.chains.heads), list(scrn_list)
+
+        request_count, wasted_count, timed_out = 0, 0, False
+        first_success_ms = {}
+        while self.clock - started_at < duration and (crn_list or scrn_list):
+            # The trace is indexed by send times, the response is matched and timed by the send time, not after its latency.
+            sent_at = self.clock
+            sent_crns = list(crn_list)
+            crn_list, scrn_list, timed_out = request_manager.request_course_selection(crn_list, scrn_list)
+            request_count += 1
+
+            codes = request_manager.last_result_codes
+            if not any(code in RequestManager.success_codes for code in codes):
+                wasted_count += 1
+            # The CRNs that left the list with a success code were taken by this request.
+            for crn in sent_crns:
+                if crn not in crn_list and crn not in request_manager.chains.nodes and self.get_code(crn, sent_at) in RequestManager.success_codes:
+                    first_success_ms[crn] = round(sent_at * 1000, 1)
+            if timed_out:
+                break
+
+            delay = retry_scheduler.next_delay(codes, sent_at - started_at)
+            if delay is None:
+                break
+            self._advance(delay)
+
+        return ReplayResult(request_count, wasted_count, timed_out, first_success_ms, crn_list, scrn_list)
+
+if __name__ == "__main__":
+    from run import read_inputs
+
+    parser = argparse.ArgumentParser(description="Kaydedilmiş bir ders seçim gününü farklı CRN listeleri ve tekrar deneme kuralları ile yeniden oynatır.")
+    parser.add_argument("trace", help="run.py --record-trace ile kaydedilen dosya.")
+    parser.add_argument("--config", action="append", default=[], help="Karşılaştırılacak config dosyası, birden fazla verilebilir. Verilmezse kayıttaki CRN listesi ve varsayılan kurallar kullanılır.")
+    parser.add_argument("--speed", type=float, default=None, help="Kaydı gerçek zamanın bu katı hızında oynatır, verilmezse beklemeden oynatır.")
+    parser.add_argument("--start", type=float, default=None, help="İlk isteğin açılıştan kaç saniye sonra gönderileceği, verilmezse kayıttaki ilk istek zamanı.")
+    parser.add_argument("--duration", type=float, default=REPLAY_DURATION, help="Ders seçim isteklerinin kaç saniye boyunca gönderileceği.")
+    parser.add_argument("--unknown-code", default=UNKNOWN_CRN_CODE, help="Kayıtta sonucu olmayan CRN'ler için kullanılacak sonuç kodu.")
+    parser.add_argument("--verbose", action="store_true", help="Oynatma sırasındaki ders seçim mesajlarını gösterir.")
+    args = parser.parse_args()
+
+    replayer = TraceReplayer.load(args.trace, args.unknown_code)
+    strategies = []
+    for config_file_path in args.config:
+        _, _, crn_slots, scrn_list, _, retry_config = read_inputs(config_file_path=config_file_path)
+        strategies.append((config_file_path, crn_slots, scrn_list, retry_config))
+    if not strategies:
+        strategies = [("kayıt", *replayer.get_recorded_lists(), None)]
+
+    for name, crn_slots, scrn_list, retry_config in strategies:
+        with contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO()):
+            result = replayer.replay(crn_slots, scrn_list, retry_config, args.duration, args.start, args.speed)
+        print(f"{name}: {result.requests} istek, {result.wasted_requests} boşa giden{', VAL21 ile engellendi' if result.timed_out else ''}.")
+        for crn, duration in result.first_success_ms.items():
+            print(f"    CRN {crn}: açılıştan {duration} ms sonra alındı.")
+        if result.remaining_crns or result.remaining_scrns:
+            print(f"    Alınamayan: {result.remaining_crns}, bırakılamayan: {result.remaining_scrns}.")
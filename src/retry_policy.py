@@ -0,0 +1,162 @@
+# === IMPORTS ===
+from collections import deque
+from logger import Logger
+import random
+
+# === CONSTANTS ===
+# The limit isn't published, it is assumed that one request more than this in `RATE_WINDOW` seconds locks the account out with `VAL21`.
+SERVER_RATE_LIMIT = 20
+RATE_WINDOW = 60
+# Rules are checked in order, the first one that matches any of the latest result codes decides the delay.
+# They can be overridden from the "retry" section of `config.json` with the same structure.
+DEFAULT_RETRY_CONFIG = {
+    "max_requests": 300, # Request budget for the whole selection window.
+    "budget_reserve": .2, # Once less than this fraction of the budget is left, the remaining requests are spread evenly.
+    "max_requests_per_window": 15, # Requests allowed in any `RATE_WINDOW` seconds, whatever the rules say, kept below `SERVER_RATE_LIMIT`.
+    "rules": [
+        # Server is overloaded, back off exponentially with jitter so that the clients don't retry in sync.
+        {"codes": ["VAL14", "ERRLoad"], "type": "exponential", "delay": 3, "factor": 2, "max_delay": 30, "jitter": .5},
+        # The previous operation is still being processed, it will be done soon.
+        {"codes": ["VAL16"], "type": "fixed", "delay": 1.5},
+        # Registration is not open yet, retry tightly right after the expected open. Once half of the per-window budget is
+        # spent on it the requests are spread over the window, so that a late open still finds requests left to send.
+        {"codes": ["VAL02", "NULLParam-CheckOgrenciKayitZamaniKontrolu"], "type": "fixed", "delay": 1, "window_share": .5},
+        # Quota is full, watch for a free seat slowly.
+        {"codes": ["VAL06", "Kontenjan Dolu"], "type": "fixed", "delay": 10},
+    ],
+}
+
+# === CLASS DEFINITON ===
+class RetryPolicy:
+    """Fixed delay policy, also the base class of the other policies."""
+    def __init__(self, codes: list[str], delay: float, window: float | None = None, window_share: float | None = None) -> None:
+        """
+        Args:
+            codes: Result codes this policy handles.
+            delay: Delay before the next attempt, in seconds.
+            window: If set, the policy only applies during the first `window` seconds of the selection.
+            window_share: If set, at most this share of the per-window request budget is sent in a row at `delay`, the
+                requests after that are spread evenly over `RATE_WINDOW`.
+        """
+        self.codes = set(codes)
+        self.delay = delay
+        self.window = window
+        self.window_share = window_share
+
+    def matches(self, codes: list[str], elapsed: float) -> bool:
+        if self.window is not None and elapsed > self.window:
+            return False
+        return not self.codes.isdisjoint(codes)
+
+    def streak(self, history: list[list[str]]) -> int:
+        """Number of consecutive responses, counting back from the latest, that contained one of the policy's codes."""
+        count = 0
+        for codes in reversed(history):
+            if self.codes.isdisjoint(codes):
+                break
+            count += 1
+        return count
+
+    def next_delay(self, history: list[list[str]], rng: random.Random) -> float:
+        return self.delay
+
+class ExponentialRetryPolicy(RetryPolicy):
+    """Multiplies the delay by `factor` for every consecutive matching response, and adds up to `jitter` of random spread."""
+    def __init__(self, codes: list[str], delay: float, factor: float = 2, max_delay: float = 30, jitter: float = 0, window: float | None = None,
+                 window_share: float | None = None) -> None:
+        super().__init__(codes, delay, window, window_share)
+        self.factor = factor
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def next_delay(self, history: list[list[str]], rng: random.Random) -> float:
+        delay = min(self.max_delay, self.delay * self.factor ** max(0, self.streak(history) - 1))
+        return delay * (1 + rng.uniform(-self.jitter, self.jitter))
+
+class RetryScheduler:
+    """Picks the delay before the next selection attempt from the latest result codes, their history and the remaining request budget."""
+    policy_types = {
+        "fixed": RetryPolicy,
+        "exponential": ExponentialRetryPolicy,
+    }
+
+    def __init__(self, rules: list[RetryPolicy], default_delay: float, duration: float, max_requests: int, budget_reserve: float = 0, seed: int | None = None,
+                 max_requests_per_window: int = DEFAULT_RETRY_CONFIG["max_requests_per_window"]) -> None:
+        """
+        Args:
+            rules: Policies, checked in order.
+            default_delay: Delay used when no policy matches.
+            duration: Length of the selection window, in seconds.
+            max_requests: Number of requests allowed in the whole window.
+            budget_reserve: Fraction of the budget below which the remaining requests are spread over the remaining time.
+            seed: Seed for the jitter, to make the delays reproducible.
+            max_requests_per_window: Number of requests allowed in any `RATE_WINDOW` seconds.
+        """
+        self.rules = rules
+        self.default_delay = default_delay
+        self.duration = duration
+        self.max_requests = max_requests
+        self.budget_reserve = budget_reserve
+        self.max_requests_per_window = min(max_requests_per_window, SERVER_RATE_LIMIT)
+        self.history = []
+        self.response_times = deque(maxlen=self.max_requests_per_window) # Elapsed seconds of the latest responses.
+        self.rng = random.Random(seed)
+
+    @staticmethod
+    def from_config(retry_config: dict | None, default_delay: float, duration: float, seed: int | None = None) -> "RetryScheduler":
+        config = dict(DEFAULT_RETRY_CONFIG)
+        config.update(retry_config or {})
+
+        rules = []
+        for rule in config["rules"]:
+            rule = dict(rule)
+            policy_type = RetryScheduler.policy_types[rule.pop("type", "fixed")]
+            rules.append(policy_type(**rule))
+
+        return RetryScheduler(rules, default_delay, duration, config["max_requests"], config["budget_reserve"], seed, config["max_requests_per_window"])
+
+    @property
+    def sent_requests(self) -> int:
+        return len(self.history)
+
+    def next_delay(self, codes: list[str], elapsed: float) -> float | None:
+        """Records the result codes of the latest response and returns the delay before the next attempt, `None` if the budget is spent."""
+        self.history.append(list(codes))
+        # A request is sent before its response arrives, so its response time is a safe stand-in for its send time.
+        self.response_times.append(elapsed)
+
+        remaining_requests = self.max_requests - self.sent_requests
+        if remaining_requests <= 0:
+            Logger.log(f"İstek bütçesi ({self.max_requests}) tükendi.", silent=True)
+            return None
+
+        policy = next((rule for rule in self.rules if rule.matches(codes, elapsed)), None)
+        delay = policy.next_delay(self.history, self.rng) if policy else self.default_delay
+
+        # A long streak of the policy's codes would use up the window and leave nothing for the codes that follow it.
+        if policy is not None and policy.window_share is not None:
+            share = max(1, int(self.max_requests_per_window * policy.window_share))
+            if policy.streak(self.history) >= share:
+                delay = max(delay, RATE_WINDOW / share)
+
+        # Running low on budget, make sure the remaining requests last till the end of the window.
+        if remaining_requests < self.max_requests * self.budget_reserve:
+            delay = max(delay, (self.duration - elapsed) / remaining_requests)
+
+        # The rules alone can exceed the server's limit, e.g. `VAL02` every second, the oldest request in the window has to leave it first.
+        if len(self.response_times) == self.max_requests_per_window:
+            delay = max(delay, self.response_times[0] + RATE_WINDOW - elapsed)
+
+        return max(0, delay)
+
+    def simulate(self, code_sequence: list[list[str]], start_elapsed: float = 0) -> list[float | None]:
+        """Replays recorded result codes (one list per response) and returns the delay chosen after each of them."""
+        delays = []
+        elapsed = start_elapsed
+        for codes in code_sequence:
+            delay = self.next_delay(codes, elapsed)
+            delays.append(delay)
+            if delay is None:
+                break
+            elapsed += delay
+        return delays
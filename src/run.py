@@ -1,31 +1,46 @@
 # === IMPORTS ===
-from token_fetcher import ContinuousTokenFetcher
-import requests
+from token_fetcher import ContinuousTokenFetcher, StandbyTokenProvider, StaticTokenFetcher
 from time import sleep
 from datetime import datetime, timedelta
 from logger import Logger
 from driver_manager import DriverManager
+from driver_cache import DriverCache
 from request_manager import RequestManager
+from async_request_manager import AsyncRequestManager
+from clock_sync import ClockSync
+from event_stream import EventStream
+from retry_policy import RetryScheduler
+from catalog import Catalog
+from validator import ScheduleValidator, MAX_CREDITS
+from crn_chain import CrnChains
+from profiler import Profiler
+from wake_scheduler import WakeScheduler
+from response_trace import TraceRecorder
+from speculative_opener import SpeculativeOpener
 import os
 import argparse
+import asyncio
 import json
 
 # === CONSTANTS ===
 CONFIG_FILE_PATH = "data/config.json"
-TARGET_URL = "https://obs.itu.edu.tr/ogrenci/DersKayitIslemleri/DersKayit"
-COURSE_SELECTION_URL = "https://obs.itu.edu.tr/api/ders-kayit/v21/"
-COURSE_TIME_CHECK_URL = "https://obs.itu.edu.tr/api/ogrenci/Takvim/KayitZamaniKontrolu"
+OBS_BASE_URL = "https://obs.itu.edu.tr"
+TARGET_URL = OBS_BASE_URL + "/ogrenci/DersKayitIslemleri/DersKayit"
+COURSE_SELECTION_URL = OBS_BASE_URL + "/api/ders-kayit/v21/"
+COURSE_TIME_CHECK_URL = OBS_BASE_URL + "/api/ogrenci/Takvim/KayitZamaniKontrolu"
 
 # Both are in seconds:
-DELAY_BETWEEN_TRIES = 3 # WARNING: If you want to tweak this value, decreasing it may cause you to hit the API rate limit.
+DELAY_BETWEEN_TRIES = 3 # Used when no retry rule matches the result codes. WARNING: If you want to tweak this value, decreasing it may cause you to hit the API rate limit.
 DELAY_BETWEEN_TIME_CHECKS = .1  # Determines how often the program will check if the course selection time has started, in seconds.
 SPAM_DUR = 60 * 10 # Deternimes how long the program will spam the API HTTP request, in seconds.
 MAX_EXTRA_WAIT_TIME = 60 * 2 # Determines the maximum extra time the program will wait for the course selection to start, in seconds.
 TIMEOUT_WAIT_DUR = 60 * 60 # If a timeout is detected, the program will wait for this amount of time before trying again.
+CLOCK_SYNC_DEADLINE = 3 # Determines how many seconds before the registration the clock synchronization must be finished.
+WARM_UP_LEAD = 5 # Determines how many seconds before the registration the connections to the server are opened.
 
-def read_inputs(test_mode: bool=False) -> tuple[str, str, list[str], list[str], dict[str, str], datetime | None]:
+def read_inputs(test_mode: bool=False, config_file_path: str | None=None) -> tuple[str, str, list[list[str]], list[str], datetime | None, dict | None]:
     Logger.log("Input dosyaları okunuyor...")
-    data = json.load(open(CONFIG_FILE_PATH))
+    data = json.load(open(config_file_path or CONFIG_FILE_PATH))
     
     # Read account details
     account = data.get("account")
@@ -34,7 +49,6 @@ def read_inputs(test_mode: bool=False) -> tuple[str, str, list[str], list[str],
 
     # Read course details
     course_data = data.get("courses")
-    backup_map = {}  # Maps primary CRN to backup CRN
 
     if "scrn" in course_data.keys():
         scrn_list = [str(scrn) for scrn in course_data.get("scrn")]
@@ -44,20 +58,14 @@ def read_inputs(test_mode: bool=False) -> tuple[str, str, list[str], list[str],
         Logger.log(f"SCRN listesi bulunamadı.")
 
     if "crn" in course_data.keys():
-        crn_list = []
-        for crn_entry in course_data.get("crn"):
-            crn_str = str(crn_entry)
-            # Check if it has a backup (format: "primary:backup")
-            if ":" in crn_str:
-                primary, backup = crn_str.split(":", 1)
-                crn_list.append(primary)
-                backup_map[primary] = backup
-                Logger.log(f"CRN {primary} için yedek CRN {backup} tanımlandı.")
-            else:
-                crn_list.append(crn_str)
-        Logger.log(f"CRN listesi okundu: {crn_list}.")
+        # Every entry is a course slot, its alternatives are tried in order (format: "primary:alternative_1:alternative_2").
+        crn_slots = CrnChains.parse(course_data.get("crn"))
+        for slot in crn_slots:
+            if len(slot) > 1:
+                Logger.log(f"CRN {slot[0]} için yedek CRN'ler {slot[1:]} tanımlandı.")
+        Logger.log(f"CRN listesi okundu: {[slot[0] for slot in crn_slots]}.")
     else:
-        crn_list = []
+        crn_slots = []
         Logger.log(f"CRN listesi bulunamadı.")
 
     if test_mode:
@@ -73,38 +81,99 @@ def read_inputs(test_mode: bool=False) -> tuple[str, str, list[str], list[str],
             start_time = datetime.now()
             Logger.log(f"Ders seçim zamanı ve tarihi girilmedi, ders seçimine hemen başlanacak.")
     
-    return login, password, crn_list, scrn_list, backup_map, start_time
+    # Read the retry rules, the defaults in `retry_policy.py` are used for the missing ones.
+    retry_config = data.get("retry")
+    if retry_config is not None:
+        Logger.log("Tekrar deneme kuralları okundu.")
 
-def request_course_selection(token: str, crn_list: list[str], scrn_list: list[str]) -> str:
-    response = requests.post(COURSE_SELECTION_URL, headers={'Authorization': token}, json={"ECRN": crn_list, "SCRN": scrn_list})
-    
-    result_code = response.text
-    return result_code
+    return login, password, crn_slots, scrn_list, start_time, retry_config
+
+def validate_crn_list(crn_slots: list[list[str]], max_credits: float = MAX_CREDITS) -> list[list[str]]:
+    """Checks the CRNs against the local ITU Helper catalog, warns about clashes and credits and drops the ones the server would reject anyway."""
+    catalog = Catalog()
+    if catalog.is_empty():
+        Logger.log("ITU Helper kataloğu bulunamadı, CRN listesi kontrol edilmeyecek (setup.py çalıştırılarak oluşturulabilir).")
+        return crn_slots
+
+    validator = ScheduleValidator(catalog, max_credits=max_credits)
+    result = validator.validate(crn_slots)
+    for message in validator.describe(result):
+        Logger.log(message)
+
+    crn_slots = ScheduleValidator.prune(crn_slots, result)
+    if result.invalid_crns or result.excess_slots:
+        Logger.log(f"Kontrol sonrası CRN listesi: {[':'.join(slot) for slot in crn_slots]}.")
+    return crn_slots
+
+def wait_after_time_out(token_fetcher: ContinuousTokenFetcher) -> None:
+    Logger.log("Ders seçim isteği zaman aşımına uğradı, program 1 saat boyunca bekleyecek.")
+    Logger.log("Programı sonlandırmak için \"Ctrl+C\" yapabilirsiniz.")
+    try:
+        sleep(TIMEOUT_WAIT_DUR)
+    except KeyboardInterrupt:
+        Logger.log("Program kullanıcı tarafından sonlandırıldı.")
+        token_fetcher.stop()
+        exit()
+
+def print_test_mode_message() -> None:
+    print("\n" + "="*20 + " TEST MODU " + "="*20)
+    Logger.log("Alınamayan dersler tekrar denenecekti fakat test modunda olduğundan dolayı bu aşama atlanacak...")
+    Logger.log("Kepler ders seçim işlem geçmişi sayfasını kontrol edin. Hata olarak aktif bir ders seçim zamanı içinde değilsiniz mesajını görüyorsanız, test başarılı demektir.")
+    print("="*51 + "\n")
 
 parser = argparse.ArgumentParser(prog="itu-ders-secici", description="İTÜ OBS (Kepler) üzerinden zamanlayıcılı ders seçim uygulaması.")
 parser.add_argument("-test", "--test", "-t", help="Test modunu açar, ders kayıt vaktinin gelip gelmediğine bakmaksızın seçim yapar.", action="store_true", default=False)
 parser.add_argument("--show-browser", help="Tarayıcı penceresini gösterir.", action="store_true", default=False)
+parser.add_argument("--browser-login", help="Token'ı HTTP üzerinden almayı denemeden doğrudan tarayıcı ile giriş yapar.", action="store_true", default=False)
+parser.add_argument("--no-proxy", help="Tarayıcı ile giriş yapılırsa selenium-wire proxy'si yerine Chrome DevTools ağ olayları ile token okunur.", action="store_true", default=False)
+parser.add_argument("--lean-browser", help="Tarayıcı ile giriş yapılırsa resim, yazı tipi ve medya yüklemeden, hesaba özel kalıcı bir profil ile açılır. Oturum açık kalırsa sonraki çalıştırmalarda giriş adımı atlanır.", action="store_true", default=False)
+parser.add_argument("--profile", help="Ders seçimine 45 saniye kaladan seçim bitene kadar örnekleme profili, thread zaman çizelgesi ve CPU/bellek kullanımı kaydeder (logs klasörüne).", action="store_true", default=False)
+parser.add_argument("--record-trace", help="Ders seçimi sırasında gönderilen her isteği yanıtı ve süresiyle birlikte kaydeder (logs klasörüne), kayıt response_trace.py ile yeniden oynatılabilir.", action="store_true", default=False)
+parser.add_argument("--speculative", help="İlk ders seçim isteğini zaman kontrolünün açıldığını doğrulamasını beklemeden tahmin edilen açılış anında gönderir, zaman kontrolleri paralel olarak devam eder.", action="store_true", default=False)
+parser.add_argument("--standby-session", help="Aynı hesapla ikinci bir oturum açık tutar, ana oturum kapanırsa beklemeden yedek oturumun token'ına geçilir ve kapanan oturumda arka planda tekrar giriş yapılır.", action="store_true", default=False)
+parser.add_argument("--max-credits", help="Kredi sınırı, aşılırsa uyarı verilir (dersler yine de denenir).", type=float, default=MAX_CREDITS)
+parser.add_argument("--config", help="Kullanılacak config dosyası.", default=CONFIG_FILE_PATH)
+parser.add_argument("--base-url", help=f"OBS sunucusunun adresi, yerel test sunucusu (mock_server.py) ile denemek için kullanılabilir.", default=OBS_BASE_URL)
+parser.add_argument("--token", help="Tarayıcı açmadan verilen API Token'ı kullanır, yerel test sunucusu ile denemek için kullanılabilir.", default=None)
+parser.add_argument("--duration", help="Ders seçim isteklerinin kaç saniye boyunca gönderileceği.", type=float, default=None)
+parser.add_argument("--mode", help="Ders seçim isteklerinin gönderilme yöntemi. \"async\" istekleri olay döngüsü üzerinden gönderir, \"sync\" her istekte yanıtı bekler. İkisi de aynı anda tek istek gönderir ve tekrar deneme kurallarına uyar, \"async\" ayrıca sabit bir hız sınırını aşmaz.", choices=["sync", "async"], default="sync")
 
 if __name__ == "__main__":
     args = parser.parse_args()
+    EventStream.enable()
     test_mode = args.test
     headless = not args.show_browser
 
     # If in test mode, spam for 10 seconds only.
     if test_mode:
         SPAM_DUR = 10
+    if args.duration is not None:
+        SPAM_DUR = args.duration
+
+    CONFIG_FILE_PATH = args.config
+    base_url = args.base_url.rstrip("/")
+    TARGET_URL = TARGET_URL.replace(OBS_BASE_URL, base_url)
+    COURSE_SELECTION_URL = COURSE_SELECTION_URL.replace(OBS_BASE_URL, base_url)
+    COURSE_TIME_CHECK_URL = COURSE_TIME_CHECK_URL.replace(OBS_BASE_URL, base_url)
 
     # Don't bother asking for shutdown if in test mode.
     shutdown_on_complete = input("Ders seçimi tamamlandıktan sonra bilgisayar kapatılsın mı? (e/h): ").lower() == "e" if not test_mode else False
     Logger.log(f"Ders seçim tamamlandıktan sonra bilgisayar {'kapatılacak' if shutdown_on_complete else 'kapatılmayacak'}.")
 
     # Read input files
-    login, password, crn_list, scrn_list, backup_map, start_time = read_inputs(test_mode)
+    login, password, crn_slots, scrn_list, start_time, retry_config = read_inputs(test_mode)
 
-    if len(crn_list) == 0 and len(scrn_list) == 0:
+    if len(crn_slots) == 0 and len(scrn_list) == 0:
         Logger.log("CRN ve SCRN listeleri boş, ders seçimi yapılmayacak.")
         exit()
 
+    # Warn about clashes and credits, and drop the CRNs the server would reject before they take up requests.
+    crn_slots = validate_crn_list(crn_slots, args.max_credits)
+
+    # If Chrome got updated since the last run, download its driver now instead of when the browser is needed.
+    if not args.token:
+        DriverCache.refresh_in_background()
+
     # Wait untill 5 mins before the registration starts, if time left to selection is < 5 mins, start instantly.
     if start_time is not None:
         delta = (start_time - datetime.now() - timedelta(seconds=60 *5)).total_seconds()
@@ -112,11 +181,19 @@ if __name__ == "__main__":
     if start_time is not None:
         if delta > 0:
             Logger.log(f"Ders seçimine 5 dakika kalana kadar bekleniyor ({delta} saniye)...")
-            sleep(delta)
+            WakeScheduler.sleep_until(start_time.timestamp() - 60 * 5, "T-5dk")
 
     # === MULTI-THREADED TOKEN FETCHING ===
     # Start token fetcher (will continuously refresh token in background)
-    token_fetcher = ContinuousTokenFetcher(TARGET_URL, login, password, use_headless_browser=headless)
+    if args.token:
+        token_fetcher = StaticTokenFetcher(args.token)
+    elif args.standby_session:
+        # The standby needs its own browser profile, a shared one would share the session it is meant to back up.
+        token_fetcher = StandbyTokenProvider(*(ContinuousTokenFetcher(TARGET_URL, login, password, use_headless_browser=headless, use_http_login=not args.browser_login,
+                                                                      use_proxy=not args.no_proxy, use_lean_browser=args.lean_browser, profile_name=profile_name)
+                                               for profile_name in (login, f"{login}_standby")))
+    else:
+        token_fetcher = ContinuousTokenFetcher(TARGET_URL, login, password, use_headless_browser=headless, use_http_login=not args.browser_login, use_proxy=not args.no_proxy, use_lean_browser=args.lean_browser)
     token_fetcher.login_to_kepler()  # Perform login
     token_fetcher.start()  # Start the thread
     
@@ -134,7 +211,13 @@ if __name__ == "__main__":
         delta = (start_time - datetime.now() - timedelta(seconds=45)).total_seconds()
         if delta > 0:
             Logger.log(f"Ders seçimine 45 saniye kalana kadar bekleniyor ({delta} saniye)...")
-            sleep(delta)
+            WakeScheduler.sleep_until(start_time.timestamp() - 45, "T-45sn")
+
+    # Profile the critical window, from T-45 seconds till the end of the selection.
+    profiler = None
+    if args.profile:
+        profiler = Profiler(get_child_processes=DriverManager.get_all_processes, max_duration=45 + MAX_EXTRA_WAIT_TIME + SPAM_DUR)
+        profiler.start()
 
     # Wait untill the registration starts. (Add a buffer to prevent any possible errors.)
     if token_fetcher.driver:
@@ -149,44 +232,84 @@ if __name__ == "__main__":
         Logger.log("Ders seçimine kadar bekleniliyor, bu esnada Chrome penceresini kapatmayın...")
 
     # Pass token getter function to RequestManager (will get fresh token each time)
-    request_manager = RequestManager(token_fetcher.get_token, COURSE_SELECTION_URL, COURSE_TIME_CHECK_URL, backup_map)
+    request_manager = RequestManager(token_fetcher.get_token, COURSE_SELECTION_URL, COURSE_TIME_CHECK_URL, crn_slots, on_unauthorized=token_fetcher.request_refresh)
+    # The first CRN of every slot is sent first, the rest are swapped in by the request manager.
+    crn_list = list(request_manager.chains.heads)
+
+    trace_recorder = None
+    if args.record_trace:
+        trace_recorder = TraceRecorder(open_time=start_time.timestamp())
+        trace_recorder.attach(request_manager)
+
+    EventStream.emit("open", open_time=start_time.timestamp())
 
     # If not testing, wait untill the registration by checking the HTTP request.
+    speculative_opener = None
+    timed_out = False
     if not test_mode:
         # First, wait until 15 seconds remaining.
-        delta = (start_time - datetime.now() - timedelta(seconds=15)).total_seconds()
-        if delta > 0:
-            sleep(delta)
-
-        # Now, instead of waiting another 15 seconds, check the time every `DELAY_BETWEEN_TIME_CHECKS` seconds, to account for the difference in time between the server and the local machine.
-        Logger.log("Ders seçiminin başlaması bekleniyor...")
-        api_check_start_time = datetime.now()
-        while request_manager.check_course_selection_time() is False:
-            sleep(DELAY_BETWEEN_TIME_CHECKS)
-            if (datetime.now() - api_check_start_time).total_seconds() >= MAX_EXTRA_WAIT_TIME:
-                Logger.log(f"Ders seçimi zaman kontrolü maksimum bekleme süresine ({MAX_EXTRA_WAIT_TIME} saniye) ulaşıldı. Ders seçimi başlamamış gözükmesine rağmen seçmeye çalışılacak.")
-                break
+        WakeScheduler.sleep_until(start_time.timestamp() - 15, "T-15sn")
+        request_manager.warm_up()
+
+        # Estimate the difference between the server and the local clock, and send the first request when the server opens.
+        clock_sync = ClockSync(request_manager.probe_server_time)
+        if clock_sync.synchronize(deadline=start_time.timestamp() - CLOCK_SYNC_DEADLINE):
+            send_time = clock_sync.send_time_for(start_time.timestamp())
+            Logger.log(f"İlk ders seçim isteği sunucu saatine göre gönderilecek ({datetime.fromtimestamp(send_time)} yerel saat)...")
+            if args.speculative:
+                # Requests are sent from the predicted open on, the selection loop starts once the server answers one.
+                speculative_opener = SpeculativeOpener(request_manager, send_time, clock_sync.error, MAX_EXTRA_WAIT_TIME, probe_interval=DELAY_BETWEEN_TIME_CHECKS)
+                crn_list, scrn_list, timed_out = speculative_opener.run(crn_list, scrn_list)
+            else:
+                WakeScheduler.sleep_until(send_time, "açılış")
+        # If the server's clock could not be read, check the time every `DELAY_BETWEEN_TIME_CHECKS` seconds instead.
+        else:
+            if args.speculative:
+                Logger.log("Sunucu saati okunamadığı için açılış tahmin edilemiyor, spekülatif mod kapatıldı.")
+            Logger.log("Ders seçiminin başlaması bekleniyor...")
+            api_check_start_time = datetime.now()
+            while request_manager.check_course_selection_time() is False:
+                sleep(DELAY_BETWEEN_TIME_CHECKS)
+                if (datetime.now() - api_check_start_time).total_seconds() >= MAX_EXTRA_WAIT_TIME:
+                    Logger.log(f"Ders seçimi zaman kontrolü maksimum bekleme süresine ({MAX_EXTRA_WAIT_TIME} saniye) ulaşıldı. Ders seçimi başlamamış gözükmesine rağmen seçmeye çalışılacak.")
+                    break
     # If testing, wait for the time manually.
     else:
-        delta = (start_time - datetime.now()).total_seconds() + 0.1
-        if delta > 0:
-            sleep(delta)
+        WakeScheduler.sleep_until(start_time.timestamp() - WARM_UP_LEAD, "ısınma")
+        request_manager.warm_up()
+        WakeScheduler.sleep_until(start_time.timestamp() + 0.1, "açılış")
 
     Logger.log("Dersler Seçiliyor (Token arka planda sürekli yenileniyor)...")
     course_selection_start_time = datetime.now()
+    retry_scheduler = RetryScheduler.from_config(retry_config, DELAY_BETWEEN_TRIES, SPAM_DUR)
+    if speculative_opener is not None:
+        if timed_out:
+            wait_after_time_out(token_fetcher)
+        elif len(crn_list) == 0 and len(scrn_list) == 0:
+            Logger.log(f"Bütün dersler başarıyla alındı/bırakıldı.")
+        # The server already answered the speculative request, the next one waits as if it was sent by the loop.
+        elif speculative_opener.has_response:
+            delay = retry_scheduler.next_delay(request_manager.last_result_codes, 0)
+            if delay is not None:
+                sleep(delay)
+    has_work = not timed_out and (len(crn_list) > 0 or len(scrn_list) > 0)
+    if args.mode == "async" and has_work:
+        async_request_manager = AsyncRequestManager(request_manager, retry_scheduler=retry_scheduler)
+        crn_list, scrn_list, timed_out = asyncio.run(async_request_manager.run(crn_list, scrn_list, SPAM_DUR, max_attempts=1 if test_mode else None))
+
+        if timed_out:
+            wait_after_time_out(token_fetcher)
+        elif len(crn_list) == 0 and len(scrn_list) == 0:
+            Logger.log(f"Bütün dersler başarıyla alındı/bırakıldı.")
+        elif test_mode:
+            print_test_mode_message()
+
     # Select courses, do it until `DURATION_TO_SPAM` secs after the registration starts.
-    while start_time is None or (datetime.now() - course_selection_start_time).total_seconds() < SPAM_DUR:
+    while args.mode == "sync" and has_work and (start_time is None or (datetime.now() - course_selection_start_time).total_seconds() < SPAM_DUR):
         crn_list, scrn_list, timed_out = request_manager.request_course_selection(crn_list, scrn_list)
         
         if timed_out:
-            Logger.log("Ders seçim isteği zaman aşımına uğradı, program 1 saat boyunca bekleyecek.")
-            Logger.log("Programı sonlandırmak için \"Ctrl+C\" yapabilirsiniz.")
-            try:
-                sleep(TIMEOUT_WAIT_DUR)
-            except KeyboardInterrupt:
-                Logger.log("Program kullanıcı tarafından sonlandırıldı.")
-                token_fetcher.stop()
-                exit()
+            wait_after_time_out(token_fetcher)
             break
 
         if len(crn_list) == 0 and len(scrn_list) == 0:
@@ -197,13 +320,19 @@ if __name__ == "__main__":
             Logger.log("Alınamayan dersler tekrar deneniyor...")
             print()
         else:
-            print("\n" + "="*20 + " TEST MODU " + "="*20)
-            Logger.log("Alınamayan dersler tekrar denenecekti fakat test modunda olduğundan dolayı bu aşama atlanacak...")
-            Logger.log("Kepler ders seçim işlem geçmişi sayfasını kontrol edin. Hata olarak aktif bir ders seçim zamanı içinde değilsiniz mesajını görüyorsanız, test başarılı demektir.")
-            print("="*51 + "\n")
+            print_test_mode_message()
             break
 
-        sleep(DELAY_BETWEEN_TRIES)
+        delay = retry_scheduler.next_delay(request_manager.last_result_codes, (datetime.now() - course_selection_start_time).total_seconds())
+        if delay is None:
+            break
+        sleep(delay)
+
+    if profiler is not None:
+        profiler.stop()
+    if trace_recorder is not None:
+        trace_recorder.save()
+
     # Stop the token fetcher
     token_fetcher.stop()
 
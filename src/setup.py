@@ -1,11 +1,11 @@
-from requests import get
+from requests import RequestException
+from catalog import Catalog
+from validator import ScheduleValidator
+from crn_chain import CrnChains
 from datetime import datetime, timedelta
 from os import path, mkdir
 import json
 
-ITU_HELPER_LESSONS_URL = "https://raw.githubusercontent.com/itu-helper/data/main/lessons.psv"
-ITU_HELPER_COURSES_URL = "https://raw.githubusercontent.com/itu-helper/data/main/courses.psv"
-
 DATA_DIR = "data"
 CONFIG_FILE_NAME = "config.json"
 LINE_SPACES = 2
@@ -20,9 +20,9 @@ def eval_input(inp: str):
 
 def ask_for_crn_list(allow_backup_crns:bool) -> tuple[list[str], float, list[float]]:
     if allow_backup_crns:
-        print("   İPUCU: Yedek CRN girmek için \"CRN:YEDEK_CRN\" formatını kullanabilirsiniz.")
-        print("   Örnek: \"21345:21346\" → Asıl CRN: 21345, Yedek CRN: 21346")
-        print("   Yedek CRN, asıl CRN'nin kontenjanı dolduğunda otomatik olarak denenecektir.\n")
+        print("   İPUCU: Yedek CRN girmek için \"CRN:YEDEK_CRN\" formatını kullanabilirsiniz, birden fazla yedek sırayla eklenebilir.")
+        print("   Örnek: \"21345:21346:21347\" → Asıl CRN: 21345, 1. Yedek CRN: 21346, 2. Yedek CRN: 21347")
+        print("   Kontenjanı dolan CRN yerine sıradaki yedek denenecek, hepsi doluysa baştan tekrar denenecektir.\n")
     
     crn_list = []
     last_inp = []
@@ -33,101 +33,82 @@ def ask_for_crn_list(allow_backup_crns:bool) -> tuple[list[str], float, list[flo
         if last_inp == "":
             continue
 
-        # Check if backup CRN format is used
-        primary_crn = last_inp.split(":")[0] if ":" in last_inp else last_inp
-        backup_crn = last_inp.split(":")[1] if ":" in last_inp else None
-        
-        if not allow_backup_crns and backup_crn is not None:
-            last_inp = last_inp.split(":")[0]
-            backup_crn = None
-
-        no_match, backup_crn_no_match = False, False
-        course_credits, backup_course_credits = None, None
-        if primary_crn not in crn_to_lesson.keys():
-            no_match = True
-        elif backup_crn is not None and backup_crn not in crn_to_lesson.keys():
-            backup_crn_no_match = True
-        else:
-            try:
-                course_code = crn_to_lesson[primary_crn]
-                course_name, course_credits = lesson_to_course[course_code]
-
-                try:
-                    course_credits = float(course_credits)
-                except Exception:
-                    course_credits = None
-
-                print(f"Dersin ITU Helper veritabanında bulunan adı: {course_code} ({course_name}) [Kredi: {course_credits if course_credits is not None else '???'}].")
+        # Split the alternatives, the first one is the primary CRN.
+        crns = [crn for slot in CrnChains.parse([last_inp]) for crn in slot]
+        if not allow_backup_crns:
+            crns = crns[:1]
+        if not crns:
+            continue
+
+        missing_crns = []
+        credit_options = []
+        for i, crn in enumerate(crns):
+            lesson, course = catalog.get_lesson(crn), catalog.get_course_of_crn(crn)
+            if lesson is None:
+                missing_crns.append(crn)
+                continue
+
+            course_name = course.name if course is not None else "???"
+            course_credits = catalog.get_credits(crn)
+            if course_credits is not None:
+                credit_options.append(course_credits)
+
+            if i == 0:
+                print(f"Dersin ITU Helper veritabanında bulunan adı: {lesson.course_code} ({course_name}) [Kredi: {course_credits if course_credits is not None else '???'}].")
                 if course_credits is not None:
                     total_creds += course_credits
-                
-            except Exception as e:
-                no_match = True
-            
-            if backup_crn:
-                try:
-                    backup_course_code = crn_to_lesson[backup_crn]
-                    backup_course_name, backup_course_credits = lesson_to_course[backup_course_code]
-                    
-                    try:
-                        backup_course_credits = float(backup_course_credits)
-                    except Exception:
-                        backup_course_credits = None
-                    
-                    print(f"  ↳ Yedek CRN: {backup_crn}.")
-                    print(f"  ↳ Yedek dersin ITU Helper veritabanında bulunan adı: {backup_course_code} ({backup_course_name}) [Kredi: {backup_course_credits if backup_course_credits is not None else '???'}].")
-                except Exception as e:
-                    backup_crn_no_match = True
-
-        if course_credits is not None:
-            if backup_course_credits is not None:
-                total_creds_range[0] += min(course_credits, backup_course_credits)
-                total_creds_range[1] += max(course_credits, backup_course_credits)
             else:
-                total_creds_range[0] += course_credits
-                total_creds_range[1] += course_credits
-
-        if no_match or backup_crn_no_match:
-            error_message = ""
-            if no_match and backup_crn_no_match:
-                error_message = f"Girilen CRN'ler ({primary_crn} ve {backup_crn}) ITU Helper veritabanında bulunamadı."
-            elif no_match:
-                error_message = f"Girilen CRN ({primary_crn}) ITU Helper veritabanında bulunamadı."
+                print(f"  ↳ {i}. Yedek CRN: {crn}.")
+                print(f"  ↳ Yedek dersin ITU Helper veritabanında bulunan adı: {lesson.course_code} ({course_name}) [Kredi: {course_credits if course_credits is not None else '???'}].")
+
+        if credit_options:
+            total_creds_range[0] += min(credit_options)
+            total_creds_range[1] += max(credit_options)
+
+        if missing_crns:
+            if len(missing_crns) > 1:
+                error_message = f"Girilen CRN'ler ({', '.join(missing_crns)}) ITU Helper veritabanında bulunamadı."
+            elif missing_crns[0] == crns[0]:
+                error_message = f"Girilen CRN ({missing_crns[0]}) ITU Helper veritabanında bulunamadı."
             else:
-                error_message = f"Girilen yedek CRN ({backup_crn}) ITU Helper veritabanında bulunamadı."
+                error_message = f"Girilen yedek CRN ({missing_crns[0]}) ITU Helper veritabanında bulunamadı."
 
             ans = input(f"{error_message} Yinede eklemek istiyor musunuz? [e/h]\n\tℹ️ Sorun İTÜ Helper sisteminde olabilir.").lower()
             if ans != "e":
                 continue
         
-        crn_list.append(last_inp)
+        crn_list.append(":".join(crns))
 
     return crn_list, total_creds, total_creds_range
 
+def get_course_code(crn: str) -> str:
+    lesson = catalog.get_lesson(crn)
+    return lesson.course_code if lesson is not None else '???'
+
 def get_formatted_crn_list(crn_list: list[str]) -> list[str]:
     formatted = []
     for crn_entry in crn_list:
-        if ":" in crn_entry:
-            primary, backup = crn_entry.split(":", 1)
-            lesson_name = crn_to_lesson.get(primary, '???')
-            backup_name = crn_to_lesson.get(backup, '???')
-            formatted.append(f"{primary} ({lesson_name}) [Yedek: {backup} ({backup_name})]")
-        else:
-            lesson_name = crn_to_lesson.get(crn_entry, '???')
-            formatted.append(f"{crn_entry} ({lesson_name})")
+        primary, *alternatives = crn_entry.split(":")
+        text = f"{primary} ({get_course_code(primary)})"
+        if alternatives:
+            text += f" [Yedek: {', '.join(f'{crn} ({get_course_code(crn)})' for crn in alternatives)}]"
+        formatted.append(text)
     return formatted
 
 def crn_list_to_lines(crn_list: list[str]) -> list[str]:
     return [crn + ("\n" if i != len(crn_list) - 1 else "") for i, crn in enumerate(crn_list)]
 
 if __name__ == "__main__":
-    print("ITU Helper bağlantısı kuruluyor...")
-    # Read the course names from ITU Helper.
-    lesson_lines = get(ITU_HELPER_LESSONS_URL).text.split("\n")
-    crn_to_lesson = {lesson.split("|")[0] : lesson.split("|")[1] for lesson in lesson_lines if len(lesson.split("|")) > 1}
-    
-    course_lines = get(ITU_HELPER_COURSES_URL).text.split("\n")
-    lesson_to_course = {course.split("|")[0] : (course.split("|")[1], course.split("|")[3]) for course in course_lines if len(course.split("|")) > 1}
+    # Read the course names from the local copy of ITU Helper, only wait for the download on the first run.
+    catalog = Catalog()
+    if catalog.is_empty():
+        print("ITU Helper bağlantısı kuruluyor...")
+        try:
+            catalog.refresh()
+        except RequestException:
+            print("ITU Helper'a bağlanılamadı, ders bilgileri gösterilemeyecek.")
+    else:
+        catalog.refresh_in_background()
     
     # Print the startup message.
     print("\n"*100)
@@ -180,6 +161,15 @@ if __name__ == "__main__":
     print("Bırakılacak CRN'ler: ", get_formatted_crn_list(scrn_list))
     print("\n"*LINE_SPACES)
 
+    # Check the clashes and the limits over every backup combination.
+    validator = ScheduleValidator(catalog)
+    validation_messages = validator.describe(validator.validate(CrnChains.parse(crn_list)))
+    if validation_messages:
+        print("Kontrol sırasında bulunan sorunlar:")
+        for message in validation_messages:
+            print(f"   ⚠️ {message}")
+        print("\n"*LINE_SPACES)
+
     # Ask to save the data.
     eval_input(input("Eğer bir şeyler yanlış görünüyor ise \"q\" tuşuna basarak sihibazı sonlandırın, bilgileri kaydetmek için herhangi bir başka tuşa basın."))
 
@@ -0,0 +1,170 @@
+# === IMPORTS ===
+from time import time
+from request_manager import RequestManager
+from wake_scheduler import WakeScheduler
+from event_stream import EventStream
+from logger import Logger
+from typing import Callable
+import threading
+
+# === CONSTANTS ===
+# WARNING: Every early request counts towards the `VAL21` limit, keep this low.
+MAX_PRE_OPEN_ATTEMPTS = 3 # Selection requests allowed to be answered with "not open yet" before waiting for a time check.
+MIN_ATTEMPT_GAP = .25 # Minimum seconds between two selection requests before the open.
+PROBE_INTERVAL = .1 # Seconds between two time checks sent alongside the selection requests.
+NOT_OPEN_CODES = {"VAL02", "NULLParam-CheckOgrenciKayitZamaniKontrolu"}
+
+# === CLASS DEFINITON ===
+class OpenProbe:
+    """
+    Sends time checks on a background thread until the server says the course selection is open.
+
+    Every listener is called with the send time and the answer of each time check, so that one probe can serve several
+    waiters (e.g. every account of a batch) instead of each of them sending its own time checks.
+    """
+    def __init__(self, request_manager: RequestManager, interval: float = PROBE_INTERVAL) -> None:
+        self.request_manager = request_manager
+        self.interval = interval
+        self.opened = threading.Event()
+        self._listeners: list[Callable[[float, bool], None]] = []
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def add_listener(self, listener: Callable[[float, bool], None]) -> None:
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[float, bool], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="OpenProbe", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self.opened.wait(timeout)
+
+    def _loop(self) -> None:
+        while not self._stop_event.is_set():
+            t_send = time()
+            is_open = self.request_manager.check_course_selection_time()
+            if is_open:
+                self.opened.set()
+            for listener in list(self._listeners):
+                listener(t_send, is_open)
+            if is_open:
+                return
+            self._stop_event.wait(self.interval)
+
+class SpeculativeOpener:
+    """
+    Sends the first selection request at the predicted open instead of waiting for a time check to confirm it.
+
+    The open is known to lie in `[predicted_open - error, predicted_open + error]` (local send times). A request that is
+    answered with `VAL02` proves the server wasn't open when it was sent, so the lower bound moves up to its send time
+    and the next request is sent at the middle of the remaining interval. Time checks run on a background thread in
+    the meantime: a closed one also moves the lower bound, an open one fires the next request right away. After
+    `max_attempts` early answers only an open time check can trigger a request.
+    """
+    def __init__(self, request_manager: RequestManager, predicted_open: float, error: float, max_wait: float,
+                 max_attempts: int = MAX_PRE_OPEN_ATTEMPTS, probe_interval: float = PROBE_INTERVAL, open_probe: OpenProbe | None = None) -> None:
+        """
+        Args:
+            predicted_open: Local epoch time a request should be sent at to reach the server right at the open.
+            error: Half width of the interval the open is known to be in, in seconds.
+            max_wait: Seconds after `predicted_open` to wait for the open before handing over to the selection loop.
+            open_probe: A probe shared with other waiters, a probe of its own is started if not given.
+        """
+        self.request_manager = request_manager
+        self.predicted_open = predicted_open
+        self.lower = predicted_open - error
+        self.upper = predicted_open + error
+        self.max_wait = max_wait
+        self.max_attempts = max_attempts
+        self.probe_interval = probe_interval
+        self.early_attempts = 0
+        self.has_response = False # Whether a request was answered by the open server.
+        self._owns_probe = open_probe is None
+        self._probe = open_probe if open_probe is not None else OpenProbe(request_manager, probe_interval)
+        self._open_event = self._probe.opened
+        self._lock = threading.Lock()
+
+    def _move_lower_bound(self, t_send: float) -> None:
+        """The server was closed when a request sent at `t_send` arrived, the open is later than that."""
+        with self._lock:
+            if t_send <= self.lower:
+                return
+            width = max(self.upper - self.lower, MIN_ATTEMPT_GAP)
+            self.lower = t_send
+            # The open is later than the whole interval, continue with another one of the same width.
+            if self.lower >= self.upper:
+                self.upper = self.lower + width
+
+    def _on_time_check(self, t_send: float, is_open: bool) -> None:
+        if is_open:
+            EventStream.emit("speculative", kind="time_check", sent=t_send, is_open=True)
+        else:
+            self._move_lower_bound(t_send)
+
+    def _next_attempt_time(self, last_send: float | None) -> float:
+        with self._lock:
+            target = (self.lower + self.upper) / 2
+        return target if last_send is None else max(target, last_send + MIN_ATTEMPT_GAP)
+
+    def _wait_for_attempt(self, last_send: float | None) -> bool:
+        """Waits until the next request should be sent, returns `False` if the open wasn't confirmed within `max_wait`."""
+        if self.early_attempts >= self.max_attempts:
+            remaining = self.predicted_open + self.max_wait - time()
+            return self._open_event.wait(max(0, remaining))
+
+        # The target may move while waiting, a closed time check pushes it back and an open one makes it now.
+        while not self._open_event.is_set():
+            target = self._next_attempt_time(last_send)
+            if target - time() <= self.probe_interval:
+                WakeScheduler.sleep_until(target, "tahmini açılış")
+                return True
+            self._open_event.wait(target - time() - self.probe_interval)
+        return True
+
+    def run(self, crn_list: list[str], scrn_list: list[str]) -> tuple[list[str], list[str], bool]:
+        """Sends selection requests until the open server answers one, returns the same values as `RequestManager.request_course_selection`."""
+        self._probe.add_listener(self._on_time_check)
+        self._probe.start()
+        last_send = None
+        timed_out = False
+        try:
+            while crn_list or scrn_list:
+                if not self._wait_for_attempt(last_send):
+                    Logger.log(f"Ders seçiminin açıldığı {self.max_wait} saniye içinde doğrulanamadı, seçim döngüsüne geçiliyor.")
+                    break
+
+                is_confirmed = self._open_event.is_set()
+                last_send = time()
+                crn_list, scrn_list, timed_out = self.request_manager.request_course_selection(crn_list, scrn_list)
+                codes = self.request_manager.last_result_codes
+                is_early = bool(codes) and set(codes) <= NOT_OPEN_CODES
+                EventStream.emit("speculative", kind="selection", sent=last_send, early_ms=(self.predicted_open - last_send) * 1000,
+                                 is_open=not is_early, confirmed=is_confirmed)
+                if timed_out or not is_early:
+                    self.has_response = not timed_out and codes != ["error"]
+                    break
+
+                self.early_attempts += 1
+                self._move_lower_bound(last_send)
+                if self.early_attempts < self.max_attempts:
+                    Logger.log(f"Ders seçimi henüz açılmamış ({self.early_attempts}/{self.max_attempts}), bir sonraki istek "
+                               f"{(self._next_attempt_time(last_send) - time()) * 1000:.0f} ms sonra.", silent=True)
+                else:
+                    Logger.log(f"Ders seçimi henüz açılmamış, açılmadan önce gönderilebilecek {self.max_attempts} istek kullanıldı. Zaman kontrolü bekleniyor...")
+                # The time check said open but the selection didn't, the selection loop takes it from here.
+                if is_confirmed:
+                    break
+        finally:
+            self._probe.remove_listener(self._on_time_check)
+            if self._owns_probe:
+                self._probe.stop()
+        return crn_list, scrn_list, timed_out
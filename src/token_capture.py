@@ -0,0 +1,92 @@
+# === IMPORTS ===
+from time import sleep, monotonic
+from logger import Logger
+import threading
+import json
+import re
+
+# === CONSTANTS ===
+LOG_POLL_INTERVAL = .05 # Seconds between two reads of the performance log when the proxy is not used.
+
+# === CLASS DEFINITON ===
+class TokenCapture:
+    """
+    Captures the `Authorization` header of the requests the page sends to `token_url`, and nothing else.
+
+    With selenium-wire the proxy is scoped to `token_url` and a request interceptor wakes the waiting thread
+    as soon as the request is seen. Without the proxy, Chrome's DevTools network events are read from the
+    performance log, which is emptied on every read, so nothing is retained in either case.
+    """
+    def __init__(self, driver, token_url: str, uses_proxy: bool) -> None:
+        self.driver = driver
+        self.token_url = token_url
+        self.uses_proxy = uses_proxy
+        self._token = ""
+        self._captured = threading.Event()
+        self._request_ids = set()
+
+        if uses_proxy:
+            driver.scopes = [re.escape(token_url) + ".*"]
+            driver.request_interceptor = self._on_request
+
+    def _on_request(self, request) -> None:
+        """Called by selenium-wire on its proxy thread for the requests in scope."""
+        token = request.headers.get("authorization")
+        if token and self.token_url in request.url:
+            self._token = token
+            self._captured.set()
+
+    def _read_performance_log(self) -> None:
+        for entry in self.driver.get_log("performance"):
+            message = json.loads(entry["message"])["message"]
+            params = message.get("params", {})
+
+            # Headers set by the page are in `requestWillBeSent`, the full set arrives later in `requestWillBeSentExtraInfo`.
+            if message["method"] == "Network.requestWillBeSent":
+                if self.token_url not in params["request"]["url"]:
+                    continue
+                self._request_ids.add(params["requestId"])
+                headers = params["request"]["headers"]
+            elif message["method"] == "Network.requestWillBeSentExtraInfo" and params.get("requestId") in self._request_ids:
+                headers = params["headers"]
+            else:
+                continue
+
+            token = next((value for name, value in headers.items() if name.lower() == "authorization"), None)
+            if token:
+                self._token = token
+                self._captured.set()
+
+    def arm(self) -> None:
+        """Forgets the last captured token, call it right before triggering the page to send a new request."""
+        self._token = ""
+        self._captured.clear()
+        self._request_ids.clear()
+        if self.uses_proxy:
+            del self.driver.requests
+        else:
+            # Drop the events that were logged before the trigger.
+            self.driver.get_log("performance")
+
+    def poll(self) -> bool:
+        """Returns whether the token request was seen, without blocking."""
+        if not self.uses_proxy and not self._captured.is_set():
+            self._read_performance_log()
+        return self._captured.is_set()
+
+    def wait(self, timeout: float) -> str:
+        """Waits until a request to `token_url` is seen and returns its token, or an empty string on timeout."""
+        if self.uses_proxy:
+            self._captured.wait(timeout)
+            # Only in-scope requests are stored, drop them too.
+            del self.driver.requests
+        else:
+            deadline = monotonic() + timeout
+            while not self._captured.is_set() and monotonic() < deadline:
+                self._read_performance_log()
+                if not self._captured.is_set():
+                    sleep(LOG_POLL_INTERVAL)
+
+        if not self._captured.is_set() and timeout > 0:
+            Logger.log(f"{timeout} saniye içinde token isteği yakalanamadı.", silent=True)
+        return self._token
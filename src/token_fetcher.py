@@ -1,50 +1,154 @@
 # === IMPORTS ===
-from driver_manager import DriverManager
-from selenium.webdriver.common.by import By
-from time import sleep
+from driver_manager import DriverManager, BrowserPool
+from http_login import HttpLogin, TOKEN_PATH
+from token_capture import TokenCapture
+from urllib.parse import urljoin
 from logger import Logger
+from event_stream import EventStream
+from time import monotonic, perf_counter, time
 import threading
+import requests
+import base64
+import json
 
 # === CONSTANTS ===
-PAGE_LOAD_DELAY = 3
-TOKEN_URL = "https://obs.itu.edu.tr/api/ogrenci/Takvim/KayitZamaniKontrolu"
-TOKEN_REFRESH_INTERVAL = 60  # Token refresh interval (seconds)
+PAGE_LOAD_TIMEOUT = 20 # Deadline of each wait for a page to reach the expected state (seconds)
+CONDITION_POLL_INTERVAL = .05 # Seconds between two checks of a wait condition.
+LOGIN_URL_MARKER = "girisv3" # Part of the URL of the login pages.
+TOKEN_REFRESH_INTERVAL = 60  # Token refresh interval when the expiry of the token is unknown (seconds)
+TOKEN_REFRESH_MARGIN = 120 # A new token is fetched once the current one has less than this many seconds left.
+LIVENESS_CHECK_INTERVAL = 15 # Seconds between two cheap authenticated checks of the current token.
+TOKEN_CAPTURE_TIMEOUT = 10 # Seconds to wait for the page to send the token request after a refresh.
+REFRESH_RETRY_DELAY = 1 # Seconds before fetching again when a refresh brought no new token, doubled after every such refresh.
+FAILOVER_COOLDOWN = 2 # Seconds after a failover in which 401 answers are blamed on the requests sent before it.
+STANDBY_POLL_INTERVAL = .1 # Seconds between two checks while waiting for the first token of either session.
+
+def read_token_expiry(token: str) -> float | None:
+    """Reads the `exp` claim of a JWT bearer token, returns `None` if it can't be read."""
+    try:
+        payload = token.removeprefix("Bearer ").split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
 
 # === CLASS DEFINITON ===
 class ContinuousTokenFetcher(threading.Thread):
     """
     Thread class that continuously fetches tokens in the background.
     Provides thread-safe token access.
+
+    The token is refreshed when it gets close to its expiry or when a liveness check or a request reports it as rejected.
+    New tokens are written to the standby buffer and then swapped in, so `get_token` never needs a lock.
     """
-    def __init__(self, url: str, login: str, password: str, use_headless_browser: bool=False) -> None:
+    def __init__(self, url: str, login: str, password: str, use_headless_browser: bool=False, use_http_login: bool=True, use_proxy: bool=True, use_lean_browser: bool=False, browser_pool: BrowserPool | None=None,
+                 profile_name: str | None=None, on_session_lost=None) -> None:
+        """
+        Args:
+            profile_name: Name of the browser profile of the lean browser, the login by default. Two fetchers of the same account need different ones.
+            on_session_lost: Called with the fetcher and the reason as soon as the session is found to be logged out.
+        """
         super().__init__(daemon=True)
         self.url = url
         self.creds = [login, password]
+        self.profile_name = profile_name or login
+        self.on_session_lost = on_session_lost
+        self.is_session_alive = False
+        self.session_lost_at = None # `perf_counter` time the session was found to be logged out, `None` while it is alive.
         self.driver = None
-        self._token = ""
+        self.token_capture = None
+        self.use_proxy = use_proxy
+        self.use_lean_browser = use_lean_browser
+        # Shared by the accounts of a batch run, the driver is only borrowed while logging in.
+        self.browser_pool = browser_pool
+        self.token_url = urljoin(url, TOKEN_PATH)
+        self._buffers = [("", 0.0, None), ("", 0.0, None)] # (token, fetch time, expiry time) pairs, only the standby one is written.
+        self._active = 0
         self._token_lock = threading.Lock()
         self._running = False
         self._started_event = threading.Event()
+        self._refresh_event = threading.Event()
+        self._refresh_requested = False
+        self._last_refresh_attempt = 0.0
+        self._refresh_backoff = 0.0 # Seconds to wait after `_last_refresh_attempt`, grows while the server keeps the same token.
+        self._last_liveness_check = monotonic()
+        self._liveness_session = requests.Session()
         self.use_headless_browser = use_headless_browser
+        # Browserless login, set to `None` once it fails so that the browser is used from then on.
+        self.http_login = HttpLogin(url, login, password) if use_http_login else None
     
     def login_to_kepler(self) -> None:
+        """Performs login, over plain HTTP if possible and with the browser otherwise."""
+        if self.http_login is not None:
+            token = self.http_login.login()
+            if token:
+                self._update_token(token)
+                return
+            Logger.log("HTTP üzerinden token alınamadı, tarayıcı ile giriş yapılacak...")
+            self.http_login = None
+
+        if self.browser_pool is not None:
+            self._login_with_pooled_browser()
+        else:
+            self._login_with_browser()
+
+    def _login_with_pooled_browser(self) -> None:
+        """Logs in with a driver borrowed from the pool and gives it back once the token is captured."""
+        with self.browser_pool.borrow() as driver:
+            self.driver = driver
+            self.token_capture = TokenCapture(driver, self.token_url, self.browser_pool.use_proxy)
+            try:
+                self._login_with_browser()
+            finally:
+                self.driver, self.token_capture = None, None
+
+    def _wait_for(self, name: str, condition, timeout: float = PAGE_LOAD_TIMEOUT) -> bool:
+        """Waits until `condition(driver)` is truthy, reports how long it took and returns whether it happened before the deadline."""
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.common.exceptions import TimeoutException
+
+        start = perf_counter()
+        try:
+            WebDriverWait(self.driver, timeout, poll_frequency=CONDITION_POLL_INTERVAL).until(condition)
+            is_met = True
+        except TimeoutException:
+            is_met = False
+
+        duration = (perf_counter() - start) * 1000
+        EventStream.emit("browser_wait", name=name, duration_ms=duration, met=is_met)
+        Logger.log(f"Tarayıcı bekleme \"{name}\": {duration:.0f} ms{'' if is_met else ' (zaman aşımı)'}.", silent=True)
+        return is_met
+
+    def _is_on_login_page(self, driver=None) -> bool:
+        return LOGIN_URL_MARKER in (driver or self.driver).current_url
+
+    def _login_with_browser(self) -> None:
         """Starts the driver and performs login."""
+        # Selenium is only loaded when the browser is actually used, the HTTP login and `--token` runs start without it.
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+
         is_repeat = self._started_event.is_set()
 
         Logger.log("Kepler açılıyor...", silent=is_repeat)
         if self.driver is None:
-            self.driver = DriverManager.create_driver(headless=self.use_headless_browser)
+            self.driver = DriverManager.create_driver(headless=self.use_headless_browser, use_proxy=self.use_proxy,
+                                                      lean=self.use_lean_browser, profile_name=self.profile_name if self.use_lean_browser else None)
+            self.token_capture = TokenCapture(self.driver, self.token_url, self.use_proxy)
         
+        self.token_capture.arm()
         self.driver.get(self.url)
 
-        # Wait to see if the URL changes to the login page
-        sleep(PAGE_LOAD_DELAY)
-        if "girisv3.itu.edu.tr" not in self.driver.current_url: 
+        # Either we get redirected to the login page, or the page is already logged in and sends the token request.
+        self._wait_for("giriş sayfası veya token", lambda driver: self._is_on_login_page(driver) or self.token_capture.poll())
+        if not self._is_on_login_page():
             Logger.log("Kepler'e giriş yapılmış, giriş yapma aşaması atlanıyor...", silent=is_repeat)
+            self._update_token(self.token_capture.wait(TOKEN_CAPTURE_TIMEOUT))
             return
         
         # Login to the system
         Logger.log("Kepler'e giriş yapılıyor...", silent=is_repeat)
+        self._wait_for("giriş formu", EC.presence_of_element_located((By.CSS_SELECTOR, "input[type=password]")))
         input_elements = self.driver.find_elements(By.TAG_NAME, "input")
         index = 0
 
@@ -58,11 +162,13 @@ class ContinuousTokenFetcher(threading.Thread):
             if index <= 1:
                 element.send_keys(self.creds[index])
             index += 1
-            sleep(.1)
+
+        # The form is submitted by the last click, wait until it takes us away from the login form.
+        self._wait_for("giriş sonrası yönlendirme", lambda driver: "SelectIdentity" in driver.current_url or not self._is_on_login_page(driver))
         
         if "SelectIdentity" in self.driver.current_url:
-            sleep(.1)
             Logger.log("Yatay geçiş hesabı algılandı, aktif İTÜ hesabı seçilecek.", silent=is_repeat)
+            self._wait_for("hesap seçim kartları", EC.presence_of_element_located((By.CLASS_NAME, "card-body")))
             identity_cards = self.driver.find_elements(By.CLASS_NAME, "card-body")
             for identity_card in identity_cards:
                 rows = identity_card.find_elements(By.TAG_NAME, "tr")
@@ -79,38 +185,51 @@ class ContinuousTokenFetcher(threading.Thread):
 
                     select_button = identity_card.find_element(By.TAG_NAME, "a")
                     select_button.click()
-                    sleep(.1)
+                    self._wait_for("hesap seçimi", lambda driver: "SelectIdentity" not in driver.current_url)
                     break
         
         Logger.log("Kepler'e giriş yapıldı, ders seçim sitesine yönlendiriliyor...")
+        self.token_capture.arm()
         self.driver.get(self.url)
-        sleep(PAGE_LOAD_DELAY)
+        if self._wait_for("token isteği", lambda driver: self.token_capture.poll(), TOKEN_CAPTURE_TIMEOUT):
+            self._update_token(self.token_capture.wait(0))
     
     def _fetch_token_once(self) -> str:
         """Single token fetch operation. Re-login if logged out after refresh."""
+        if self.http_login is not None:
+            token = self.http_login.fetch_token()
+            if token:
+                return token
+
+            Logger.log("Kepler hesabından çıkıldığı algılandı, tekrar giriş yapılıyor...")
+            self.mark_session_lost("logout")
+            self.login_to_kepler()
+            # The browser login already stored the token of the page it landed on.
+            return self.http_login.fetch_token() if self.http_login is not None else ""
+
+        # The pooled drivers don't keep the session of this account, log in again.
+        if self.browser_pool is not None:
+            self._login_with_pooled_browser()
+            return ""
+
         # if the url is not the target url, open the target url
+        self.token_capture.arm()
         if self.url not in self.driver.current_url:
             Logger.log("Ders seçim sitesi açılıyor...", silent=self._started_event.is_set())
             self.driver.get(self.url)
-            sleep(PAGE_LOAD_DELAY)
-
-        self.driver.refresh()
-        sleep(1)
+        else:
+            self.driver.refresh()
+        self._wait_for("token isteği", lambda driver: self._is_on_login_page(driver) or self.token_capture.poll(), TOKEN_CAPTURE_TIMEOUT)
 
         # Check if we got logged out after refresh (login page detected)
-        if "girisv3.itu.edu.tr" in self.driver.current_url:
+        if self._is_on_login_page():
             Logger.log("Kepler hesabından çıkıldığı algılandı, tekrar giriş yapılıyor...")
+            self.mark_session_lost("logout")
+            # Logging in again already captures the token of the page it lands on.
             self.login_to_kepler()
-            # After re-login, refresh again to ensure requests are captured
-            self.driver.refresh()
-            sleep(1)
+            return ""
 
-        for request in self.driver.requests:
-            # if There is a response and the request is from the token url
-            if request.response and TOKEN_URL in request.url:
-                token = request.headers["authorization"]
-                return token
-        return ""
+        return self.token_capture.wait(0)
     
     def run(self) -> None:
         """Thread main loop - continuously fetches tokens."""
@@ -119,26 +238,115 @@ class ContinuousTokenFetcher(threading.Thread):
         
         while self._running:
             try:
-                Logger.log("Yeni API Token aranıyor.", silent=True)
-                new_token = self._fetch_token_once()
-                if new_token and "ERROR" not in new_token and new_token != self._token:
-                    with self._token_lock:
-                        self._token = new_token
-                    Logger.log("API Token güncellendi.")
-                    
-                    # Set event when first successful token is received
-                    if not self._started_event.is_set():
-                        self._started_event.set()
-                        Logger.log("İlk token başarıyla alındı.")
+                if self._needs_refresh():
+                    self._refresh_requested = False
+                    Logger.log("Yeni API Token aranıyor.", silent=True)
+                    start = perf_counter()
+                    new_token = self._fetch_token_once()
+                    is_changed = self._update_token(new_token)
+                    self._last_refresh_attempt = monotonic()
+                    self._refresh_backoff = 0.0 if is_changed else min(LIVENESS_CHECK_INTERVAL, max(REFRESH_RETRY_DELAY, self._refresh_backoff * 2))
+                    EventStream.emit("token_fetch", duration_ms=(perf_counter() - start) * 1000, changed=is_changed)
+                elif monotonic() - self._last_liveness_check >= LIVENESS_CHECK_INTERVAL:
+                    self._check_liveness()
             except Exception as e:
                 Logger.log(f"Token fetch hatası: {e}", silent=True)
-            
-            sleep(TOKEN_REFRESH_INTERVAL)
-    
+
+            self._refresh_event.wait(self._time_until_next_action())
+            self._refresh_event.clear()
+
+    def _needs_refresh(self) -> bool:
+        token, fetched_at, expires_at = self._buffers[self._active]
+        if not token or self._refresh_requested:
+            return True
+        # Close to its expiry the server may keep answering with the same token, don't ask again right away.
+        if monotonic() < self._last_refresh_attempt + self._refresh_backoff:
+            return False
+        if expires_at is None:
+            return time() - fetched_at >= TOKEN_REFRESH_INTERVAL
+        return expires_at - time() <= TOKEN_REFRESH_MARGIN
+
+    def _time_until_next_action(self) -> float:
+        token, fetched_at, expires_at = self._buffers[self._active]
+        if not token:
+            return TOKEN_REFRESH_INTERVAL
+        refresh_at = fetched_at + TOKEN_REFRESH_INTERVAL if expires_at is None else expires_at - TOKEN_REFRESH_MARGIN
+        refresh_in = max(refresh_at - time(), self._last_refresh_attempt + self._refresh_backoff - monotonic())
+        check_in = self._last_liveness_check + LIVENESS_CHECK_INTERVAL - monotonic()
+        return max(.1, min(refresh_in, check_in))
+
+    def _check_liveness(self) -> None:
+        """Checks the current token with a cheap authenticated request instead of a page refresh."""
+        self._last_liveness_check = monotonic()
+        try:
+            response = self._liveness_session.get(self.token_url, headers={"Authorization": self.get_token()}, timeout=10)
+        except requests.RequestException as e:
+            Logger.log(f"Token kontrolü yapılamadı: {e}", silent=True)
+            return
+
+        is_alive = response.status_code not in (401, 403)
+        EventStream.emit("token_check", alive=is_alive, age=self.token_age(), ttl=self.token_ttl())
+        if not is_alive:
+            Logger.log("API Token sunucu tarafından reddedildi, yenileniyor...", silent=True)
+            self._refresh_requested = True
+            self.mark_session_lost("liveness")
+        else:
+            self._mark_session_alive()
+
+    def _mark_session_alive(self) -> None:
+        self.is_session_alive = True
+        if self.session_lost_at is not None:
+            EventStream.emit("session_recovered", profile=self.profile_name, duration_ms=(perf_counter() - self.session_lost_at) * 1000)
+            self.session_lost_at = None
+
+    def mark_session_lost(self, reason: str) -> None:
+        """Records that the session is logged out, the token source stops handing out this fetcher's token until a new one is stored."""
+        if not self.is_session_alive:
+            return
+        self.is_session_alive = False
+        self.session_lost_at = perf_counter()
+        if self.on_session_lost is not None:
+            self.on_session_lost(self, reason)
+
+    def request_refresh(self) -> None:
+        """Makes the fetcher get a new token right away, e.g. after a request was answered with 401."""
+        self._refresh_requested = True
+        self._refresh_event.set()
+
+    def _update_token(self, new_token: str) -> bool:
+        """Stores the token if it is a new valid one, returns whether it was stored."""
+        if not new_token or "ERROR" in new_token or new_token == self.get_token():
+            return False
+
+        # Fill the standby buffer first and swap it in, readers always see a complete entry.
+        with self._token_lock:
+            standby = 1 - self._active
+            self._buffers[standby] = (new_token, time(), read_token_expiry(new_token))
+            self._active = standby
+        self._last_liveness_check = monotonic()
+        EventStream.emit("token_refresh", ttl=self.token_ttl())
+        Logger.log("API Token güncellendi.")
+        self._mark_session_alive()
+
+        # Set event when first successful token is received
+        if not self._started_event.is_set():
+            self._started_event.set()
+            Logger.log("İlk token başarıyla alındı.")
+        return True
+
     def get_token(self) -> str:
         """Thread-safe token access."""
-        with self._token_lock:
-            return self._token
+        return self._buffers[self._active][0]
+
+    def token_age(self) -> float | None:
+        """Seconds since the current token was fetched."""
+        token, fetched_at, _ = self._buffers[self._active]
+        return time() - fetched_at if token else None
+
+    def token_ttl(self) -> float | None:
+        """Seconds left until the current token expires, `None` if it is unknown."""
+        _, _, expires_at = self._buffers[self._active]
+        return expires_at - time() if expires_at is not None else None
     
     def wait_for_first_token(self, timeout: float = 60) -> bool:
         """Waits until the first token is received."""
@@ -147,6 +355,7 @@ class ContinuousTokenFetcher(threading.Thread):
     def stop(self) -> None:
         """Stops the token fetcher."""
         self._running = False
+        self._refresh_event.set()
         Logger.log("Token fetcher thread durduruluyor...")
         if self.driver:
             try:
@@ -156,5 +365,138 @@ class ContinuousTokenFetcher(threading.Thread):
     
     def has_token(self) -> bool:
         """Checks if a token exists."""
-        with self._token_lock:
-            return len(self._token) > 0
+        return len(self.get_token()) > 0
+
+class StandbyTokenProvider:
+    """
+    Token source backed by two independently logged in sessions of the same account, with the interface of `ContinuousTokenFetcher`.
+
+    Both fetchers keep their own token fresh and check it in the background. `get_token` hands out the token of the
+    active one; once its session is found to be logged out the other one becomes active, which only swaps a reference,
+    while the logged out fetcher logs in again on its own thread and becomes the standby once it has a new token.
+    """
+    def __init__(self, primary: ContinuousTokenFetcher, standby: ContinuousTokenFetcher) -> None:
+        self.fetchers = [primary, standby]
+        self._active = primary
+        self._lock = threading.Lock()
+        self._last_failover = None
+        self._is_waiting_for_login = False # Both sessions are logged out, logged once until one of them is back.
+        for fetcher in self.fetchers:
+            fetcher.on_session_lost = self._on_session_lost
+
+    @property
+    def driver(self):
+        return self.fetchers[0].driver
+
+    def login_to_kepler(self) -> None:
+        """Logs in the primary session, the standby session logs in on its own thread so that it doesn't delay the start."""
+        self.fetchers[0].login_to_kepler()
+
+        def login_standby() -> None:
+            try:
+                self.fetchers[1].login_to_kepler()
+            except Exception as e:
+                Logger.log(f"Yedek oturum açılamadı, token fetcher tekrar deneyecek: {e}", silent=True)
+            self.fetchers[1].start()
+        threading.Thread(target=login_standby, name="StandbyLogin", daemon=True).start()
+
+    def start(self) -> None:
+        self.fetchers[0].start()
+
+    def _other(self, fetcher: ContinuousTokenFetcher) -> ContinuousTokenFetcher:
+        return self.fetchers[1] if fetcher is self.fetchers[0] else self.fetchers[0]
+
+    def _fail_over(self, reason: str) -> None:
+        with self._lock:
+            failed = self._active
+            # Another thread may have switched already, or the session came back in the meantime.
+            if failed.is_session_alive:
+                return
+            standby = self._other(failed)
+            if not standby.is_session_alive:
+                if not self._is_waiting_for_login:
+                    self._is_waiting_for_login = True
+                    Logger.log("Oturum kapandı ve hazır bir yedek oturum yok, yeni giriş bekleniyor...", silent=True)
+                return
+            self._active = standby
+            self._last_failover = monotonic()
+            self._is_waiting_for_login = False
+
+        lost_at = failed.session_lost_at
+        latency_ms = (perf_counter() - lost_at) * 1000 if lost_at is not None else None
+        EventStream.emit("token_failover", reason=reason, latency_ms=latency_ms, standby_age=standby.token_age())
+        Logger.log(f"Oturum kapandı ({reason}), yedek oturuma geçildi. Kapanan oturumda tekrar giriş yapılıyor...")
+
+    def _on_session_lost(self, fetcher: ContinuousTokenFetcher, reason: str) -> None:
+        if fetcher is self._active:
+            self._fail_over(reason)
+
+    def get_token(self) -> str:
+        active = self._active
+        if not active.is_session_alive and active.has_token():
+            self._fail_over("stale")
+            active = self._active
+        elif self._is_waiting_for_login and active.is_session_alive:
+            with self._lock:
+                if self._is_waiting_for_login:
+                    self._is_waiting_for_login = False
+                    Logger.log("Oturum tekrar açıldı, ders seçimine devam ediliyor.", silent=True)
+        return active.get_token()
+
+    def wait_for_first_token(self, timeout: float = 60) -> bool:
+        """Waits until either session has a token, the first one to get it becomes active."""
+        deadline = monotonic() + timeout
+        while True:
+            for fetcher in self.fetchers:
+                if fetcher.has_token():
+                    with self._lock:
+                        if not self._active.has_token():
+                            self._active = fetcher
+                    return True
+            if monotonic() >= deadline:
+                return False
+            self.fetchers[0].wait_for_first_token(STANDBY_POLL_INTERVAL)
+
+    def request_refresh(self) -> None:
+        """A request was answered with 401, the active session is treated as logged out."""
+        # The requests that were already on the way with the old token are answered after the switch.
+        if self._last_failover is not None and monotonic() - self._last_failover < FAILOVER_COOLDOWN:
+            return
+        active = self._active
+        active.mark_session_lost("401")
+        active.request_refresh()
+
+    def stop(self) -> None:
+        for fetcher in self.fetchers:
+            fetcher.stop()
+
+    def has_token(self) -> bool:
+        return any(fetcher.has_token() for fetcher in self.fetchers)
+
+class StaticTokenFetcher:
+    """Token source with a fixed token and the same interface as `ContinuousTokenFetcher`, no browser is started."""
+    driver = None
+
+    def __init__(self, token: str) -> None:
+        self._token = token
+
+    def login_to_kepler(self) -> None:
+        pass
+
+    def start(self) -> None:
+        pass
+
+    def get_token(self) -> str:
+        return self._token
+
+    def wait_for_first_token(self, timeout: float = 60) -> bool:
+        return True
+
+    def request_refresh(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def has_token(self) -> bool:
+        return len(self._token) > 0
@@ -0,0 +1,198 @@
+# === IMPORTS ===
+from typing import NamedTuple
+from catalog import Catalog
+from crn_chain import CrnChains
+import argparse
+
+# === CONSTANTS ===
+MAX_CRN_COUNT = 12 # More CRNs than this in a single request is answered with `VAL15`.
+MAX_CREDITS = 30 # Default of `--max-credits`, the actual limit depends on the GPA of the student, more credits is answered with `VAL05`.
+MAX_SEARCH_STEPS = 100000 # Combinations tried before the search for a valid one gives up.
+WEEKDAYS = {"Pazartesi": 0, "Salı": 1, "Çarşamba": 2, "Perşembe": 3, "Cuma": 4, "Cumartesi": 5, "Pazar": 6}
+
+# === DATA TYPES ===
+class Meeting(NamedTuple):
+    weekday: int
+    start: int # Minutes after midnight.
+    end: int # Minutes after midnight, inclusive.
+
+class ValidationResult(NamedTuple):
+    clashes: list[tuple[str, str]] # Pairs of CRNs in different slots whose meetings overlap.
+    credit_range: tuple[float, float] # Lowest and highest total credits over the combinations.
+    unknown_crns: list[str] # CRNs that are not in the catalog, they are assumed to have no meetings and no credits.
+    excess_slots: list[list[str]] # Slots after the first `MAX_CRN_COUNT` ones.
+    invalid_crns: list[tuple[str, str]] # CRNs that can't be sent whatever else is taken, along with the reason.
+    has_valid_combination: bool | None # `None` if the search gave up before finding one.
+
+# === CLASS DEFINITON ===
+class ScheduleValidator:
+    """
+    Checks a CRN list against the meeting times and credits in the catalog before any request is sent.
+
+    The list is given as slots, every slot holds a CRN and its backups in order. A combination takes one CRN from every
+    slot. Clashes are found with a sorted interval index per weekday and the search stops at the first clash-free
+    combination within the credit limit. Clashes and credits are only reported, the server decides on them; only the
+    CRNs that are invalid on their own are dropped by `prune`.
+    """
+    def __init__(self, catalog: Catalog, max_credits: float = MAX_CREDITS, max_crn_count: int = MAX_CRN_COUNT) -> None:
+        self.catalog = catalog
+        self.max_credits = max_credits
+        self.max_crn_count = max_crn_count
+
+    @staticmethod
+    def parse_minutes(text: str) -> int:
+        return int(text[:-2]) * 60 + int(text[-2:])
+
+    def get_meetings(self, crn: str) -> list[Meeting]:
+        """Reads the meetings of `crn` from the day and time columns, e.g. "Salı Perşembe" and "0930/1129 1330/1429"."""
+        lesson = self.catalog.get_lesson(crn)
+        if lesson is None:
+            return []
+
+        meetings = []
+        for day, time_range in zip(lesson.day.split(), lesson.time.split()):
+            if day not in WEEKDAYS or "/" not in time_range:
+                continue
+            try:
+                start, end = (ScheduleValidator.parse_minutes(part) for part in time_range.split("/"))
+            except ValueError:
+                continue
+            meetings.append(Meeting(WEEKDAYS[day], start, end))
+        return meetings
+
+    def find_clashes(self, crns: list[str]) -> set[frozenset[str]]:
+        """Returns the pairs of CRNs with overlapping meetings, sweeping over the meetings of each weekday in start order."""
+        index = {}
+        for crn in set(crns):
+            for meeting in self.get_meetings(crn):
+                index.setdefault(meeting.weekday, []).append((meeting.start, meeting.end, crn))
+
+        clashes = set()
+        for intervals in index.values():
+            intervals.sort()
+            active = []
+            for start, end, crn in intervals:
+                # Drop the meetings that ended before this one started, the rest overlap with it.
+                active = [interval for interval in active if interval[1] >= start]
+                for _, _, other_crn in active:
+                    if other_crn != crn:
+                        clashes.add(frozenset((crn, other_crn)))
+                active.append((start, end, crn))
+        return clashes
+
+    @staticmethod
+    def get_invalid_reason(crn: str, seen: set[str]) -> str | None:
+        """Returns why `crn` can't be sent whatever else is taken, `None` if it can be. `seen` holds the CRNs listed before it."""
+        if not crn.isdigit():
+            return "geçerli bir CRN değil"
+        if crn in seen:
+            return "listede birden fazla kez yer alıyor"
+        return None
+
+    @staticmethod
+    def find_invalid_crns(slots: list[list[str]]) -> list[tuple[str, str]]:
+        invalid_crns, seen = [], set()
+        for slot in slots:
+            for crn in slot:
+                reason = ScheduleValidator.get_invalid_reason(crn, seen)
+                if reason is not None:
+                    invalid_crns.append((crn, reason))
+                seen.add(crn)
+        return invalid_crns
+
+    def find_combination(self, slots: list[list[str]], clashes: set[frozenset[str]], credits: dict[str, float], max_steps: int = MAX_SEARCH_STEPS) -> tuple[list[str] | None, bool]:
+        """
+        Returns the first clash-free combination within the credit limit, `None` if there is none, and whether the
+        search finished within `max_steps` steps.
+
+        Every choice removes the CRNs clashing with it from the remaining slots, so a branch is cut as soon as a slot runs
+        out of options, and the slots with the fewest options are filled first.
+        """
+        steps = 0
+        def search(remaining: list[list[str]], chosen: list[str], total: float) -> list[str] | None:
+            nonlocal steps
+            if not remaining:
+                return chosen
+            # The cheapest possible rest of the combination already exceeds the limit.
+            if total + sum(min(credits[crn] for crn in slot) for slot in remaining) > self.max_credits:
+                return None
+            slot, *rest = sorted(remaining, key=len)
+            for crn in slot:
+                steps += 1
+                if steps > max_steps:
+                    return None
+                narrowed = [[other for other in other_slot if frozenset((crn, other)) not in clashes] for other_slot in rest]
+                if all(narrowed):
+                    combination = search(narrowed, chosen + [crn], total + credits[crn])
+                    if combination is not None:
+                        return combination
+            return None
+        combination = search([list(dict.fromkeys(slot)) for slot in slots if slot], [], 0)
+        return combination, steps <= max_steps
+
+    def validate(self, slots: list[list[str]]) -> ValidationResult:
+        slots, excess_slots = slots[:self.max_crn_count], slots[self.max_crn_count:]
+        crns = [crn for slot in slots for crn in slot]
+        clashes = self.find_clashes(crns)
+        invalid_crns = ScheduleValidator.find_invalid_crns(slots)
+        credits = {crn: self.catalog.get_credits(crn) or 0 for crn in crns}
+        unknown_crns = [crn for crn in dict.fromkeys(crns) if self.catalog.get_lesson(crn) is None]
+
+        # Only CRNs of different slots can end up in the same combination.
+        slot_of = {}
+        for i, slot in enumerate(slots):
+            for crn in slot:
+                slot_of.setdefault(crn, i)
+        slot_clashes = sorted(tuple(sorted(pair)) for pair in clashes if len({slot_of[crn] for crn in pair}) > 1)
+
+        combination, is_complete = self.find_combination(slots, clashes, credits)
+        has_valid_combination = True if combination is not None else False if is_complete else None
+        minimum = sum(min(credits[crn] for crn in slot) for slot in slots if slot)
+        maximum = sum(max(credits[crn] for crn in slot) for slot in slots if slot)
+        return ValidationResult(slot_clashes, (minimum, maximum), unknown_crns, excess_slots, invalid_crns, has_valid_combination)
+
+    def describe(self, result: ValidationResult) -> list[str]:
+        """Returns the problems found as messages for the user."""
+        messages = []
+        for crn in result.unknown_crns:
+            messages.append(f"CRN {crn} ITU Helper veritabanında bulunamadı, ders saati ve kredisi kontrol edilemedi.")
+        for crn, other_crn in result.clashes:
+            messages.append(f"CRN {crn} ve CRN {other_crn} çakışıyor.")
+        if result.credit_range[1] > self.max_credits:
+            messages.append(f"Toplam kredi en fazla {result.credit_range[1]} olabilir, {self.max_credits} kredi sınırını aşan dersler alınamayabilir.")
+        if result.excess_slots:
+            messages.append(f"En fazla {self.max_crn_count} CRN alınabilir, fazladan girilenler gönderilmeyecek: {[':'.join(slot) for slot in result.excess_slots]}.")
+        if result.has_valid_combination is False:
+            messages.append("Yedekler dahil hiçbir ders kombinasyonu çakışmasız ve kredi sınırı içinde değil, bazı dersler alınamayabilir.")
+        elif result.has_valid_combination is None:
+            messages.append("Çok fazla yedek kombinasyonu olduğundan çakışmasız bir kombinasyon olup olmadığı kontrol edilemedi.")
+        for crn, reason in result.invalid_crns:
+            messages.append(f"CRN {crn} {reason}, istek listesinden çıkarılacak.")
+        return messages
+
+    @staticmethod
+    def prune(slots: list[list[str]], result: ValidationResult) -> list[list[str]]:
+        """Drops the excess slots and the CRNs that are invalid on their own, a slot whose CRNs are all invalid is dropped as a whole."""
+        pruned, seen = [], set()
+        for slot in slots[:len(slots) - len(result.excess_slots)]:
+            # Walked in order like `find_invalid_crns`, only the repeats of a CRN are dropped and not its first entry.
+            kept = []
+            for crn in slot:
+                if ScheduleValidator.get_invalid_reason(crn, seen) is None:
+                    kept.append(crn)
+                seen.add(crn)
+            if kept:
+                pruned.append(kept)
+        return pruned
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CRN listesini ders saati çakışması, kredi ve CRN sayısı açısından kontrol eder.")
+    parser.add_argument("crns", nargs="+", help="Kontrol edilecek CRN'ler, yedekler \"CRN:YEDEK_CRN\" formatında verilebilir.")
+    parser.add_argument("--max-credits", type=float, default=MAX_CREDITS, help="Kredi sınırı.")
+    args = parser.parse_args()
+
+    validator = ScheduleValidator(Catalog(), max_credits=args.max_credits)
+    result = validator.validate(CrnChains.parse(args.crns))
+    for message in validator.describe(result) or ["Sorun bulunamadı."]:
+        print(message)
+    print(f"Toplam kredi aralığı: {result.credit_range[0]} - {result.credit_range[1]}")
@@ -0,0 +1,93 @@
+# === IMPORTS ===
+from time import monotonic, perf_counter, sleep, time
+from logger import Logger
+from event_stream import EventStream
+import argparse
+import asyncio
+import sys
+
+# === CONSTANTS ===
+RECHECK_INTERVAL = 10 # Longest single sleep in seconds, the wall clock is compared with the monotonic clock after each one.
+JUMP_TOLERANCE = .05 # Seconds the two clocks may drift apart before the rest of the wait is planned again.
+SUSPEND_THRESHOLD = 5 # A forward jump longer than this many seconds is reported as a suspend.
+# The last part of the wait is a busy loop, `sleep` may overshoot by a whole timer tick on Windows.
+SPIN_WINDOW = .02 if sys.platform == "win32" else .002
+
+# === CLASS DEFINITON ===
+class WakeScheduler:
+    """
+    Sleeps until a wall clock time without drifting.
+
+    The wait is planned on the monotonic clock and slept in chunks of at most `RECHECK_INTERVAL` seconds. After every
+    chunk the wall clock is read again: an NTP step, a DST change or a suspend of the computer shows up as a difference
+    between the two clocks, in which case the rest of the wait is planned again from the wall clock. The last
+    `SPIN_WINDOW` seconds are waited in a busy loop on `perf_counter`, so the wake-up isn't late by the scheduler's jitter.
+    """
+    @staticmethod
+    def _plan_sleeps(target: float, phase: str, replans: list[int]):
+        """Yields the coarse sleeps until `SPIN_WINDOW` seconds before `target`, counting the re-plans in `replans[0]`."""
+        plan_wall, plan_mono = time(), monotonic()
+        deadline = plan_mono + (target - plan_wall)
+        while True:
+            remaining = deadline - monotonic()
+            if remaining <= SPIN_WINDOW:
+                return
+            yield min(remaining - SPIN_WINDOW, RECHECK_INTERVAL)
+
+            jump = (time() - plan_wall) - (monotonic() - plan_mono)
+            if abs(jump) <= JUMP_TOLERANCE:
+                continue
+            suspended = jump > SUSPEND_THRESHOLD
+            if suspended:
+                Logger.log(f"Bilgisayarın yaklaşık {jump:.0f} saniye uyku modunda kaldığı tespit edildi, bekleme yeniden planlanıyor ({phase}).")
+            else:
+                Logger.log(f"Sistem saati {jump * 1000:+.0f} ms değişti, bekleme yeniden planlanıyor ({phase}).", silent=True)
+            EventStream.emit("clock_jump", phase=phase, jump_ms=jump * 1000, suspended=suspended)
+
+            replans[0] += 1
+            plan_wall, plan_mono = time(), monotonic()
+            deadline = plan_mono + (target - plan_wall)
+
+    @staticmethod
+    def _spin(target: float) -> None:
+        # Converted to `perf_counter` once, the wall clock isn't read inside the loop.
+        deadline = perf_counter() + (target - time())
+        while perf_counter() < deadline:
+            pass
+
+    @staticmethod
+    def _report(target: float, phase: str, replan_count: int) -> float:
+        error_ms = (time() - target) * 1000
+        EventStream.emit("wake", phase=phase, planned=target, error_ms=error_ms, replans=replan_count)
+        return error_ms
+
+    @staticmethod
+    def sleep_until(target: float, phase: str) -> float | None:
+        """Sleeps until the given local epoch time, returns how late the wake-up was in milliseconds, `None` if the time had already passed."""
+        if target - time() <= 0:
+            return None
+        replans = [0]
+        for duration in WakeScheduler._plan_sleeps(target, phase, replans):
+            sleep(duration)
+        WakeScheduler._spin(target)
+        return WakeScheduler._report(target, phase, replans[0])
+
+    @staticmethod
+    async def sleep_until_async(target: float, phase: str) -> float | None:
+        """Same as `sleep_until` without blocking the event loop, except for the final `SPIN_WINDOW` seconds."""
+        if target - time() <= 0:
+            return None
+        replans = [0]
+        for duration in WakeScheduler._plan_sleeps(target, phase, replans):
+            await asyncio.sleep(duration)
+        WakeScheduler._spin(target)
+        return WakeScheduler._report(target, phase, replans[0])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Uyanma hatasını ölçer, verilen sayıda kısa bekleme yapar.")
+    parser.add_argument("--count", type=int, default=20, help="Bekleme sayısı.")
+    parser.add_argument("--delay", type=float, default=.5, help="Her beklemenin saniye cinsinden süresi.")
+    args = parser.parse_args()
+
+    errors = sorted(abs(WakeScheduler.sleep_until(time() + args.delay, "ölçüm")) for _ in range(args.count))
+    print(f"Uyanma hatası: p50 {errors[len(errors) // 2]:.3f} ms, maks {errors[-1]:.3f} ms.")
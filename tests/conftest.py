@@ -0,0 +1,15 @@
+import tempfile
+import sys
+import os
+
+# The modules import each other by their flat names, like when they are run from `src`.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import event_stream
+import logger
+
+# The `logs` and `data` folders are created relative to the working directory, keep them out of the repository.
+WORK_DIR = tempfile.mkdtemp(prefix="itu-ders-secici-tests-")
+os.chdir(WORK_DIR)
+# pytest changes back to the invocation directory before the exit hooks write the log and the event summary.
+logger.LOG_DIR = event_stream.LOG_DIR = os.path.join(WORK_DIR, "logs")
@@ -0,0 +1,79 @@
+import asyncio
+
+from async_request_manager import AsyncRequestManager, REQUESTS_PER_SECOND, BURST_SIZE, MAX_IN_FLIGHT
+from mock_server import MockObsServer, RATE_LIMIT, RATE_WINDOW
+from request_manager import RequestManager
+from retry_policy import RetryScheduler, SERVER_RATE_LIMIT
+from run import COURSE_SELECTION_URL, COURSE_TIME_CHECK_URL, OBS_BASE_URL
+
+# The server's rate window and the client's rate are both sped up by this much, so a whole window fits in a few seconds.
+TIME_SCALE = 20
+
+def run_against_mock(server: MockObsServer, crn_slots: list[list[str]], duration: float) -> tuple[list[str], list[str], bool]:
+    request_manager = RequestManager(lambda: "Bearer test", COURSE_SELECTION_URL.replace(OBS_BASE_URL, server.base_url),
+                                     COURSE_TIME_CHECK_URL.replace(OBS_BASE_URL, server.base_url), crn_slots)
+    manager = AsyncRequestManager(request_manager, requests_per_second=REQUESTS_PER_SECOND * TIME_SCALE)
+    return asyncio.run(manager.run([slot[0] for slot in crn_slots], [], duration))
+
+def test_defaults_stay_below_server_limits():
+    assert MAX_IN_FLIGHT == 1
+    assert BURST_SIZE == 1
+    # Requests that fit in any window: the burst plus the ones the rate refills.
+    assert BURST_SIZE + REQUESTS_PER_SECOND * RATE_WINDOW <= min(RATE_LIMIT, SERVER_RATE_LIMIT)
+
+def test_full_courses_never_hit_val16_or_val21():
+    # Every section is full, so the same CRNs are retried for more than a whole rate window.
+    server = MockObsServer(quotas={"21340": 0, "21345": 0}, latency="0.05", rate_window=RATE_WINDOW / TIME_SCALE)
+    server.start()
+    try:
+        crn_list, _, timed_out = run_against_mock(server, [["21340"], ["21345"]], RATE_WINDOW / TIME_SCALE * 1.5)
+        report = server.report()
+    finally:
+        server.stop()
+
+    assert not timed_out
+    assert crn_list == ["21340", "21345"]
+    assert report["selection_requests"] > RATE_LIMIT / 2
+    assert "VAL16" not in report["codes"]
+    assert "VAL21" not in report["codes"]
+    assert report["lockouts"] == 0
+
+def test_open_courses_are_taken():
+    server = MockObsServer(latency="0.05")
+    server.start()
+    try:
+        crn_list, scrn_list, timed_out = run_against_mock(server, [["21340"], ["21345", "21346"]], 5)
+        report = server.report()
+    finally:
+        server.stop()
+
+    assert (crn_list, scrn_list, timed_out) == ([], [], False)
+    assert report["codes"] == {"successResult": 2}
+
+def run_with_retry_config(server: MockObsServer, retry_config: dict, duration: float) -> int:
+    request_manager = RequestManager(lambda: "Bearer test", COURSE_SELECTION_URL.replace(OBS_BASE_URL, server.base_url),
+                                     COURSE_TIME_CHECK_URL.replace(OBS_BASE_URL, server.base_url), [["21340"]])
+    retry_scheduler = RetryScheduler.from_config(retry_config, 3, duration)
+    # The bucket alone would allow a request every 0.05 seconds.
+    manager = AsyncRequestManager(request_manager, requests_per_second=20, retry_scheduler=retry_scheduler)
+    asyncio.run(manager.run(["21340"], [], duration))
+    return server.report()["selection_requests"]
+
+def test_retry_rules_decide_the_delay():
+    server = MockObsServer(quotas={"21340": 0})
+    server.start()
+    try:
+        # A full section is retried every 0.5 seconds: at 0, 0.5, 1 and 1.5.
+        request_count = run_with_retry_config(server, {"rules": [{"codes": ["VAL06"], "delay": .5}]}, 1.75)
+    finally:
+        server.stop()
+    assert request_count == 4
+
+def test_retry_budget_ends_the_run():
+    server = MockObsServer(quotas={"21340": 0})
+    server.start()
+    try:
+        request_count = run_with_retry_config(server, {"max_requests": 3, "rules": [{"codes": ["VAL06"], "delay": .05}]}, 5)
+    finally:
+        server.stop()
+    assert request_count == 3
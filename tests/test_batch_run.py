@@ -0,0 +1,75 @@
+import asyncio
+import json
+from datetime import datetime
+from time import time
+
+import batch_run
+from batch_run import Account, BatchRunner
+from mock_server import MockObsServer
+from run import COURSE_SELECTION_URL, COURSE_TIME_CHECK_URL, DELAY_BETWEEN_TIME_CHECKS, OBS_BASE_URL
+from token_fetcher import StaticTokenFetcher
+
+SERVER_LAG = 1.5 # Seconds the server clock is behind the local one, the accounts would be early without the probe.
+
+def write_config(path, username: str, crn: str, start_time: datetime, retry_config: dict | None = None) -> str:
+    time_data = {"year": start_time.year, "month": start_time.month, "day": start_time.day,
+                 "hour": start_time.hour, "minute": start_time.minute, "seconds": start_time.second}
+    config = {"account": {"username": username, "password": "password"}, "courses": {"crn": [crn]}, "time": time_data}
+    if retry_config is not None:
+        config["retry"] = retry_config
+    with open(path, "w") as file:
+        json.dump(config, file)
+    return str(path)
+
+def point_to(server: MockObsServer, monkeypatch) -> None:
+    monkeypatch.setattr(batch_run, "COURSE_SELECTION_URL", COURSE_SELECTION_URL.replace(OBS_BASE_URL, server.base_url))
+    monkeypatch.setattr(batch_run, "COURSE_TIME_CHECK_URL", COURSE_TIME_CHECK_URL.replace(OBS_BASE_URL, server.base_url))
+
+def test_one_probe_signals_every_account(tmp_path, monkeypatch):
+    start_time = datetime.fromtimestamp(int(time()) + 1)
+    server = MockObsServer(skew=-SERVER_LAG, open_time=start_time.timestamp(), latency="0.02")
+    point_to(server, monkeypatch)
+    accounts = [Account(write_config(tmp_path / f"config_{i}.json", f"user{i}", crn, start_time), test_mode=False)
+                for i, crn in enumerate(["21340", "21345", "21350"])]
+    for i, account in enumerate(accounts):
+        account.token_fetcher = StaticTokenFetcher(f"Bearer {i}")
+
+    server.start()
+    runner = BatchRunner(accounts, browser_pool=None)
+    try:
+        runner.create_request_managers()
+        # The clock couldn't be read, the open is only known from the time checks.
+        runner.create_open_probe()
+        asyncio.run(runner.run(duration=3, max_attempts=1))
+        report = server.report()
+    finally:
+        runner.stop()
+        server.stop()
+
+    assert report["codes"] == {"successResult": 3}
+    # A probe per account would send about three times as many.
+    assert report["time_checks"] <= (SERVER_LAG + 1) / DELAY_BETWEEN_TIME_CHECKS * 1.5
+
+def test_each_account_uses_its_own_retry_rules(tmp_path, monkeypatch):
+    start_time = datetime.fromtimestamp(int(time()))
+    server = MockObsServer(quotas={"21340": 0, "21345": 0})
+    point_to(server, monkeypatch)
+    retry_configs = [{"max_requests": 2, "rules": [{"codes": ["VAL06"], "delay": .1}]},
+                     {"max_requests": 4, "rules": [{"codes": ["VAL06"], "delay": .1}]}]
+    accounts = [Account(write_config(tmp_path / f"config_{i}.json", f"user{i}", crn, start_time, retry_config), test_mode=False)
+                for i, (crn, retry_config) in enumerate(zip(["21340", "21345"], retry_configs))]
+    for i, account in enumerate(accounts):
+        account.token_fetcher = StaticTokenFetcher(f"Bearer {i}")
+
+    server.start()
+    runner = BatchRunner(accounts, browser_pool=None, requests_per_second=20)
+    try:
+        runner.create_request_managers()
+        asyncio.run(runner.run(duration=3))
+        report = server.report()
+    finally:
+        runner.stop()
+        server.stop()
+
+    # The budgets end the runs, 2 and 4 requests.
+    assert report["selection_requests"] == 6
@@ -0,0 +1,87 @@
+from email.utils import formatdate
+import math
+
+import pytest
+
+import clock_sync
+from clock_sync import ClockSync
+
+class VirtualServer:
+    """Server whose clock is `skew` seconds ahead of a virtual local clock, reached over a link with fixed delays."""
+    def __init__(self, skew: float, delay_out: float, delay_back: float, start: float = 1_700_000_000.3) -> None:
+        self.skew = skew
+        self.delay_out = delay_out
+        self.delay_back = delay_back
+        self.now = start
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += max(0, seconds)
+
+    def probe(self) -> tuple[float, float, str]:
+        t_send = self.now
+        server_time = t_send + self.delay_out + self.skew
+        self.now += self.delay_out + self.delay_back
+        return t_send, self.now, formatdate(math.floor(server_time), usegmt=True)
+
+@pytest.fixture
+def server(monkeypatch):
+    server = VirtualServer(skew=.35, delay_out=.03, delay_back=.05)
+    monkeypatch.setattr(clock_sync, "time", server.time)
+    monkeypatch.setattr(clock_sync, "sleep", server.sleep)
+    return server
+
+def test_parse_date_header():
+    assert ClockSync.parse_date_header("Tue, 14 Nov 2023 22:13:20 GMT") == 1_700_000_000
+    assert ClockSync.parse_date_header(None) is None
+    assert ClockSync.parse_date_header("not a date") is None
+
+def test_single_sample_bounds_offset():
+    sync = ClockSync(None)
+    # Sent at 10.2, received at 10.3, the server said second 10, so the offset is in [10 - 10.3, 11 - 10.2].
+    sync.add_sample(10.2, 10.3, 10)
+    assert sync.lower == pytest.approx(-.3)
+    assert sync.upper == pytest.approx(.8)
+    assert sync.offset == pytest.approx(.25)
+    assert sync.error == pytest.approx(.55)
+    assert sync.rtt == pytest.approx(.1)
+
+def test_samples_are_intersected():
+    sync = ClockSync(None)
+    sync.add_sample(10.2, 10.3, 10)
+    sync.add_sample(20.6, 20.7, 21)
+    assert sync.lower == pytest.approx(.3)
+    assert sync.upper == pytest.approx(.8)
+    assert sync.rtt == pytest.approx(.1)
+
+def test_disjoint_sample_starts_over():
+    sync = ClockSync(None)
+    sync.add_sample(10.2, 10.3, 10)
+    # The local clock was stepped back by 5 seconds.
+    sync.add_sample(5.2, 5.3, 10)
+    assert (sync.lower, sync.upper) == (pytest.approx(4.7), pytest.approx(5.8))
+
+def test_synchronize_converges_on_skew(server):
+    sync = ClockSync(server.probe)
+    assert sync.synchronize(deadline=server.now + 30, target_error=.02)
+    # A `Date` sample can't be narrower than its round trip, that is the best the bisection can reach.
+    assert sync.error <= sync.rtt / 2 + .005
+    # The true offset always stays inside the interval, the asymmetric delays only widen it.
+    assert sync.lower <= server.skew <= sync.upper
+    assert sync.offset == pytest.approx(server.skew, abs=sync.error)
+    assert sync.rtt == pytest.approx(server.delay_out + server.delay_back)
+
+def test_synchronize_gives_up_without_date_header(monkeypatch, server):
+    sync = ClockSync(lambda: (server.now, server.now + .05, None))
+    assert not sync.synchronize(deadline=server.now + 5, max_samples=3)
+    assert not sync.is_synced
+
+def test_send_time_arrives_after_open(server):
+    sync = ClockSync(server.probe)
+    sync.synchronize(deadline=server.now + 30)
+    open_time = 1_700_000_100
+    arrival_server_time = sync.send_time_for(open_time) + server.delay_out + server.skew
+    assert arrival_server_time >= open_time
+    assert arrival_server_time - open_time <= 2 * sync.error + abs(server.delay_out - server.delay_back)
@@ -0,0 +1,123 @@
+import json
+
+import pytest
+
+from crn_chain import CrnChains, DONE, RETRY, ADVANCE, DROP, STOP
+from request_manager import RequestManager
+
+ACTIONS = {"successResult": DONE, "VAL01": RETRY, "VAL06": ADVANCE, "VAL03": DROP, "VAL21": STOP}
+
+def make_chains() -> CrnChains:
+    return CrnChains([["11", "12", "13"], ["21"]], ACTIONS)
+
+def selection_response(*results: tuple[str, str]) -> str:
+    return json.dumps({"ecrnResultList": [{"crn": crn, "resultCode": code} for crn, code in results], "scrnResultList": []})
+
+ALL = ["11", "12", "13", "21"]
+
+@pytest.mark.parametrize("crn, code, expected, remaining", [
+    # CRN of a slot with alternatives.
+    ("12", "successResult", (DONE, None), ["21"]),
+    ("12", "VAL01", (RETRY, "12"), ALL),
+    ("12", "VAL06", (ADVANCE, "13"), ALL),
+    ("13", "VAL06", (ADVANCE, "11"), ALL),
+    ("12", "VAL03", (DROP, "13"), ["11", "13", "21"]),
+    ("12", "VAL21", (STOP, "12"), ALL),
+    ("12", "unknown", (DROP, "13"), ["11", "13", "21"]),
+    # The only CRN of its slot, advancing wraps around to itself.
+    ("21", "successResult", (DONE, None), ["11", "12", "13"]),
+    ("21", "VAL01", (RETRY, "21"), ALL),
+    ("21", "VAL06", (ADVANCE, "21"), ALL),
+    ("21", "VAL03", (DROP, None), ["11", "12", "13"]),
+    ("21", "VAL21", (STOP, "21"), ALL),
+])
+def test_transition(crn, code, expected, remaining):
+    chains = make_chains()
+
+    assert chains.transition(crn, code) == expected
+    assert list(chains.nodes) == remaining
+    assert chains.is_tried(crn) == (crn in remaining)
+
+@pytest.mark.parametrize("code, expected", [
+    ("successResult", (DONE, None)),
+    ("VAL01", (RETRY, "99")),
+    ("VAL06", (ADVANCE, "99")),
+    ("VAL03", (DROP, None)),
+    ("VAL21", (STOP, "99")),
+])
+def test_transition_of_unknown_crn(code, expected):
+    chains = make_chains()
+
+    assert chains.transition("99", code) == expected
+    assert list(chains.nodes) == ["11", "12", "13", "21"]
+
+def test_done_removes_whole_slot():
+    chains = make_chains()
+    chains.transition("12", "successResult")
+
+    assert list(chains.nodes) == ["21"]
+    assert chains.get_alternatives("21") == ["21"]
+
+def test_drop_last_alternatives_empties_slot():
+    chains = make_chains()
+
+    assert chains.transition("11", "VAL03") == (DROP, "12")
+    assert chains.transition("12", "VAL03") == (DROP, "13")
+    assert chains.transition("13", "VAL03") == (DROP, None)
+    assert list(chains.nodes) == ["21"]
+
+def test_advance_cycles_back_to_first():
+    chains = make_chains()
+    crn = "11"
+    seen = []
+    for _ in range(4):
+        seen.append(crn)
+        _, crn = chains.transition(crn, "VAL06")
+
+    assert seen == ["11", "12", "13", "11"]
+
+@pytest.mark.parametrize("entries, expected", [
+    (["21345"], [["21345"]]),
+    ([21345, "21346:21347"], [["21345"], ["21346", "21347"]]),
+    (["a::b"], [["a", "b"]]),
+    ([":21345:", " 21346 : 21347 "], [["21345"], ["21346", "21347"]]),
+    (["", " ", ":"], []),
+])
+def test_parse(entries, expected):
+    assert CrnChains.parse(entries) == expected
+
+def test_repeated_crn_stays_in_first_slot():
+    chains = CrnChains([["11", "12"], ["12", "21"]], ACTIONS)
+
+    assert chains.heads == ["11", "21"]
+    assert chains.get_alternatives("12") == ["12", "11"]
+    assert chains.get_alternatives("21") == ["21"]
+
+def test_response_skips_crns_no_longer_in_list():
+    request_manager = RequestManager("Bearer test", "http://127.0.0.1/selection", "http://127.0.0.1/time", [["11", "12"], ["21"]])
+    crn_list = ["12", "21"]
+    # "11" was already advanced past by the response of an earlier request, its late result must not move the slot again.
+    response = selection_response(("11", "VAL06"), ("12", "VAL06"), ("21", "successResult"))
+
+    crn_list, scrn_list, timed_out = request_manager.handle_selection_response(response, crn_list, [])
+
+    assert (crn_list, scrn_list, timed_out) == (["11"], [], False)
+    assert request_manager.chains.get_alternatives("11") == ["11", "12"]
+
+def test_response_keeps_slot_position_when_advancing():
+    request_manager = RequestManager("Bearer test", "http://127.0.0.1/selection", "http://127.0.0.1/time", [["11"], ["21", "22"], ["31"]])
+    crn_list = ["11", "21", "31"]
+
+    crn_list, _, timed_out = request_manager.handle_selection_response(selection_response(("21", "VAL06"), ("31", "VAL03")), crn_list, [])
+
+    assert (crn_list, timed_out) == (["11", "22"], False)
+    # "22" wasn't tried yet, the delay of the full section doesn't apply to it.
+    assert request_manager.last_result_codes == ["VAL03"]
+
+def test_response_stops_on_rate_limit():
+    request_manager = RequestManager("Bearer test", "http://127.0.0.1/selection", "http://127.0.0.1/time", [["11"], ["21"]])
+
+    crn_list, _, timed_out = request_manager.handle_selection_response(selection_response(("11", "VAL21"), ("21", "successResult")), ["11", "21"], [])
+
+    assert timed_out
+    assert crn_list == ["11", "21"]
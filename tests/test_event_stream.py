@@ -0,0 +1,31 @@
+import json
+import os
+
+import event_stream
+from event_stream import EventStream, EventSummary
+
+def test_emit_records_nothing_until_enabled(monkeypatch):
+    monkeypatch.setattr(EventStream, "summary", EventSummary())
+    EventStream.emit("result", crn="21340", code="successResult", list="ECRN", success=True)
+
+    assert not EventStream.is_enabled
+    assert EventStream._writer is None
+    assert EventStream.summary.report()["results_per_code"] == {}
+
+def test_enable_writes_events_and_summary(monkeypatch):
+    exit_hooks = []
+    monkeypatch.setattr(event_stream.atexit, "register", exit_hooks.append)
+    for name in ("is_enabled", "file_name", "_writer"):
+        monkeypatch.setattr(EventStream, name, getattr(EventStream, name))
+    monkeypatch.setattr(EventStream, "summary", EventSummary())
+
+    EventStream.enable()
+    EventStream.enable()
+    EventStream.emit("result", crn="21340", code="successResult", list="ECRN", success=True)
+    assert exit_hooks == [EventStream.save_summary]
+    EventStream.save_summary()
+
+    with open(os.path.join(event_stream.LOG_DIR, f"{EventStream.file_name}.jsonl"), encoding="utf-8") as f:
+        assert [json.loads(line)["crn"] for line in f] == ["21340"]
+    with open(os.path.join(event_stream.LOG_DIR, f"{EventStream.file_name}_summary.json"), encoding="utf-8") as f:
+        assert json.load(f)["results_per_code"] == {"successResult": 1}
@@ -0,0 +1,108 @@
+import pytest
+
+import mock_server
+from http_login import HttpLogin, IdentityParser
+from mock_server import MockObsServer, LOGIN_PAGE, LOGIN_BUTTON, IDENTITY_CARD
+from token_fetcher import read_token_expiry
+
+TARGET_PATH = "/ogrenci/DersKayitIslemleri/DersKayit"
+
+@pytest.fixture
+def start_server():
+    servers = []
+    def start(**kwargs) -> MockObsServer:
+        server = MockObsServer(username="student", password="secret", **kwargs)
+        server.start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.stop()
+
+def test_find_login_form_reads_inputs():
+    form = HttpLogin.find_login_form(LOGIN_PAGE.format(action="/girisv3/Login?ReturnUrl=%2F", view_state="abc"))
+    assert form["method"] == "post"
+    assert form["action"] == "/girisv3/Login?ReturnUrl=%2F"
+    assert [(field["name"], field["type"]) for field in form["inputs"]] == [
+        ("__VIEWSTATE", "hidden"), ("ctl00$ContentPlaceHolder1$tbUserName", "text"),
+        ("ctl00$ContentPlaceHolder1$tbPassword", "password"), ("ctl00$ContentPlaceHolder1$btnLogin", "submit")]
+    assert form["inputs"][0]["value"] == "abc"
+
+def test_find_login_form_ignores_forms_without_password():
+    assert HttpLogin.find_login_form('<form action="/search"><input name="q"></form>') is None
+    assert HttpLogin.find_login_form("<html><body>Kepler</body></html>") is None
+
+def test_identity_parser_reads_cards():
+    cards = "".join(IDENTITY_CARD.format(index=i, program=f"Program {i}", student_id=f"0{i}0200000", status=status, link=f"/select?id={i}")
+                    for i, status in enumerate(["Pasif", "Aktif"], start=1))
+    parser = IdentityParser()
+    parser.feed(f"<html><body><img src='logo.png'>{cards}</body></html>")
+    assert [card["link"] for card in parser.cards] == ["/select?id=1", "/select?id=2"]
+    assert [card["rows"][-1] for card in parser.cards] == ["Durum: Pasif", "Durum: Aktif"]
+    assert parser.cards[1]["rows"][1:3] == ["Program 2", "020200000"]
+
+@pytest.mark.parametrize("identity_count", [1, 3])
+def test_login_returns_valid_token(start_server, identity_count):
+    server = start_server(identity_count=identity_count)
+    http_login = HttpLogin(server.base_url + TARGET_PATH, "student", "secret")
+    token = http_login.login()
+    assert token.startswith("Bearer ")
+    assert server.is_token_valid(token)
+    assert read_token_expiry(token) is not None
+    assert server.report()["logins"] == 1
+
+def test_fetch_token_reuses_session(start_server):
+    server = start_server()
+    http_login = HttpLogin(server.base_url + TARGET_PATH, "student", "secret")
+    first = http_login.login()
+    second = http_login.fetch_token()
+    assert server.is_token_valid(second) and second != first
+    assert server.report()["logins"] == 1
+
+def test_fetch_token_after_logout_is_empty(start_server):
+    server = start_server()
+    http_login = HttpLogin(server.base_url + TARGET_PATH, "student", "secret")
+    assert http_login.fetch_token() == ""
+    http_login.login()
+    server.expire_sessions()
+    assert http_login.fetch_token() == ""
+
+@pytest.mark.parametrize("login, password", [("student", "wrong"), ("someone", "secret"), ("", "")])
+def test_wrong_credentials_return_empty_token(start_server, login, password):
+    server = start_server()
+    assert HttpLogin(server.base_url + TARGET_PATH, login, password).login() == ""
+    assert server.report()["logins"] == 0
+
+def test_missing_hidden_field_fails_login(start_server, monkeypatch):
+    # The server only accepts the form with its `__VIEWSTATE`, a page without it can't be submitted successfully.
+    monkeypatch.setattr(mock_server, "LOGIN_PAGE", LOGIN_PAGE.replace('<input type="hidden" name="__VIEWSTATE" value="{view_state}">', "{view_state}"))
+    server = start_server()
+    assert HttpLogin(server.base_url + TARGET_PATH, "student", "secret").login() == ""
+    assert server.report()["logins"] == 0
+
+def test_login_posts_first_submit_button(start_server, monkeypatch):
+    # A second button (e.g. "forgot password") must not be posted along with the login button.
+    monkeypatch.setattr(mock_server, "LOGIN_PAGE", LOGIN_PAGE.replace("</form>", '<input type="submit" name="btnForgot" value="Şifremi Unuttum">\n</form>'))
+    server = start_server()
+    http_login = HttpLogin(server.base_url + TARGET_PATH, "student", "secret")
+    form = HttpLogin.find_login_form(mock_server.LOGIN_PAGE.format(action="/girisv3/Login", view_state="abc"))
+    posted = {}
+    monkeypatch.setattr(http_login.session, "post", lambda url, data, timeout: posted.update(data))
+    http_login._submit_login_form(http_login.session.get(server.base_url + TARGET_PATH), form)
+    assert posted[LOGIN_BUTTON] == "Giriş"
+    assert "btnForgot" not in posted
+
+def test_missing_login_button_fails_login(start_server, monkeypatch):
+    # WebForms only runs the click handler of a button that is posted, a form without one just renders the page again.
+    monkeypatch.setattr(mock_server, "LOGIN_PAGE", LOGIN_PAGE.replace('type="submit"', 'type="button"'))
+    server = start_server()
+    assert HttpLogin(server.base_url + TARGET_PATH, "student", "secret").login() == ""
+    assert server.report()["logins"] == 0
+
+def test_missing_password_field_fails_login(start_server, monkeypatch):
+    monkeypatch.setattr(mock_server, "LOGIN_PAGE", LOGIN_PAGE.replace('type="password"', 'type="hidden"'))
+    server = start_server()
+    assert HttpLogin(server.base_url + TARGET_PATH, "student", "secret").login() == ""
+
+def test_unreachable_server_returns_empty_token():
+    assert HttpLogin("http://127.0.0.1:9/ogrenci/", "student", "secret").login() == ""
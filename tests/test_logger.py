@@ -0,0 +1,30 @@
+from time import monotonic, sleep
+
+import logger
+from logger import Logger, FSYNC_INTERVAL
+
+def test_batch_after_recent_fsync_is_synced_while_idle(monkeypatch):
+    fsync_times = []
+    real_fsync = logger.fsync
+    def record_fsync(fd: int) -> None:
+        fsync_times.append(monotonic())
+        real_fsync(fd)
+    monkeypatch.setattr(logger, "fsync", record_fsync)
+
+    Logger.log("first", silent=True)
+    sleep(FSYNC_INTERVAL * .3)
+    # Written within `FSYNC_INTERVAL` of the fsync of the first one, nothing is logged after it.
+    Logger.log("second", silent=True)
+    last_logged = monotonic()
+    sleep(FSYNC_INTERVAL * 3)
+
+    assert any(at > last_logged for at in fsync_times)
+
+def test_flush_syncs_right_away(monkeypatch):
+    fsync_times = []
+    monkeypatch.setattr(logger, "fsync", lambda fd: fsync_times.append(monotonic()))
+
+    Logger.log("message", silent=True)
+    Logger.flush()
+
+    assert fsync_times
@@ -0,0 +1,31 @@
+import json
+from urllib.parse import urlsplit
+
+from response_trace import Exchange, TraceReplayer
+from run import COURSE_SELECTION_URL, COURSE_TIME_CHECK_URL
+
+OPEN_TIME = 1_000_000.0
+HEADER = {"version": 1, "open_time": OPEN_TIME, "selection_url": COURSE_SELECTION_URL, "time_check_url": COURSE_TIME_CHECK_URL}
+
+def selection(at: float, rtt_ms: float, *results: tuple[str, str]) -> Exchange:
+    request = {"ECRN": [crn for crn, _ in results], "SCRN": []}
+    body = {"ecrnResultList": [{"crn": crn, "resultCode": code, "resultData": None} for crn, code in results], "scrnResultList": []}
+    return Exchange(OPEN_TIME + at, "POST", urlsplit(COURSE_SELECTION_URL).path, request, 200, rtt_ms, json.dumps(body), None)
+
+def test_success_is_matched_at_send_time():
+    # The CRN was taken by the first request, a request recorded within its latency was already answered with "already taken".
+    replayer = TraceReplayer(HEADER, [selection(0, 500, ("11", "successResult")), selection(.3, 500, ("11", "VAL03"))])
+
+    result = replayer.replay([["11"]], [])
+
+    assert result.requests == 1
+    assert result.first_success_ms == {"11": 0}
+    assert result.remaining_crns == []
+
+def test_success_time_is_send_time_of_the_taking_request():
+    replayer = TraceReplayer(HEADER, [selection(0, 400, ("11", "VAL06")), selection(5, 400, ("11", "successResult"))])
+
+    result = replayer.replay([["11"]], [], start=5)
+
+    assert result.requests == 1
+    assert result.first_success_ms == {"11": 5000}
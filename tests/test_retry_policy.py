@@ -0,0 +1,68 @@
+from itertools import accumulate
+
+import pytest
+
+from retry_policy import RetryScheduler, DEFAULT_RETRY_CONFIG, RATE_WINDOW, SERVER_RATE_LIMIT
+
+DURATION = 60 * 10
+CODES = sorted({code for rule in DEFAULT_RETRY_CONFIG["rules"] for code in rule["codes"]} | {"successResult", "VAL09", "error"})
+
+def max_requests_in_window(delays: list[float | None]) -> int:
+    """Most responses that fall in any `RATE_WINDOW` seconds, the first one at 0 and each one after the chosen delay."""
+    times = [0.] + list(accumulate(delay for delay in delays if delay is not None))
+    return max(sum(1 for other in times[i:] if other < start + RATE_WINDOW) for i, start in enumerate(times))
+
+@pytest.mark.parametrize("code", CODES)
+def test_rate_cap_holds_for_every_code(code):
+    scheduler = RetryScheduler.from_config(None, 3, DURATION, seed=0)
+    delays = scheduler.simulate([[code]] * 300)
+    assert max_requests_in_window(delays) <= DEFAULT_RETRY_CONFIG["max_requests_per_window"] < SERVER_RATE_LIMIT
+
+def test_rate_cap_holds_for_a_mix_of_codes():
+    scheduler = RetryScheduler.from_config(None, 3, DURATION, seed=0)
+    delays = scheduler.simulate([["VAL02"]] * 20 + [["VAL16"], ["VAL14"], ["VAL06", "VAL02"]] * 40)
+    assert max_requests_in_window(delays) <= DEFAULT_RETRY_CONFIG["max_requests_per_window"]
+
+def test_rate_cap_cannot_be_configured_above_server_limit():
+    scheduler = RetryScheduler.from_config({"max_requests_per_window": 100, "rules": [{"codes": ["VAL02"], "delay": .1}]}, 3, DURATION)
+    delays = scheduler.simulate([["VAL02"]] * 100)
+    assert max_requests_in_window(delays) <= SERVER_RATE_LIMIT
+
+def test_rules_decide_delay_under_the_cap():
+    scheduler = RetryScheduler.from_config(None, 3, DURATION, seed=0)
+    assert scheduler.simulate([["VAL02"]] * 3) == [1, 1, 1]
+    assert scheduler.next_delay(["VAL06"], 3) == 10
+    assert scheduler.next_delay(["VAL09"], 13) == 3
+
+def test_window_rule_expires():
+    scheduler = RetryScheduler.from_config({"rules": [{"codes": ["VAL02"], "delay": 1, "window": 30}]}, 3, DURATION)
+    assert scheduler.next_delay(["VAL02"], 29) == 1
+    assert scheduler.next_delay(["VAL02"], 31) == 3
+
+@pytest.mark.parametrize("late_by", [8, 14, 16, 40])
+def test_late_open_keeps_requests_for_after_the_open(late_by):
+    scheduler = RetryScheduler.from_config(None, 3, DURATION, seed=0)
+    not_open = [["VAL02"]] * late_by
+    delays = scheduler.simulate(not_open + [["VAL06"]] * 10)
+
+    # The client never goes silent waiting for the window, the delays stay those of the rules or the spread of the streak.
+    share = int(DEFAULT_RETRY_CONFIG["max_requests_per_window"] * .5)
+    assert max(delays) <= max(10, RATE_WINDOW / share)
+    assert max_requests_in_window(delays) <= DEFAULT_RETRY_CONFIG["max_requests_per_window"]
+
+def test_not_open_streak_is_spread_after_half_the_window():
+    scheduler = RetryScheduler.from_config(None, 3, DURATION, seed=0)
+    delays = scheduler.simulate([["VAL02"]] * 16 + [["VAL06"]] * 3)
+
+    assert delays[:6] == [1] * 6
+    assert delays[6:16] == [RATE_WINDOW / 7] * 10
+    assert delays[16:] == [10] * 3
+
+def test_exponential_backoff_grows_and_caps():
+    scheduler = RetryScheduler.from_config({"rules": [{"codes": ["VAL14"], "type": "exponential", "delay": 3, "factor": 2, "max_delay": 30}]}, 3, DURATION)
+    assert scheduler.simulate([["VAL14"]] * 6) == [3, 6, 12, 24, 30, 30]
+
+def test_budget_is_enforced():
+    scheduler = RetryScheduler.from_config({"max_requests": 5}, 3, DURATION)
+    assert scheduler.simulate([["VAL09"]] * 10)[-1] is None
+    assert scheduler.sent_requests == 5
@@ -0,0 +1,117 @@
+from time import monotonic, sleep, time
+import base64
+import json
+
+import pytest
+
+from logger import Logger
+from token_fetcher import ContinuousTokenFetcher, StandbyTokenProvider, read_token_expiry, REFRESH_RETRY_DELAY, TOKEN_REFRESH_MARGIN, LIVENESS_CHECK_INTERVAL
+
+def create_token(expires_at: float, nonce: int = 0) -> str:
+    encode = lambda data: base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+    return f"Bearer {encode({'alg': 'HS256'})}.{encode({'exp': int(expires_at), 'nonce': nonce})}.signature"
+
+class FakeHttpLogin:
+    """Answers every token fetch with the token `next_token` returns."""
+    def __init__(self, next_token) -> None:
+        self.next_token = next_token
+        self.fetch_count = 0
+
+    def login(self) -> str:
+        return self.fetch_token()
+
+    def fetch_token(self) -> str:
+        self.fetch_count += 1
+        return self.next_token()
+
+def create_fetcher(next_token) -> tuple[ContinuousTokenFetcher, FakeHttpLogin]:
+    # Nothing listens on port 9, the liveness checks fail fast without reporting the token as rejected.
+    token_fetcher = ContinuousTokenFetcher("http://127.0.0.1:9/ogrenci/", "student", "secret")
+    token_fetcher.http_login = FakeHttpLogin(next_token)
+    return token_fetcher, token_fetcher.http_login
+
+def test_read_token_expiry():
+    assert read_token_expiry(create_token(1_700_000_000)) == 1_700_000_000
+    assert read_token_expiry("Bearer not-a-jwt") is None
+    assert read_token_expiry("") is None
+
+def test_unchanged_token_near_expiry_backs_off():
+    # The server keeps answering with the same token, which is already inside the refresh margin.
+    token = create_token(time() + TOKEN_REFRESH_MARGIN - 20)
+    token_fetcher, http_login = create_fetcher(lambda: token)
+    token_fetcher.login_to_kepler()
+    token_fetcher.start()
+    sleep(3.2)
+    token_fetcher.stop()
+
+    # The login and the fetches at 0, 1 and 3 seconds, the delay doubles after every unchanged token.
+    assert http_login.fetch_count <= 4
+    assert token_fetcher._refresh_backoff == REFRESH_RETRY_DELAY * 4
+
+def test_backoff_is_capped_at_liveness_interval():
+    token = create_token(time() + TOKEN_REFRESH_MARGIN - 20)
+    token_fetcher, _ = create_fetcher(lambda: token)
+    token_fetcher.login_to_kepler()
+    token_fetcher._refresh_backoff = LIVENESS_CHECK_INTERVAL
+    token_fetcher._last_refresh_attempt = monotonic()
+    assert not token_fetcher._needs_refresh()
+    assert token_fetcher._time_until_next_action() == pytest.approx(LIVENESS_CHECK_INTERVAL, abs=.1)
+
+def test_new_token_is_used_right_away():
+    nonces = iter(range(1000))
+    token_fetcher, http_login = create_fetcher(lambda: create_token(time() + 60 * 60, next(nonces)))
+    token_fetcher.login_to_kepler()
+    first = token_fetcher.get_token()
+    token_fetcher.start()
+    token_fetcher.request_refresh()
+    sleep(.3)
+    token_fetcher.stop()
+    assert token_fetcher.get_token() != first
+    assert token_fetcher._refresh_backoff == 0
+    # The token is far from its expiry, only the requested refresh fetched it.
+    assert http_login.fetch_count == 2
+
+class FakeSession:
+    """The parts of `ContinuousTokenFetcher` that `StandbyTokenProvider` uses."""
+    def __init__(self, token: str) -> None:
+        self.token = token
+        self.is_session_alive = True
+        self.session_lost_at = None
+        self.on_session_lost = None
+
+    def has_token(self) -> bool:
+        return True
+
+    def get_token(self) -> str:
+        return self.token
+
+    def token_age(self) -> float:
+        return 0
+
+def test_standby_logs_missing_session_once(monkeypatch):
+    messages = []
+    monkeypatch.setattr(Logger, "log", lambda message, silent=False: messages.append(message))
+    primary, standby = FakeSession("Bearer primary"), FakeSession("Bearer standby")
+    provider = StandbyTokenProvider(primary, standby)
+
+    primary.is_session_alive = standby.is_session_alive = False
+    for _ in range(100):
+        assert provider.get_token() == "Bearer primary"
+    assert len(messages) == 1
+
+    # The standby logged in again, the next request switches to it.
+    standby.is_session_alive = True
+    assert provider.get_token() == "Bearer standby"
+    assert len(messages) == 2
+
+    # Both are down again, it is logged again once.
+    standby.is_session_alive = False
+    for _ in range(100):
+        provider.get_token()
+    assert len(messages) == 3
+
+    # The active session came back on its own.
+    standby.is_session_alive = True
+    for _ in range(100):
+        assert provider.get_token() == "Bearer standby"
+    assert len(messages) == 4
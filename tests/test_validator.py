@@ -0,0 +1,110 @@
+from time import perf_counter
+
+import pytest
+
+from catalog import Lesson, Course
+from validator import ScheduleValidator, MAX_CREDITS, MAX_CRN_COUNT
+
+class FakeCatalog:
+    """Catalog with the given lessons, every course has the given credits."""
+    def __init__(self, lessons: dict[str, tuple[str, str]], credits: dict[str, float] | None = None) -> None:
+        self.lessons = {crn: Lesson(crn, f"BLG {crn}", "", day, time) for crn, (day, time) in lessons.items()}
+        self.credits = credits or {}
+
+    def get_lesson(self, crn: str) -> Lesson | None:
+        return self.lessons.get(crn)
+
+    def get_credits(self, crn: str) -> float | None:
+        return self.credits.get(crn, 3) if crn in self.lessons else None
+
+def make_slots(slot_count: int, alternative_count: int) -> tuple[list[list[str]], dict[str, tuple[str, str]]]:
+    """Every slot meets in its own hour, the alternatives of a slot share it."""
+    slots, lessons = [], {}
+    for i in range(slot_count):
+        slot = [f"{20000 + i * 10 + j}" for j in range(alternative_count)]
+        day = ["Pazartesi", "Salı", "Çarşamba", "Perşembe", "Cuma"][i % 5]
+        hour = 8 + i // 5 * 2
+        for crn in slot:
+            lessons[crn] = (day, f"{hour:02}30/{hour + 1:02}29")
+        slots.append(slot)
+    return slots, lessons
+
+def test_clash_is_reported_but_not_pruned():
+    catalog = FakeCatalog({"21340": ("Pazartesi", "0830/1129"), "21341": ("Pazartesi", "1030/1229"), "21350": ("Salı", "0830/1129")})
+    validator = ScheduleValidator(catalog)
+    slots = [["21340"], ["21341", "21350"]]
+    result = validator.validate(slots)
+    assert result.clashes == [("21340", "21341")]
+    assert result.has_valid_combination
+    assert result.invalid_crns == []
+    assert ScheduleValidator.prune(slots, result) == slots
+    assert "CRN 21340 ve CRN 21341 çakışıyor." in validator.describe(result)
+
+def test_unsatisfiable_clash_keeps_every_crn():
+    catalog = FakeCatalog({"21340": ("Pazartesi", "0830/1129"), "21341": ("Pazartesi", "1030/1229")})
+    validator = ScheduleValidator(catalog)
+    slots = [["21340"], ["21341"]]
+    result = validator.validate(slots)
+    assert result.has_valid_combination is False
+    assert ScheduleValidator.prune(slots, result) == slots
+
+def test_credit_limit_is_configurable_and_only_warns():
+    catalog = FakeCatalog({"21340": ("Pazartesi", "0830/1129"), "21350": ("Salı", "0830/1129")}, credits={"21340": 4, "21350": 5})
+    slots = [["21340"], ["21350"]]
+    strict = ScheduleValidator(catalog, max_credits=8)
+    result = strict.validate(slots)
+    assert result.credit_range == (9, 9)
+    assert result.has_valid_combination is False
+    assert ScheduleValidator.prune(slots, result) == slots
+    assert any("8 kredi sınırını" in message for message in strict.describe(result))
+
+    relaxed = ScheduleValidator(catalog, max_credits=9)
+    assert relaxed.validate(slots).has_valid_combination
+    assert relaxed.describe(relaxed.validate(slots)) == []
+    assert ScheduleValidator(catalog).max_credits == MAX_CREDITS
+
+def test_invalid_crns_are_pruned():
+    catalog = FakeCatalog({"21340": ("Pazartesi", "0830/1129"), "21350": ("Salı", "0830/1129")})
+    slots = [["21340", "abc"], ["21350", "21340"], ["x1"]]
+    result = ScheduleValidator(catalog).validate(slots)
+    assert result.invalid_crns == [("abc", "geçerli bir CRN değil"), ("21340", "listede birden fazla kez yer alıyor"), ("x1", "geçerli bir CRN değil")]
+    assert ScheduleValidator.prune(slots, result) == [["21340"], ["21350"]]
+
+def test_unknown_crns_are_kept():
+    slots = [["21340"], ["21350"]]
+    result = ScheduleValidator(FakeCatalog({"21340": ("Pazartesi", "0830/1129")})).validate(slots)
+    assert result.unknown_crns == ["21350"]
+    assert ScheduleValidator.prune(slots, result) == slots
+
+def test_excess_slots_are_pruned():
+    slots, lessons = make_slots(MAX_CRN_COUNT + 2, 1)
+    result = ScheduleValidator(FakeCatalog(lessons), max_credits=100).validate(slots)
+    assert result.excess_slots == slots[MAX_CRN_COUNT:]
+    assert ScheduleValidator.prune(slots, result) == slots[:MAX_CRN_COUNT]
+
+@pytest.mark.parametrize("alternative_count", [2, 3, 4, 6])
+def test_search_is_fast_with_many_alternatives(alternative_count):
+    slots, lessons = make_slots(MAX_CRN_COUNT, alternative_count)
+    validator = ScheduleValidator(FakeCatalog(lessons), max_credits=36)
+    start = perf_counter()
+    result = validator.validate(slots)
+    assert perf_counter() - start < 1
+    assert result.has_valid_combination
+
+@pytest.mark.parametrize("alternative_count", [3, 4, 6])
+def test_search_is_bounded_without_valid_combination(alternative_count):
+    # Every CRN clashes with the first slot's only CRN, so no combination is valid.
+    slots, lessons = make_slots(MAX_CRN_COUNT, alternative_count)
+    lessons = {crn: ("Pazartesi", "0830/1729") for crn in lessons}
+    validator = ScheduleValidator(FakeCatalog(lessons))
+    start = perf_counter()
+    result = validator.validate(slots)
+    assert perf_counter() - start < 2
+    assert result.has_valid_combination is False
+
+def test_search_gives_up_after_step_limit():
+    slots, lessons = make_slots(MAX_CRN_COUNT, 4)
+    # A combination needs one step per slot.
+    validator = ScheduleValidator(FakeCatalog(lessons))
+    combination, is_complete = validator.find_combination(slots, set(), {crn: 1 for crn in lessons}, max_steps=5)
+    assert combination is None and not is_complete